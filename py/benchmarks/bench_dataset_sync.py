@@ -0,0 +1,115 @@
+"""
+Benchmarks incremental dataset sync against a full refetch.
+
+The API server is simulated in-process: every request serializes the rows it returns to JSON and
+parses them back, so the cost of a request is proportional to the number of rows transferred, like
+a real fetch. For each dataset size, the benchmark measures a cold fetch, which downloads the whole
+dataset into an empty cache, and then a sync after a given number of rows have changed. The time
+spent transferring rows is reported separately from the total, which also includes reading the
+cached snapshot back from local disk.
+
+Usage:
+    python benchmarks/bench_dataset_sync.py --sizes 10000 100000 --deltas 10 1000
+"""
+
+import argparse
+import json
+import shutil
+import tempfile
+import time
+from unittest import mock
+
+from braintrust import LazyValue, logger
+from braintrust.dataset_cache import DatasetCache
+from braintrust.file_cache import FileCache
+from braintrust.logger import Dataset, ObjectFetcher, ObjectMetadata, ProjectDatasetMetadata
+
+
+class SimulatedServer:
+    def __init__(self, size: int):
+        self.rows = [self._make_row(i, i) for i in range(size)]
+        self.rows_transferred = 0
+        self.transfer_time = 0.0
+
+    @staticmethod
+    def _make_row(i: int, xact_id: int):
+        return {
+            "id": f"row-{i}",
+            "input": {"question": f"What is {i} + {i}?", "context": "x" * 512},
+            "expected": str(2 * i),
+            "metadata": {"index": i},
+            "_xact_id": f"{xact_id:016d}",
+        }
+
+    def update(self, num_rows: int):
+        next_xact_id = len(self.rows)
+        for i in range(num_rows):
+            self.rows.append(self._make_row(i, next_xact_id + i))
+
+    def fetch_page(self, cursor=None, limit=None, btql=None):
+        if btql and "filter" not in btql:
+            # The ids of the live rows, which are fetched on every sync to detect deletes.
+            start = time.perf_counter()
+            response = json.loads(json.dumps([{"id": row_id} for row_id in dict.fromkeys(r["id"] for r in self.rows)]))
+            self.transfer_time += time.perf_counter() - start
+            return response, None
+        base_version = btql["filter"]["right"]["value"] if btql else ""
+        rows = [row for row in self.rows if row["_xact_id"] > base_version]
+        self.rows_transferred += len(rows)
+        start = time.perf_counter()
+        response = json.loads(json.dumps(rows))
+        self.transfer_time += time.perf_counter() - start
+        return response, None
+
+
+def make_dataset():
+    metadata = ProjectDatasetMetadata(
+        project=ObjectMetadata(id="project-id", name="project", full_info={}),
+        dataset=ObjectMetadata(id="dataset-id", name="dataset", full_info={}),
+    )
+    return Dataset(lazy_metadata=LazyValue(lambda: metadata, use_mutex=False), legacy=False)
+
+
+def timed_fetch(server: SimulatedServer):
+    server.rows_transferred = 0
+    server.transfer_time = 0.0
+    start = time.perf_counter()
+    num_records = sum(1 for _ in make_dataset())
+    return time.perf_counter() - start, server.transfer_time, server.rows_transferred, num_records
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000], help="Dataset sizes to benchmark.")
+    parser.add_argument("--deltas", type=int, nargs="+", default=[10, 1000], help="Numbers of changed rows to sync.")
+    args = parser.parse_args()
+
+    print(
+        f"{'rows':>8} {'changed':>8} | {'cold total':>10} {'transfer':>10} {'fetched':>8} |"
+        f" {'sync total':>10} {'transfer':>10} {'fetched':>8}"
+    )
+    for size in args.sizes:
+        for delta in args.deltas:
+            cache_dir = tempfile.mkdtemp()
+            orig_cache = logger._state._dataset_cache
+            cache = DatasetCache(FileCache(cache_dir=cache_dir))
+            logger._state._dataset_cache = LazyValue(lambda: cache, use_mutex=False)
+            server = SimulatedServer(size)
+            try:
+                fetch_page = lambda fetcher, *args, **kwargs: server.fetch_page(*args, **kwargs)
+                with mock.patch.object(ObjectFetcher, "_fetch_page", fetch_page):
+                    cold_time, cold_transfer, cold_fetched, _ = timed_fetch(server)
+                    server.update(delta)
+                    sync_time, sync_transfer, sync_fetched, num_records = timed_fetch(server)
+                assert num_records == size, (num_records, size)
+            finally:
+                logger._state._dataset_cache = orig_cache
+                shutil.rmtree(cache_dir, ignore_errors=True)
+            print(
+                f"{size:>8} {delta:>8} | {cold_time:>9.3f}s {cold_transfer:>9.3f}s {cold_fetched:>8} |"
+                f" {sync_time:>9.3f}s {sync_transfer:>9.3f}s {sync_fetched:>8}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""
+This module implements caching for attachment uploads and downloads.
+
+Attachments that opt into deduplication are identified by a digest of their contents. The
+`AttachmentUploadRegistry` remembers which digests have already been uploaded, in a fast
+in-memory LRU cache shared by the whole process and an optional persistent disk cache shared
+across processes. Identical content then reuses the existing attachment key instead of being
+uploaded again.
+
+Downloaded attachments are stored in a size-bounded `FileCache` keyed by attachment key. The
+contents behind an attachment key never change, so cached files never need to be invalidated.
+Downloads are only cached when `BRAINTRUST_ATTACHMENT_CACHE_MAX_SIZE` is set.
+"""
+
+import hashlib
+import threading
+from typing import BinaryIO, Optional, Tuple
+
+from braintrust.prompt_cache import disk_cache, lru_cache
+
+# Attachments are hashed in chunks of this size, so that large files are never
+# read into memory all at once.
+HASH_CHUNK_SIZE = 1 << 20
+
+
+def compute_content_digest(stream: BinaryIO, chunk_size: int = HASH_CHUNK_SIZE) -> str:
+    """
+    Computes the SHA-256 digest of a binary stream, reading it in chunks.
+
+    Args:
+        stream: The stream to hash. It is read until exhausted but not closed.
+        chunk_size: The number of bytes to read at a time.
+
+    Returns:
+        The hex-encoded digest.
+    """
+    h = hashlib.sha256()
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        h.update(chunk)
+    return h.hexdigest()
+
+
+def create_registry_key(org_id: str, content_digest: str, filename: str, content_type: str) -> str:
+    """
+    Creates the registry key for an attachment.
+
+    Attachment keys are scoped to an organization, and the filename and content type are stored
+    alongside the key, so they are all part of the registry key. The result is hex-encoded so it
+    can be used as a filename by the disk cache.
+    """
+    h = hashlib.sha256()
+    for part in (org_id, content_digest, filename, content_type):
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+class AttachmentUploadRegistry:
+    """
+    A two-layer registry mapping attachment contents to already-assigned attachment keys.
+
+    The in-memory layer tracks every key handed out by this process, including ones whose upload
+    has not finished yet, so that concurrent attachments with the same contents share a key. The
+    disk layer only records keys whose upload has completed, so that other processes never reuse
+    a key that does not exist in object storage.
+    """
+
+    def __init__(
+        self,
+        memory_cache: lru_cache.LRUCache[str, Tuple[str, bool]],
+        disk_cache: Optional[disk_cache.DiskCache[str]] = None,
+    ):
+        """
+        Initialize the registry.
+
+        Args:
+            memory_cache: The memory cache to use. Values are `(key, uploaded)` pairs.
+            disk_cache: Optional disk cache of uploaded keys to use as backing store.
+        """
+        self.memory_cache = memory_cache
+        self.disk_cache = disk_cache
+        self._lock = threading.Lock()
+
+    def _lookup(self, registry_key: str) -> Optional[Tuple[str, bool]]:
+        try:
+            return self.memory_cache.get(registry_key)
+        except KeyError:
+            pass
+
+        if self.disk_cache:
+            try:
+                key = self.disk_cache.get(registry_key)
+            except (KeyError, RuntimeError):
+                # A broken disk cache only costs us a redundant upload.
+                return None
+            entry = (key, True)
+            self.memory_cache.set(registry_key, entry)
+            return entry
+
+        return None
+
+    def resolve_key(self, registry_key: str, key: str) -> str:
+        """
+        Returns the attachment key to use for the given contents.
+
+        If the contents have been seen before, the existing key is returned. Otherwise `key` is
+        claimed for the contents and returned.
+
+        Args:
+            registry_key: The registry key, as returned by `create_registry_key`.
+            key: A fresh attachment key to claim if the contents have not been seen before.
+
+        Returns:
+            The attachment key.
+        """
+        with self._lock:
+            entry = self._lookup(registry_key)
+            if entry is not None:
+                return entry[0]
+            self.memory_cache.set(registry_key, (key, False))
+            return key
+
+    def is_uploaded(self, registry_key: str) -> bool:
+        """Returns whether the contents for `registry_key` are known to have been uploaded."""
+        with self._lock:
+            entry = self._lookup(registry_key)
+            return entry is not None and entry[1]
+
+    def mark_uploaded(self, registry_key: str, key: str) -> None:
+        """
+        Records that the contents for `registry_key` have been uploaded under `key`.
+
+        Raises:
+            RuntimeError: If there is an error writing to the disk cache.
+        """
+        with self._lock:
+            self.memory_cache.set(registry_key, (key, True))
+        if self.disk_cache:
+            self.disk_cache.set(registry_key, key)
@@ -1,6 +1,7 @@
+import codecs
 import dataclasses
 import json
-from typing import Any, cast
+from typing import Any, Dict, Iterable, Iterator, cast
 
 
 class BraintrustJSONEncoder(json.JSONEncoder):
@@ -26,3 +27,108 @@ class BraintrustJSONEncoder(json.JSONEncoder):
 
 def bt_dumps(obj, **kwargs) -> str:
     return json.dumps(obj, cls=BraintrustJSONEncoder, allow_nan=False, **kwargs)
+
+
+_JSON_WHITESPACE = " \t\n\r"
+
+
+class _StreamReader:
+    """A text buffer over a stream of UTF-8 encoded chunks, which only holds the unparsed suffix of the stream."""
+
+    def __init__(self, chunks: Iterable[bytes]):
+        self._chunks = iter(chunks)
+        self._utf8_decoder = codecs.getincrementaldecoder("utf-8")()
+        self._json_decoder = json.JSONDecoder()
+        self._buf = ""
+        self._pos = 0
+        self._eof = False
+
+    def _fill(self) -> bool:
+        """Reads the next chunk into the buffer. Returns False at the end of the stream."""
+        if self._eof:
+            return False
+        # Drop the consumed prefix, so the buffer stays small.
+        self._buf = self._buf[self._pos :]
+        self._pos = 0
+        for chunk in self._chunks:
+            text = self._utf8_decoder.decode(chunk)
+            if text:
+                self._buf += text
+                return True
+        self._buf += self._utf8_decoder.decode(b"", final=True)
+        self._eof = True
+        return False
+
+    def peek(self) -> str:
+        """Skips whitespace and returns the next character, or "" at the end of the stream."""
+        while True:
+            while self._pos < len(self._buf) and self._buf[self._pos] in _JSON_WHITESPACE:
+                self._pos += 1
+            if self._pos < len(self._buf):
+                return self._buf[self._pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, chars: str) -> str:
+        """Consumes the next non-whitespace character, which must be one of `chars`."""
+        c = self.peek()
+        if not c or c not in chars:
+            raise json.JSONDecodeError(f"Expected one of {chars!r}", self._buf, self._pos)
+        self._pos += 1
+        return c
+
+    def read_value(self) -> Any:
+        """Decodes the next JSON value, reading more of the stream until it is complete."""
+        self.peek()
+        while True:
+            try:
+                value, end = self._json_decoder.raw_decode(self._buf, self._pos)
+            except json.JSONDecodeError:
+                if self._eof:
+                    raise
+                value, end = None, None
+            # A value which runs up to the end of the buffer may be truncated
+            # (e.g. a number), so it is only complete at the end of the stream.
+            if end is not None and (end < len(self._buf) or self._eof):
+                self._pos = end
+                return value
+            # Read until the buffer doubles, so that decoding a large value
+            # does not take quadratic time.
+            target = 2 * (len(self._buf) - self._pos)
+            while self._fill() and len(self._buf) - self._pos < target:
+                pass
+
+
+def iter_json_object_array(chunks: Iterable[bytes], key: str, fields: Dict[str, Any]) -> Iterator[Any]:
+    """
+    Incrementally parses a JSON object from a stream of UTF-8 encoded chunks, yielding the elements of the array
+    under `key` one at a time, as soon as each one has been read. Only the element being decoded is buffered, so
+    memory use does not grow with the size of the array.
+
+    :param chunks: The encoded JSON object, e.g. `response.iter_content(chunk_size)`.
+    :param key: The top-level key of the array to stream.
+    :param fields: A dictionary which receives the other top-level fields of the object. It is complete once the
+        iterator is exhausted.
+    """
+    reader = _StreamReader(chunks)
+    reader.expect("{")
+    if reader.peek() == "}":
+        return
+    while True:
+        name = reader.read_value()
+        if not isinstance(name, str):
+            raise ValueError(f"Expected a string key, got {name!r}")
+        reader.expect(":")
+        if name == key and reader.peek() == "[":
+            reader.expect("[")
+            if reader.peek() == "]":
+                reader.expect("]")
+            else:
+                while True:
+                    yield reader.read_value()
+                    if reader.expect(",]") == "]":
+                        break
+        else:
+            fields[name] = reader.read_value()
+        if reader.expect(",}") == "}":
+            return
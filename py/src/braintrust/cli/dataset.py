@@ -0,0 +1,87 @@
+"""Implements the braintrust dataset subcommand."""
+
+import json
+import logging
+import sys
+from typing import Any, Dict, Iterator, TextIO
+
+from .. import init_dataset
+
+_logger = logging.getLogger("braintrust.dataset")
+
+
+def _read_records(f: TextIO) -> Iterator[Dict[str, Any]]:
+    for lineno, line in enumerate(f, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Line {lineno} is not valid JSON: {e}") from e
+        if not isinstance(record, dict):
+            raise ValueError(f"Line {lineno} must be a JSON object, got {type(record).__name__}")
+        yield record
+
+
+def run_import(args):
+    """Runs the braintrust dataset import subcommand."""
+    dataset = init_dataset(
+        project=args.project,
+        name=args.dataset,
+        api_key=args.api_key,
+        org_name=args.org_name,
+        app_url=args.app_url,
+    )
+
+    if args.file == "-":
+        row_ids = dataset.insert_many(_read_records(sys.stdin), batch_size=args.batch_size)
+    else:
+        with open(args.file) as f:
+            row_ids = dataset.insert_many(_read_records(f), batch_size=args.batch_size)
+
+    _logger.debug("Flushing %d records", len(row_ids))
+    dataset.flush()
+    print(f"Imported {len(row_ids)} records into dataset {args.dataset!r} in project {args.project!r}")
+
+
+def build_parser(subparsers, parent_parser):
+    """Adds the parser for the dataset subcommand."""
+    parser = subparsers.add_parser(
+        "dataset",
+        help="Manage Braintrust datasets",
+        parents=[parent_parser],
+    )
+    dataset_subparsers = parser.add_subparsers(dest="dataset_subcommand", required=True)
+
+    import_parser = dataset_subparsers.add_parser(
+        "import",
+        help="Import records into a dataset from a JSONL file",
+        parents=[parent_parser],
+    )
+    import_parser.add_argument(
+        "--api-key",
+        help="Specify a Braintrust api key. If the parameter is not specified, the BRAINTRUST_API_KEY environment variable will be used.",
+    )
+    import_parser.add_argument(
+        "--org-name",
+        help="The name of a specific organization to connect to. This is useful if you belong to multiple.",
+    )
+    import_parser.add_argument(
+        "--app-url",
+        help="Specify a custom Braintrust app url. Defaults to https://www.braintrust.dev. This is only necessary if you are using an experimental version of Braintrust.",
+    )
+    import_parser.add_argument("--project", required=True, help="The name of the project containing the dataset.")
+    import_parser.add_argument(
+        "--dataset", required=True, help="The name of the dataset to import into. It is created if it does not exist."
+    )
+    import_parser.add_argument(
+        "--batch-size",
+        type=int,
+        help="The number of records to process at a time. Defaults to the background logger's batch size.",
+    )
+    import_parser.add_argument(
+        "file",
+        help="JSONL file to import, or - to read from stdin. Each line is a JSON object with the same fields as the arguments to `Dataset.insert` (input, expected, metadata, tags, id).",
+    )
+    import_parser.set_defaults(func=run_import)
@@ -1,12 +1,16 @@
 import asyncio
+import dataclasses
 import fnmatch
 import importlib
+import json
 import logging
 import os
 import sys
 from dataclasses import dataclass, field
 from threading import Lock
-from typing import Dict, List, Optional, Union
+from typing import Dict, List, Optional, Tuple, Union
+
+import slugify
 
 from .. import login
 from ..framework import (
@@ -15,7 +19,9 @@ from ..framework import (
     EvaluatorInstance,
     ReporterDef,
     _evals,
+    _resume_evaluator,
     _set_lazy_load,
+    _shard_evaluator,
     bcolors,
     default_reporter,
     init_experiment,
@@ -24,6 +30,7 @@ from ..framework import (
     run_evaluator,
     set_thread_pool_max_workers,
 )
+from ..local_summary import merge_shard_summaries
 from ..logger import Dataset
 from ..util import eprint
 
@@ -75,6 +82,13 @@ class EvaluatorOpts:
     filters: List[str]
     list: bool
     jsonl: bool
+    cache_scorers: bool = False
+    reuse_task_outputs: Union[bool, str] = False
+    checkpoint: bool = False
+    resume: bool = False
+    shard_index: Optional[int] = None
+    shard_count: Optional[int] = None
+    shard_summary_dir: Optional[str] = None
 
 
 @dataclass
@@ -123,8 +137,30 @@ def update_evaluators(eval_state: EvaluatorState, handles, terminate_on_failure)
 
 
 async def run_evaluator_task(evaluator, position, opts: EvaluatorOpts):
+    if opts.cache_scorers:
+        evaluator = dataclasses.replace(evaluator, cache_scorers=True)
+    if opts.reuse_task_outputs:
+        evaluator = dataclasses.replace(evaluator, reuse_task_outputs=opts.reuse_task_outputs)
+    if opts.checkpoint and not evaluator.checkpoint:
+        evaluator = dataclasses.replace(evaluator, checkpoint=True)
+    if opts.resume:
+        evaluator = _resume_evaluator(dataclasses.replace(evaluator, resume=True))
+    if opts.shard_count is not None:
+        evaluator = dataclasses.replace(evaluator, shard_index=opts.shard_index, shard_count=opts.shard_count)
+    if opts.shard_summary_dir:
+        os.makedirs(opts.shard_summary_dir, exist_ok=True)
+        shard_suffix = f".shard-{opts.shard_index}" if opts.shard_count is not None else ""
+        evaluator = dataclasses.replace(
+            evaluator,
+            shard_summary_path=os.path.join(
+                opts.shard_summary_dir, f"{slugify.slugify(evaluator.eval_name)}{shard_suffix}.json"
+            ),
+        )
+
     experiment = None
     if not opts.no_send_logs:
+        evaluator = _shard_evaluator(evaluator)
+
         base_experiment_name = None
         if isinstance(evaluator.data, BaseExperiment):
             base_experiment_name = evaluator.data.name
@@ -263,6 +299,49 @@ def initialize_handles(files):
     return [FileHandle(in_file=fname) for fname in fnames]
 
 
+def merge_summaries(paths: List[str], jsonl: bool) -> bool:
+    """
+    Merges the shard summaries in the given files (or the `.json` files in the given directories), and prints the
+    summary of each experiment. Returns false if any experiment is missing a shard.
+    """
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(os.path.join(path, f) for f in sorted(os.listdir(path)) if f.endswith(".json"))
+        else:
+            files.append(path)
+    if not files:
+        eprint("No shard summaries found")
+        return False
+
+    shards_by_experiment: Dict[Tuple[str, str], List[Dict]] = {}
+    for fname in files:
+        with open(fname, encoding="utf-8") as f:
+            shard = json.load(f)
+        experiment = shard["experiment"]
+        shards_by_experiment.setdefault((experiment["project_name"], experiment["experiment_name"]), []).append(shard)
+
+    all_success = True
+    for (project_name, experiment_name), shards in shards_by_experiment.items():
+        shard_count = shards[0]["shard_count"]
+        indices = sorted(shard["shard_index"] for shard in shards if shard["shard_index"] is not None)
+        if shard_count is not None and indices != list(range(shard_count)):
+            eprint(
+                f"{bcolors.WARNING}Expected one summary for each of the {shard_count} shards of {project_name}/{experiment_name}, but found shards {indices}{bcolors.ENDC}"
+            )
+            all_success = False
+
+        summary = merge_shard_summaries(shards)
+        print(json.dumps(summary.as_dict()) if jsonl else f"{summary}")
+
+    return all_success
+
+
+def run_merge_summary(args):
+    if not merge_summaries(args.paths, args.jsonl):
+        sys.exit(1)
+
+
 def run(args):
     if args.num_workers:
         set_thread_pool_max_workers(args.num_workers)
@@ -281,8 +360,19 @@ def run(args):
         filters=parse_filters(args.filter) if args.filter else [],
         list=args.list,
         jsonl=args.jsonl,
+        cache_scorers=args.cache_scorers,
+        reuse_task_outputs=args.reuse_task_outputs_from or args.reuse_task_outputs,
+        checkpoint=args.checkpoint,
+        resume=args.resume,
+        shard_index=args.shard_index,
+        shard_count=args.shard_count,
+        shard_summary_dir=args.shard_summary_dir,
     )
 
+    if (args.shard_index is None) != (args.shard_count is None):
+        eprint("Must specify both --shard-index and --shard-count")
+        exit(1)
+
     if args.watch:
         eprint("Watch mode is not yet implemented")
         exit(1)
@@ -353,6 +443,45 @@ def build_parser(subparsers, parent_parser):
         action="store_true",
         help="If provided, terminates on a failing eval, instead of the default (moving onto the next one).",
     )
+    parser.add_argument(
+        "--cache-scorers",
+        action="store_true",
+        help="Cache scorer results on disk, so that re-running an eval only runs the scorers and test cases which changed. The cache is stored in BRAINTRUST_SCORER_CACHE_DIR (defaults to ~/.braintrust/scorer_cache).",
+    )
+    parser.add_argument(
+        "--reuse-task-outputs",
+        action="store_true",
+        help="Record task outputs on disk and score the recorded outputs on later runs, instead of running the tasks again, until the task's code changes. Outputs are stored in BRAINTRUST_TASK_OUTPUT_CACHE_DIR (defaults to ~/.braintrust/task_output_cache).",
+    )
+    parser.add_argument(
+        "--reuse-task-outputs-from",
+        metavar="EXPERIMENT",
+        help="Score the task outputs logged by this experiment instead of running the tasks again. Test cases which are not in the experiment run the task.",
+    )
+    parser.add_argument(
+        "--checkpoint",
+        action="store_true",
+        help="Record each completed test case in a local journal (in BRAINTRUST_EVAL_CHECKPOINT_DIR, defaulting to ~/.braintrust/eval_checkpoints), so that an interrupted eval can be resumed with --resume.",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Resume interrupted evals from their checkpoints. Completed test cases are skipped and combined with the new results, and each eval continues logging to the same experiment. Implies --checkpoint.",
+    )
+    parser.add_argument(
+        "--shard-index",
+        type=int,
+        help="The index of the shard to run, from 0 to --shard-count minus one, to split evals across several machines. Test cases are assigned to shards by a hash of their input, and all shards log to the same experiment, so each eval must specify an experiment name.",
+    )
+    parser.add_argument(
+        "--shard-count",
+        type=int,
+        help="The total number of shards. See --shard-index.",
+    )
+    parser.add_argument(
+        "--shard-summary-dir",
+        help="Write the summary of each eval (or of its shard, when sharding) to a JSON file in this directory. Combine the summaries of all shards with `braintrust merge-summary DIR...`.",
+    )
     parser.add_argument(
         "--env-file",
         help="A path to a .env file containing environment variables to load (via dotenv).",
@@ -369,3 +498,20 @@ def build_parser(subparsers, parent_parser):
     )
 
     parser.set_defaults(func=run)
+
+    merge_parser = subparsers.add_parser(
+        "merge-summary",
+        help="Merge the shard summaries written by `braintrust eval --shard-summary-dir`.",
+        parents=[parent_parser],
+    )
+    merge_parser.add_argument(
+        "--jsonl",
+        help="Format score summaries as jsonl, i.e. one JSON-formatted line per summary.",
+        action="store_true",
+    )
+    merge_parser.add_argument(
+        "paths",
+        nargs="+",
+        help="The shard summary files, or directories containing them (as .json files).",
+    )
+    merge_parser.set_defaults(func=run_merge_summary)
@@ -0,0 +1,235 @@
+"""
+This module implements a local cache of dataset snapshots.
+
+A dataset at a given version never changes, so its records can be stored on disk once and read
+back on every later run instead of being downloaded again. Each snapshot is stored as a single
+uncompressed JSON-lines file in a size-bounded `FileCache`, so that it can be streamed back one
+record at a time. The cache stores the records exactly as they were returned by the API, before
+any client-side transformation. The cache is only used when `BRAINTRUST_DATASET_CACHE_MAX_SIZE` is
+set.
+
+The latest known snapshot of each dataset is stored separately, as a base segment followed by
+delta segments. Syncing an unpinned dataset only fetches the rows that changed since the cached
+version, plus the ids of the live rows to detect deletes, and appends the changes as a new delta
+segment, so the cost of a sync is mostly proportional to the size of the change rather than the
+size of the dataset. Once there are too many delta segments, they are compacted into a new base
+segment.
+"""
+
+import copy
+import json
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Optional, Tuple
+
+from braintrust import file_cache
+from braintrust.db_fields import ID_FIELD, IS_MERGE_FIELD, OBJECT_DELETE_FIELD
+from braintrust.util import merge_dicts
+
+# Once a snapshot has this many delta segments, they are compacted into a new
+# base segment.
+MAX_DELTA_SEGMENTS = 8
+
+
+def _create_cache_key(dataset_id: str, version: str) -> str:
+    """Creates a unique cache key from a dataset id and version."""
+    return f"{dataset_id}:{version}"
+
+
+def _create_manifest_key(dataset_id: str) -> str:
+    """Creates the cache key of the manifest describing the latest snapshot of a dataset."""
+    return f"{dataset_id}:latest"
+
+
+def _create_segment_key(dataset_id: str, index: int, base_version: Optional[str], version: str) -> str:
+    """Creates the cache key of the `index`th segment, holding the changes from `base_version` to `version`."""
+    return f"{dataset_id}:segment:{index}:{base_version or ''}:{version}"
+
+
+def apply_delta(records: Dict[str, Dict[str, Any]], delta: Iterable[Dict[str, Any]]) -> None:
+    """
+    Applies changed rows to a snapshot, in place.
+
+    Rows marked with `_object_delete` remove the record, rows marked with `_is_merge` are merged
+    into the existing record, and any other row replaces the record with the same id.
+
+    Args:
+        records: The snapshot, as a map from record id to record.
+        delta: The changed rows, in the order they were written.
+    """
+    for row in delta:
+        row_id = row[ID_FIELD]
+        if row.get(OBJECT_DELETE_FIELD):
+            records.pop(row_id, None)
+        elif row.get(IS_MERGE_FIELD) and row_id in records:
+            # Merging is destructive, so copy the record first in case it is
+            # shared with a previous delta.
+            records[row_id] = merge_dicts(
+                copy.deepcopy(records[row_id]), {k: v for k, v in row.items() if k != IS_MERGE_FIELD}
+            )
+        else:
+            records[row_id] = row
+
+
+class DatasetCache:
+    """A persistent cache of dataset records, keyed by dataset id and version."""
+
+    def __init__(self, cache: file_cache.FileCache):
+        """
+        Initialize the dataset cache.
+
+        Args:
+            cache: The file cache to store snapshots in.
+        """
+        self.cache = cache
+
+    def get(self, dataset_id: str, version: str) -> Optional[Iterator[Dict[str, Any]]]:
+        """
+        Retrieve a dataset snapshot from the cache.
+
+        Args:
+            dataset_id: The id of the dataset.
+            version: The version of the dataset.
+
+        Returns:
+            An iterator over the cached records, which reads them from disk lazily, or None if the
+            snapshot is not cached.
+        """
+        records = self._read(_create_cache_key(dataset_id, version))
+        if records is not None:
+            return records
+
+        # The latest snapshot may also be the requested version.
+        latest = self.get_latest(dataset_id)
+        if latest is not None and latest[0] == version:
+            return iter(latest[1])
+        return None
+
+    def _read(self, key: str) -> Optional[Iterator[Dict[str, Any]]]:
+        path = self.cache.get_path(key)
+        if path is None:
+            return None
+        try:
+            f = open(path, "rb")
+        except FileNotFoundError:
+            # Evicted concurrently.
+            return None
+        return self._iter_records(f)
+
+    @staticmethod
+    def _iter_records(f: Any) -> Iterator[Dict[str, Any]]:
+        with f:
+            for line in f:
+                yield json.loads(line)
+
+    def set(self, dataset_id: str, version: str, records: Iterable[Mapping[str, Any]]) -> None:
+        """
+        Store a dataset snapshot in the cache.
+
+        Args:
+            dataset_id: The id of the dataset.
+            version: The version of the dataset.
+            records: The records of the dataset at this version.
+
+        Raises:
+            OSError: If there is an error writing to the cache directory.
+        """
+        self._write(_create_cache_key(dataset_id, version), records)
+
+    def _write(self, key: str, records: Iterable[Mapping[str, Any]]) -> None:
+        with self.cache.writer(key) as f:
+            for record in records:
+                f.write(json.dumps(record, separators=(",", ":")).encode("utf-8"))
+                f.write(b"\n")
+
+    def _read_manifest(self, dataset_id: str) -> Optional[Dict[str, Any]]:
+        manifest = self._read(_create_manifest_key(dataset_id))
+        if manifest is None:
+            return None
+        try:
+            return next(manifest)
+        except (StopIteration, ValueError):
+            return None
+        finally:
+            manifest.close()
+
+    def _write_manifest(self, dataset_id: str, version: str, segments: List[str]) -> None:
+        self._write(_create_manifest_key(dataset_id), [{"version": version, "segments": segments}])
+
+    def get_latest(self, dataset_id: str) -> Optional[Tuple[str, List[Dict[str, Any]]]]:
+        """
+        Retrieve the latest cached snapshot of a dataset.
+
+        Args:
+            dataset_id: The id of the dataset.
+
+        Returns:
+            The version of the snapshot and its records, or None if no complete snapshot is cached.
+        """
+        manifest = self._read_manifest(dataset_id)
+        if manifest is None:
+            return None
+
+        records: Dict[str, Dict[str, Any]] = {}
+        for segment_key in manifest["segments"]:
+            segment = self._read(segment_key)
+            if segment is None:
+                # Part of the snapshot has been evicted.
+                return None
+            apply_delta(records, segment)
+        return manifest["version"], list(records.values())
+
+    def set_latest(self, dataset_id: str, version: str, records: Iterable[Mapping[str, Any]]) -> None:
+        """
+        Store a full snapshot of a dataset as its latest snapshot.
+
+        Args:
+            dataset_id: The id of the dataset.
+            version: The version of the dataset.
+            records: The records of the dataset at this version.
+
+        Raises:
+            OSError: If there is an error writing to the cache directory.
+        """
+        segment_key = _create_segment_key(dataset_id, 0, None, version)
+        self._write(segment_key, records)
+        self._write_manifest(dataset_id, version, [segment_key])
+
+    def append_latest(
+        self,
+        dataset_id: str,
+        base_version: str,
+        version: str,
+        delta: Iterable[Mapping[str, Any]],
+        records: Optional[Iterable[Mapping[str, Any]]] = None,
+    ) -> None:
+        """
+        Update the latest snapshot of a dataset with the rows that changed since `base_version`.
+
+        If the latest snapshot is not at `base_version`, e.g. because another process has synced
+        the dataset in the meantime, the update is dropped.
+
+        Args:
+            dataset_id: The id of the dataset.
+            base_version: The version of the latest snapshot that the delta applies to.
+            version: The version of the dataset after applying the delta.
+            delta: The rows that changed between `base_version` and `version`.
+            records: The full snapshot at `version`. If provided, it is used to compact the
+                segments once there are too many of them.
+
+        Raises:
+            OSError: If there is an error writing to the cache directory.
+        """
+        manifest = self._read_manifest(dataset_id)
+        if manifest is None or manifest["version"] != base_version:
+            return
+
+        segments = manifest["segments"]
+        if records is not None and len(segments) > MAX_DELTA_SEGMENTS:
+            # The first segment is the base, so this is the (MAX_DELTA_SEGMENTS + 1)th delta.
+            self.set_latest(dataset_id, version, records)
+            return
+
+        # Deletes do not advance the version, so the index keeps segments with
+        # the same versions apart.
+        segment_key = _create_segment_key(dataset_id, len(segments), base_version, version)
+        self._write(segment_key, delta)
+        self._write_manifest(dataset_id, version, segments + [segment_key])
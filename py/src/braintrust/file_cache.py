@@ -0,0 +1,121 @@
+"""
+A module providing a persistent, size-bounded cache of files.
+
+This module contains a cache that stores each entry as a plain file on disk, so that large
+entries can be streamed or read in parts rather than loaded into memory. Entries are written
+atomically, and the least recently used entries are evicted, based on file modification times,
+once the total size of the cache exceeds its maximum.
+"""
+
+import contextlib
+import hashlib
+import os
+import tempfile
+from typing import BinaryIO, Iterator, Optional
+
+
+class FileCache:
+    """
+    A persistent filesystem-based cache of binary blobs.
+
+    Each entry is stored as a single uncompressed file, so that it can be streamed and
+    range-read without loading it into memory. Like `DiskCache`, the cache evicts the least
+    recently used files based on their modification times, but it is bounded by the total size
+    of the cached files rather than by the number of entries.
+    """
+
+    def __init__(self, cache_dir: str, max_size: Optional[int] = None):
+        """
+        Creates a new FileCache instance.
+
+        Args:
+            cache_dir: Directory where cache files will be stored.
+            max_size: Maximum total size of the cache files, in bytes.
+                     If not specified, the cache will grow unbounded.
+        """
+        self._dir = cache_dir
+        self._max_size = max_size
+
+    def _get_entry_path(self, key: str) -> str:
+        """Gets the file path for a cache entry. Keys are hashed so that they are safe to use as filenames."""
+        return os.path.join(self._dir, hashlib.sha256(key.encode("utf-8")).hexdigest())
+
+    def get_path(self, key: str) -> Optional[str]:
+        """
+        Looks up an entry in the cache.
+        Updates the entry's access time when found.
+
+        Args:
+            key: The key to look up in the cache.
+
+        Returns:
+            The path of the cached file, or None if the key is not cached.
+        """
+        file_path = self._get_entry_path(key)
+        try:
+            os.utime(file_path, None)
+        except OSError:
+            return None
+        return file_path
+
+    @contextlib.contextmanager
+    def writer(self, key: str) -> Iterator[BinaryIO]:
+        """
+        Opens a file to write an entry into the cache.
+
+        The entry only becomes visible to readers once the block exits without an error, so a
+        partially-written entry is never served from the cache. If the cache is then
+        over its maximum size, the least recently used entries will be evicted. The new entry is
+        never evicted by its own write, even if it alone exceeds the maximum size.
+
+        Args:
+            key: The key to store the entry under.
+
+        Raises:
+            OSError: If there is an error writing to the cache directory.
+        """
+        os.makedirs(self._dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self._dir, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                yield f
+            file_path = self._get_entry_path(key)
+            os.replace(tmp_path, file_path)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+
+        if self._max_size is not None:
+            self._evict_oldest(keep=file_path)
+
+    def _evict_oldest(self, keep: str) -> None:
+        """Evicts the oldest entries, other than `keep`, from the cache until it is under the maximum size."""
+        assert self._max_size is not None
+
+        stats = []
+        total_size = 0
+        for entry in os.scandir(self._dir):
+            if entry.name.startswith(".tmp-"):
+                continue
+            try:
+                stat = entry.stat()
+            except OSError:
+                # Evicted concurrently by another process.
+                continue
+            stats.append((stat.st_mtime, stat.st_size, entry.path))
+            total_size += stat.st_size
+
+        stats.sort()
+        for _, size, path in stats:
+            if total_size <= self._max_size:
+                break
+            if path == keep:
+                continue
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            total_size -= size
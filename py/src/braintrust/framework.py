@@ -3,20 +3,33 @@ import asyncio
 import contextvars
 import dataclasses
 import inspect
+import itertools
 import json
+import math
+import multiprocessing.util
+import os
+import queue
 import re
+import statistics
 import sys
+import tempfile
+import threading
+import time
 import traceback
 import warnings
-from collections import defaultdict
-from concurrent.futures import ThreadPoolExecutor
+import weakref
+from array import array
+from collections import defaultdict, deque
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
 from contextlib import contextmanager
-from multiprocessing import cpu_count
+from functools import partial
+from multiprocessing import cpu_count, get_context
 from typing import (
     Any,
     Awaitable,
     Callable,
     Coroutine,
+    Deque,
     Dict,
     Generic,
     Iterable,
@@ -25,19 +38,30 @@ from typing import (
     Literal,
     Optional,
     Sequence,
+    Set,
+    Tuple,
     Type,
     TypeVar,
     Union,
 )
 
 import exceptiongroup
+import slugify
 from braintrust_core.score import Score, Scorer
 from braintrust_core.serializable_data_class import SerializableDataClass
-from tqdm.asyncio import tqdm as async_tqdm
 from tqdm.auto import tqdm as std_tqdm
 from typing_extensions import NotRequired, TypedDict
 
+from .bt_json import bt_dumps
 from .git_fields import GitMetadataSettings, RepoInfo
+from .local_summary import (
+    ExperimentColumns,
+    input_key,
+    shard_summary,
+    summarize_metrics,
+    summarize_scores,
+    with_distributions,
+)
 from .logger import (
     NOOP_SPAN,
     Dataset,
@@ -46,17 +70,40 @@ from .logger import (
     Metadata,
     ScoreSummary,
     Span,
+    TrialsSummary,
     _ExperimentDatasetEvent,
+    _export_login_args,
+    _resume_span,
+    _span_metrics_accumulator,
+    _SpanMetricsAccumulator,
+    current_span,
+    flush,
+    login,
     stringify_exception,
 )
 from .logger import init as _init_experiment
+from .prompt_cache.disk_cache import DiskCache
+from .rate_limit import AdaptiveConcurrencyLimit, RateLimit, is_rate_limit_error, rate_limited, rate_limits
 from .resource_manager import ResourceManager
+from .scorer_cache import ScorerCache, create_cache_key, scorer_version
 from .span_types import SpanTypeAttribute
+from .task_cache import ExperimentTaskOutputStore, LocalTaskOutputStore, task_fingerprint
 from .util import bt_iscoroutinefunction, eprint
 
 Input = TypeVar("Input")
 Output = TypeVar("Output")
 
+# The page size used to stream the base experiment's rows when summarizing locally.
+_BASE_EXPERIMENT_FETCH_BATCH_SIZE = 1000
+
+# The maximum number of test cases which are in flight at once when there is no max concurrency. Test cases are only
+# pulled from the data iterator as earlier ones finish, so that memory use does not grow with the size of the dataset.
+_DEFAULT_TASK_WINDOW = 1000
+
+# The maximum number of results which are held back, waiting for an earlier test case to finish, so that results are
+# still collected in data order.
+_MAX_REORDER_BUFFER = 1000
+
 
 # https://stackoverflow.com/questions/287871/how-do-i-print-colored-text-to-the-terminal
 class bcolors:
@@ -127,6 +174,7 @@ class EvalResult(SerializableDataClass, Generic[Input, Output]):
     tags: Optional[List[str]] = None
     error: Optional[Exception] = None
     exc_info: Optional[str] = None
+    metrics: Optional[Dict[str, float]] = None
 
 
 class EvalHooks(abc.ABC, Generic[Output]):
@@ -226,6 +274,112 @@ EvalTask = Union[
 
 ErrorScoreHandler = Callable[[Span, EvalCase[Input, Output], List[str]], Optional[Dict[str, float]]]
 
+# The 97.5th percentile of the standard normal distribution.
+_Z_975 = 1.96
+
+# The 97.5th percentiles of Student's t distribution, by degrees of freedom (starting at 1), for the 95% confidence
+# intervals of the mean of a few trials. More trials use the normal approximation.
+_T_QUANTILES_975 = [
+    12.706,
+    4.303,
+    3.182,
+    2.776,
+    2.571,
+    2.447,
+    2.365,
+    2.306,
+    2.262,
+    2.228,
+    2.201,
+    2.179,
+    2.160,
+    2.145,
+    2.131,
+    2.120,
+    2.110,
+    2.101,
+    2.093,
+    2.086,
+    2.080,
+    2.074,
+    2.069,
+    2.064,
+    2.060,
+    2.056,
+    2.052,
+    2.048,
+    2.045,
+    2.042,
+]
+
+
+@dataclasses.dataclass
+class AdaptiveTrials:
+    """
+    Settings for adaptive trials, which run each test case until its scores are stable, up to `max_trials` times,
+    instead of a fixed number of times.
+
+    Each test case first runs `min_trials` trials concurrently, and then one more trial at a time until each of its
+    scores is stable across its trials: either their standard deviation is at most `max_stddev`, or the 95% confidence
+    interval of their mean extends at most `max_ci_half_width` on either side of it. Test cases whose trials all fail
+    stop after `min_trials`.
+
+    Since a few trials of a flaky test case can agree by chance, identical scores are not stable right away: like the
+    Wilson score interval, the variance of a score is at least about 1 / n after n trials. For example, a test case
+    whose scores never change is stable after 6 trials with the default `max_ci_half_width` of 0.2, and after 16 with
+    0.1.
+    """
+
+    max_trials: int = 10
+    """The maximum number of trials per test case."""
+
+    min_trials: int = 2
+    """The number of trials to run before checking whether a test case's scores are stable."""
+
+    max_ci_half_width: Optional[float] = 0.2
+    """
+    The maximum half-width of the 95% confidence interval of the mean of a stable score. None to only use
+    `max_stddev`.
+    """
+
+    max_stddev: Optional[float] = None
+    """The maximum standard deviation of a stable score. None to only use `max_ci_half_width`."""
+
+    def __post_init__(self):
+        if not 1 <= self.min_trials <= self.max_trials:
+            raise ValueError(
+                f"Adaptive trials must satisfy 1 <= min_trials <= max_trials, got min_trials={self.min_trials} and max_trials={self.max_trials}"
+            )
+
+    def is_stable(self, results: Sequence["EvalResult"]) -> bool:
+        """Returns whether the scores of a test case's trials so far are stable, so that no more trials are needed."""
+        if len(results) < self.min_trials:
+            return False
+        values: Dict[str, List[float]] = {}
+        for result in results:
+            for name, score in (result.scores or {}).items():
+                if score is not None:
+                    values.setdefault(name, []).append(score)
+        for scores in values.values():
+            n = len(scores)
+            if n < 2:
+                return False
+            # A few trials of a flaky test case often agree (e.g. two passes of a task which fails a third of the time),
+            # so zero sample variance at small n does not show that a score is stable. As in the Wilson score interval
+            # for scores between 0 and 1, the variance includes a floor of z^2 / 4n, which only vanishes with more
+            # trials.
+            variance = (statistics.pvariance(scores) * n + _Z_975**2 / 4) / (n + _Z_975**2)
+            if self.max_stddev is not None and math.sqrt(variance) <= self.max_stddev:
+                continue
+            t = _T_QUANTILES_975[n - 2] if n - 1 <= len(_T_QUANTILES_975) else _Z_975
+            half_width = max(
+                t * statistics.stdev(scores) / math.sqrt(n), _Z_975 * math.sqrt(variance / (n + _Z_975**2))
+            )
+            if self.max_ci_half_width is not None and half_width <= self.max_ci_half_width:
+                continue
+            return False
+        return True
+
 
 @dataclasses.dataclass
 class Evaluator(Generic[Input, Output]):
@@ -285,6 +439,13 @@ class Evaluator(Generic[Input, Output]):
     variance in the results.
     """
 
+    adaptive_trials: Optional[AdaptiveTrials] = None
+    """
+    If specified, each input runs until its scores are stable, up to a maximum number of trials, instead of
+    `trial_count` times. Stable test cases stop after a few trials, so the same statistical signal costs fewer task
+    and scorer calls. The number of trials run is reported in the summary.
+    """
+
     is_public: bool = False
     """
     Whether the experiment should be public. Defaults to false.
@@ -301,10 +462,35 @@ class Evaluator(Generic[Input, Output]):
     Defaults to None, in which case there is no timeout.
     """
 
-    max_concurrency: Optional[int] = None
+    task_timeout: Optional[float] = None
+    """
+    The duration, in seconds, after which to time out the task of each test case. A test case whose task times out
+    fails with a `TimeoutError`, which is logged to its root span, and frees its concurrency slot, so that a few hung
+    test cases do not stall the evaluator. Async tasks are cancelled. Synchronous tasks cannot be interrupted, so they
+    keep running in their thread (or process) until they return, and their output is discarded. Their threads are
+    daemon threads, which do not keep the interpreter alive on exit, and do not count against the thread pool's
+    `max_workers`. The timeout of a synchronous task starts once it runs, rather than while it waits for a free
+    thread (tasks run with `process_executor` include the time they wait for a free process). Defaults to None, in
+    which case there is no timeout.
+    """
+
+    scorer_timeout: Optional[float] = None
+    """
+    The duration, in seconds, after which to time out each scorer of each test case. A scorer which times out fails
+    with a `TimeoutError`, like any other scorer error. Synchronous scorers are timed like synchronous tasks (see
+    `task_timeout`). Defaults to None, in which case there is no timeout.
+    """
+
+    max_concurrency: Optional[Union[int, Literal["auto"]]] = None
     """
     The maximum number of tasks/scorers that will be run concurrently.
-    Defaults to None, in which case there is no max concurrency.
+    Defaults to None, in which case there is no max concurrency, although at most 1000 test cases are in flight at
+    once. This limits whole test cases, including their task and all of their scorers. To limit individual tasks and
+    scorers (e.g. an LLM-based scorer, by its provider's rate limits), decorate them with a `RateLimit`.
+
+    If "auto", the limit adapts as the evaluator runs, with additive increase and multiplicative decrease: it starts
+    low and grows while test cases complete at a steady latency, and is cut when their task or scorers hit a rate
+    limit (e.g. an HTTP 429 error) or their latency rises. The current limit is shown in the progress bar.
     """
 
     project_id: Optional[str] = None
@@ -342,11 +528,384 @@ class Evaluator(Generic[Input, Output]):
     A default implementation is exported as `default_error_score_handler` which will log a 0 score to the root span for any scorer that was not run.
     """
 
+    summarize_locally: bool = False
+    """
+    Whether to summarize the experiment and compare it to its base experiment on the client, from the base experiment's
+    rows, instead of waiting for the server to summarize it. Defaults to false.
+    """
+
+    results_path: Optional[str] = None
+    """
+    If specified, each result is written to this JSONL file as soon as it completes.
+    """
+
+    cache_scorers: bool = False
+    """
+    Whether to cache scorer results on disk, keyed by the scorer's version and a hash of its arguments, so that
+    re-runs only run the scorers and test cases which changed. A scorer's version defaults to a hash of its source
+    code and JSON serializable attributes, and can be set explicitly with a `scorer_version` attribute. Calls whose
+    arguments are not JSON serializable are not cached. The cache is stored in `BRAINTRUST_SCORER_CACHE_DIR` (defaults
+    to `~/.braintrust/scorer_cache`), and its hits and misses are reported in the summary. Defaults to false.
+    """
+
+    reuse_task_outputs: Union[bool, str] = False
+    """
+    Whether to score previously recorded task outputs instead of running the task again, e.g. when iterating on
+    scorers. If true, outputs are recorded on disk in `BRAINTRUST_TASK_OUTPUT_CACHE_DIR` (defaults to
+    `~/.braintrust/task_output_cache`), keyed by the test case (its input, expected output and metadata), the trial
+    index and a fingerprint of the task's code, and replayed on later runs. The fingerprint defaults to a hash of the task's source code, and can be set explicitly
+    with a `task_version` attribute. If the name of an experiment in the project, the outputs logged by that
+    experiment are replayed instead, matching test cases by input. Test cases without a recorded output run the task.
+    Defaults to false.
+    """
+
+    checkpoint: Union[bool, str] = False
+    """
+    Whether to record each completed test case in a local journal, so that the evaluator can be resumed with `resume`
+    if it is interrupted. If a string, the path of the journal. If true, the journal is stored in
+    `BRAINTRUST_EVAL_CHECKPOINT_DIR` (defaults to `~/.braintrust/eval_checkpoints`). Defaults to false.
+    """
+
+    resume: bool = False
+    """
+    Whether to resume from the evaluator's checkpoint (see `checkpoint`, which defaults to true when resuming). Test
+    cases which completed are skipped and their recorded results are included in the results and summary, and the
+    evaluator continues logging to the checkpoint's experiment. Test cases which were in flight when the evaluator was
+    interrupted run again, so their rows may be logged twice. Defaults to false.
+    """
+
+    shard_index: Optional[int] = None
+    """
+    The index of the shard to run, from 0 to `shard_count - 1`, to split an evaluator across several machines. Test
+    cases are assigned to shards by a hash of their input, so every shard reads the same data and runs a disjoint part
+    of it, and all trials of a test case run in the same shard. The shards log to the same experiment, so
+    `experiment_name` must be set.
+    """
+
+    shard_count: Optional[int] = None
+    """
+    The total number of shards. See `shard_index`.
+    """
+
+    shard_summary_path: Optional[str] = None
+    """
+    If specified, a JSON file to write the shard's summary to, including its scores and metrics. The summaries of all
+    shards can be combined with `braintrust merge-summary`.
+    """
+
+    executor: Literal["thread", "process"] = "thread"
+    """
+    Where to run synchronous task and scorer functions. With "thread" (the default), they run in a thread pool. With
+    "process", they run in a process pool, which lets CPU-bound functions run in parallel despite the GIL. Functions
+    which run in a process pool, and their arguments and return values, must be picklable. Individual functions can
+    also be marked to run in the process pool with `process_executor`.
+    """
+
+    max_results_in_memory: Optional[int] = None
+    """
+    The maximum number of results to hold in memory. Further results are written to disk (to `results_path`, or to a
+    temporary file if it is not specified) and read back lazily. Defaults to None, in which case every result is held
+    in memory.
+    """
+
+
+class EvalResults(Sequence[EvalResult[Input, Output]]):
+    """
+    The results of an evaluator, in the order of its data.
+
+    The first results are held in memory, up to an optional cap, and the rest are streamed to a JSONL file and read
+    back lazily when iterated. Results which are read back from disk are deserialized from JSON: values which are not
+    JSON serializable come back as strings, and errors come back as an `Exception` with the original error's message.
+    """
+
+    def __init__(self, path: Optional[str] = None, max_in_memory: Optional[int] = None):
+        """
+        :param path: (Optional) A JSONL file to write every result to.
+        :param max_in_memory: (Optional) The maximum number of results to hold in memory.
+        """
+        self._path = path
+        self._max_in_memory = max_in_memory
+        self._in_memory: List[EvalResult[Input, Output]] = []
+        self._len = 0
+        self._file = None
+        self._is_temporary = False
+        # The size of the file, and the offset in it of each result which is not held in memory.
+        self._file_size = 0
+        self._offsets = array("q")
+        if path is not None:
+            self._open(open(path, "wb"), path, is_temporary=False)
+
+    def _open(self, f, path: str, is_temporary: bool) -> None:
+        self._file = f
+        self._path = path
+        self._is_temporary = is_temporary
+        # The file is closed, and removed if it is temporary, once the results are garbage collected.
+        weakref.finalize(self, _close_results_file, f, path if is_temporary else None)
+
+    def append(self, result: EvalResult[Input, Output]) -> None:
+        """Adds a result."""
+        in_memory = self._max_in_memory is None or len(self._in_memory) < self._max_in_memory
+        if in_memory:
+            self._in_memory.append(result)
+        elif self._file is None:
+            fd, path = tempfile.mkstemp(prefix="braintrust-eval-results-", suffix=".jsonl")
+            self._open(os.fdopen(fd, "wb"), path, is_temporary=True)
+        if self._file is not None and (not in_memory or not self._is_temporary):
+            line = bt_dumps(_serialize_eval_result(result)).encode("utf-8") + b"\n"
+            if not in_memory:
+                self._offsets.append(self._file_size)
+            self._file.write(line)
+            self._file_size += len(line)
+        self._len += 1
+
+    @property
+    def path(self) -> Optional[str]:
+        """The file results are written to, if any."""
+        return self._path
+
+    def close(self) -> None:
+        """
+        Closes the results file. No more results can be added, but the results can still be read. Temporary results
+        files are deleted once the results are garbage collected.
+        """
+        if self._file is not None:
+            self._file.close()
+
+    def __len__(self) -> int:
+        return self._len
+
+    def _flush(self) -> None:
+        if self._file is not None and not self._file.closed:
+            self._file.flush()
+
+    def __iter__(self) -> Iterator[EvalResult[Input, Output]]:
+        yield from self._in_memory
+        if not self._offsets:
+            return
+        self._flush()
+        with open(self._path, "rb") as f:
+            f.seek(self._offsets[0])
+            for line in itertools.islice(f, len(self._offsets)):
+                yield _deserialize_eval_result(json.loads(line))
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return list(self)[index]
+        if index < 0:
+            index += self._len
+        if not 0 <= index < self._len:
+            raise IndexError("EvalResults index out of range")
+        if index < len(self._in_memory):
+            return self._in_memory[index]
+        self._flush()
+        with open(self._path, "rb") as f:
+            f.seek(self._offsets[index - len(self._in_memory)])
+            return _deserialize_eval_result(json.loads(f.readline()))
+
+    def __repr__(self):
+        return f"EvalResults(len={self._len}, path={self._path!r})"
+
+
+def _close_results_file(f, path: Optional[str]) -> None:
+    f.close()
+    if path is None:
+        return
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _serialize_eval_result(result: EvalResult) -> Dict[str, Any]:
+    return {
+        "input": result.input,
+        "output": result.output,
+        "scores": result.scores,
+        "expected": result.expected,
+        "metadata": result.metadata,
+        "tags": result.tags,
+        "error": (
+            "".join(traceback.format_exception_only(type(result.error), result.error)).strip()
+            if result.error is not None
+            else None
+        ),
+        "exc_info": result.exc_info,
+        "metrics": result.metrics,
+    }
+
+
+def _deserialize_eval_result(row: Dict[str, Any]) -> EvalResult:
+    error = row.get("error")
+    return EvalResult(**{**row, "error": Exception(error) if error is not None else None})
+
+
+def _checkpoint_key(datum: EvalCase) -> str:
+    """Identifies a test case in a checkpoint, by its id if it has one, or else by its contents."""
+    if datum.id is not None:
+        return input_key({"id": datum.id}).hex()
+    return input_key([datum.input, datum.expected, datum.metadata]).hex()
+
+
+class EvalCheckpoint:
+    """
+    A journal of an evaluator's completed test cases, which is used to resume the evaluator if it is interrupted.
+
+    The journal is a JSONL file. Its first line is a header which records the experiment the evaluator logs to, and
+    every other line records the result of a test case (identified by its id or contents, and its trial index) as soon
+    as it completes. Test cases which failed are not recorded, so they run again when resuming. A truncated last line,
+    e.g. from a crash in the middle of a write, is ignored.
+    """
+
+    def __init__(self, path: str):
+        """
+        :param path: The path of the journal.
+        """
+        self.path = path
+        self.header: Optional[Dict[str, Any]] = None
+        self._completed: Dict[Tuple[str, int], Dict[str, Any]] = {}
+        # The length of the valid prefix of a loaded journal.
+        self._valid_length = 0
+        self._file = None
+
+    @staticmethod
+    def read_header(path: str) -> Optional[Dict[str, Any]]:
+        """Returns the header of a journal, or None if the journal does not exist or is empty."""
+        try:
+            with open(path, encoding="utf-8") as f:
+                return json.loads(f.readline())
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    @classmethod
+    def load(cls, path: str) -> "EvalCheckpoint":
+        """Loads the test cases recorded in an existing journal, so that they are skipped."""
+        ret = cls(path)
+        with open(path, "rb") as f:
+            for i, line in enumerate(f):
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    row = json.loads(line)
+                except ValueError:
+                    break
+                if i == 0:
+                    ret.header = row
+                else:
+                    ret._completed[(row["key"], row["trial_index"])] = row["result"]
+                ret._valid_length += len(line)
+        return ret
+
+    def __len__(self) -> int:
+        return len(self._completed)
+
+    def open(self, header: Dict[str, Any]) -> None:
+        """
+        Opens the journal for writing. A loaded journal is appended to, and any other journal is overwritten.
+
+        :param header: The header to write, if the journal does not have one yet.
+        """
+        dirname = os.path.dirname(self.path)
+        if dirname:
+            os.makedirs(dirname, exist_ok=True)
+        if self.header is None:
+            self._file = open(self.path, "w", encoding="utf-8")
+            self.header = header
+            self._write(header)
+        else:
+            self._file = open(self.path, "a", encoding="utf-8")
+            # Drop any truncated line, so that new lines are not appended to it.
+            self._file.truncate(self._valid_length)
+
+    def _write(self, row: Dict[str, Any]) -> None:
+        self._file.write(bt_dumps(row))
+        self._file.write("\n")
+        # Flush every line, so that completed test cases survive a crash.
+        self._file.flush()
+
+    def completed(self, datum: EvalCase, trial_index: int) -> Optional[EvalResult]:
+        """Returns the recorded result of a test case, or None if it has not completed."""
+        row = self._completed.get((_checkpoint_key(datum), trial_index))
+        return _deserialize_eval_result(row) if row is not None else None
+
+    def record(self, datum: EvalCase, trial_index: int, result: EvalResult) -> None:
+        """Records the result of a completed test case."""
+        key = _checkpoint_key(datum)
+        row = _serialize_eval_result(result)
+        self._completed[(key, trial_index)] = row
+        self._write(dict(key=key, trial_index=trial_index, result=row))
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def _checkpoint_path(evaluator: "Evaluator") -> Optional[str]:
+    if isinstance(evaluator.checkpoint, str):
+        return evaluator.checkpoint
+    if not evaluator.checkpoint and not evaluator.resume:
+        return None
+    checkpoint_dir = os.environ.get(
+        "BRAINTRUST_EVAL_CHECKPOINT_DIR", f"{os.environ.get('HOME')}/.braintrust/eval_checkpoints"
+    )
+    return os.path.join(checkpoint_dir, f"{slugify.slugify(evaluator.eval_name)}.jsonl")
+
+
+def _resume_evaluator(evaluator: "Evaluator") -> "Evaluator":
+    """
+    If the evaluator resumes from a checkpoint, returns a copy of it which logs to the checkpoint's experiment, so that
+    the experiment can be initialized before the checkpoint is loaded.
+    """
+    if not evaluator.resume:
+        return evaluator
+    header = EvalCheckpoint.read_header(_checkpoint_path(evaluator))
+    if header is None or not header.get("experiment_name"):
+        return evaluator
+    return dataclasses.replace(evaluator, experiment_name=header["experiment_name"], update=True)
+
+
+def _shard_evaluator(evaluator: "Evaluator") -> "Evaluator":
+    """
+    If the evaluator runs one of several shards, returns a copy of it which logs to the experiment shared by all of
+    the shards, whichever shard initializes it first.
+    """
+    if evaluator.shard_count is None:
+        return evaluator
+    if evaluator.experiment_name is None:
+        raise ValueError(
+            f"Evaluator {evaluator.eval_name} must specify an experiment name to run in shards, so that all shards log to the same experiment"
+        )
+    return dataclasses.replace(evaluator, update=True)
+
+
+def _in_shard(evaluator: "Evaluator", datum: EvalCase) -> bool:
+    if evaluator.shard_count is None:
+        return True
+    return int.from_bytes(input_key(datum.input)[:8], "big") % evaluator.shard_count == evaluator.shard_index
+
+
+def _open_checkpoint(evaluator: "Evaluator", experiment: Optional[Experiment]) -> Optional[EvalCheckpoint]:
+    path = _checkpoint_path(evaluator)
+    if path is None:
+        return None
+    checkpoint = EvalCheckpoint.load(path) if evaluator.resume and os.path.exists(path) else EvalCheckpoint(path)
+    if len(checkpoint):
+        eprint(f"Resuming {evaluator.eval_name} from {path} ({len(checkpoint)} completed test cases)")
+    checkpoint.open(
+        dict(
+            eval_name=evaluator.eval_name,
+            project_name=evaluator.project_name,
+            experiment_name=experiment.name if experiment else evaluator.experiment_name,
+            experiment_id=experiment.id if experiment else None,
+        )
+    )
+    return checkpoint
+
 
 @dataclasses.dataclass
 class EvalResultWithSummary(SerializableDataClass, Generic[Input, Output]):
     summary: ExperimentSummary
-    results: List[EvalResult[Input, Output]]
+    results: Sequence[EvalResult[Input, Output]]
 
     def _repr_pretty_(self, p, cycle):
         p.text(f'EvalResultWithSummary(summary="...", results=[...])')
@@ -355,12 +914,145 @@ class EvalResultWithSummary(SerializableDataClass, Generic[Input, Output]):
 EvalReport = TypeVar("EvalReport")
 
 
+# The executor used to run synchronous functions which are not marked with `process_executor`. This is set for the
+# duration of an evaluator to its `executor`.
+_default_executor: contextvars.ContextVar[str] = contextvars.ContextVar("braintrust_eval_executor", default="thread")
+
+_EXECUTOR_ATTR = "_braintrust_executor"
+
+
+def process_executor(f: Callable) -> Callable:
+    """
+    Marks a synchronous task or scorer function to run in a process pool during evals, instead of a thread pool. Use
+    this for CPU-bound functions (e.g. BLEU/ROUGE or embedding similarity), which do not run in parallel across threads
+    because of the GIL. The function, its arguments, and its return value must be picklable, so it must be defined at
+    the top level of a module. Spans started by the function are attached to the calling span.
+
+    ```python
+    @process_executor
+    def rouge(input, output, expected):
+        ...
+    ```
+    """
+    setattr(f, _EXECUTOR_ATTR, "process")
+    return f
+
+
+_BATCH_ATTR = "_braintrust_batch"
+
+
+class BatchScorer(Scorer):
+    """
+    A scorer which scores a batch of test cases at once, e.g. with vectorized NumPy operations or a single forward
+    pass of a model. During evals, the framework collects the test cases which reach the scorer into batches of up to
+    `max_batch_size`, waiting at most `max_batch_wait` seconds for a batch to fill up, and logs a score span for each
+    test case. Spans started by the scorer itself are not attached to any one test case.
+
+    Subclasses implement `_run_eval_batch_sync` or `_run_eval_batch_async` (or both), which take lists of outputs,
+    expected values, and other arguments (`inputs` and `metadatas`), and return one score for each test case. The
+    scorer can also be called on a single test case, as a batch of one. A subclass which only implements
+    `_run_eval_batch_async` can only be called asynchronously.
+    """
+
+    max_batch_size: int = 32
+    """The maximum number of test cases in a batch."""
+
+    max_batch_wait: float = 0.05
+    """The maximum number of seconds to wait for a batch to fill up before scoring it."""
+
+    def __new__(cls, *args: Any, **kwargs: Any):
+        # Each batch method defaults to the other, so a subclass must override at least one of them, in the same way
+        # that `Scorer` subclasses must implement `_run_eval_sync`.
+        if (
+            cls._run_eval_batch_sync is BatchScorer._run_eval_batch_sync
+            and cls._run_eval_batch_async is BatchScorer._run_eval_batch_async
+        ):
+            raise TypeError(
+                f"Can't instantiate {cls.__name__} without an implementation of _run_eval_batch_sync or _run_eval_batch_async"
+            )
+        return super().__new__(cls)
+
+    async def eval_batch_async(
+        self, outputs: List[Any], expecteds: Optional[List[Any]] = None, **kwargs: Any
+    ) -> List[Any]:
+        return await self._run_eval_batch_async(outputs, expecteds, **kwargs)
+
+    def eval_batch(self, outputs: List[Any], expecteds: Optional[List[Any]] = None, **kwargs: Any) -> List[Any]:
+        return self._run_eval_batch_sync(outputs, expecteds, **kwargs)
+
+    async def _run_eval_batch_async(
+        self, outputs: List[Any], expecteds: Optional[List[Any]] = None, **kwargs: Any
+    ) -> List[Any]:
+        return self._run_eval_batch_sync(outputs, expecteds, **kwargs)
+
+    def _run_eval_batch_sync(
+        self, outputs: List[Any], expecteds: Optional[List[Any]] = None, **kwargs: Any
+    ) -> List[Any]:
+        raise NotImplementedError(
+            f"{type(self).__name__} only implements _run_eval_batch_async, so it must be called asynchronously"
+        )
+
+    async def _run_eval_async(self, output: Any, expected: Any = None, **kwargs: Any) -> Score:
+        return (await self._run_eval_batch_async([output], [expected], **{f"{k}s": [v] for k, v in kwargs.items()}))[0]
+
+    def _run_eval_sync(self, output: Any, expected: Any = None, **kwargs: Any) -> Score:
+        return self._run_eval_batch_sync([output], [expected], **{f"{k}s": [v] for k, v in kwargs.items()})[0]
+
+
+def batch_scorer(f: Optional[Callable] = None, *, max_batch_size: int = 32, max_batch_wait: float = 0.05) -> Callable:
+    """
+    Marks a scorer function as a batch scorer, which scores a batch of test cases at once (see `BatchScorer`). The
+    function takes lists of `outputs`, `expecteds`, `inputs`, and `metadatas` (or any subset of them, by name), and
+    returns one score for each test case.
+
+    ```python
+    @batch_scorer(max_batch_size=64)
+    def cosine_similarity(outputs, expecteds):
+        ...
+    ```
+
+    :param max_batch_size: The maximum number of test cases in a batch.
+    :param max_batch_wait: The maximum number of seconds to wait for a batch to fill up before scoring it.
+    """
+
+    def decorator(f):
+        setattr(f, _BATCH_ATTR, (max_batch_size, max_batch_wait))
+        return f
+
+    return decorator(f) if f is not None else decorator
+
+
+def _uses_process_executor(f) -> bool:
+    return getattr(f, _EXECUTOR_ATTR, None) == "process" or _default_executor.get() == "process"
+
+
 async def await_or_run(event_loop, f, *args, **kwargs):
     if bt_iscoroutinefunction(f):
         return await f(*args, **kwargs)
+    elif _uses_process_executor(f):
+        parent_span = current_span()
+        parent = parent_span.export() if parent_span is not NOOP_SPAN else None
+        parent_span_parents = getattr(parent_span, "span_parents", None)
+        login_args = _export_login_args() if parent else None
+        with _PROCESS_POOL_SINGLETON.get() as process_pool:
+            return await event_loop.run_in_executor(
+                process_pool.process_pool(),
+                _run_in_process,
+                f,
+                args,
+                kwargs,
+                parent,
+                parent_span_parents,
+                login_args,
+            )
     else:
 
+        # The timeout of a function which is waiting for a worker thread starts once it runs.
+        clock = _timeout_clock.get()
+
         def run_f(args, kwargs, ctx):
+            if clock is not None:
+                event_loop.call_soon_threadsafe(clock.start)
             tokens = [(var, var.set(value)) for var, value in ctx.items()]
             try:
                 return f(*args, **kwargs)
@@ -369,9 +1061,18 @@ async def await_or_run(event_loop, f, *args, **kwargs):
                     var.reset(tok)
 
         with _THREAD_POOL_SINGLETON.get() as thread_pool:
-            return await event_loop.run_in_executor(
-                thread_pool.thread_pool(), run_f, args, kwargs, contextvars.copy_context()
-            )
+            executor = thread_pool.thread_pool()
+        if clock is not None:
+            clock.enqueue()
+        future = executor.submit(run_f, args, kwargs, contextvars.copy_context())
+        try:
+            return await asyncio.wrap_future(future, loop=event_loop)
+        except asyncio.CancelledError:
+            # A function which already started cannot be interrupted (e.g. when it times out), so it keeps running on
+            # its daemon thread until it returns, and queued functions run on other threads.
+            if not future.cancel():
+                executor.detach(future)
+            raise
 
 
 def _call_user_fn_args(fn, kwargs):
@@ -406,6 +1107,87 @@ async def call_user_fn(event_loop, fn, **kwargs):
     return await await_or_run(event_loop, fn, *positional_args, **final_kwargs)
 
 
+class _ScorerBatcher:
+    """
+    Collects the calls to a batch scorer into batches, which are scored once they are full or their first call has
+    waited for `max_batch_wait` seconds.
+    """
+
+    def __init__(self, event_loop, scorer, executor: str):
+        self._event_loop = event_loop
+        if isinstance(scorer, BatchScorer):
+            if type(scorer)._run_eval_batch_async is not BatchScorer._run_eval_batch_async:
+                self._fn = scorer.eval_batch_async
+            elif getattr(scorer, _EXECUTOR_ATTR, None) == "process":
+                self._fn = process_executor(partial(scorer.eval_batch))
+            else:
+                # Run the synchronous version in the executor, rather than blocking the event loop.
+                self._fn = scorer.eval_batch
+            self.max_batch_size, self.max_batch_wait = scorer.max_batch_size, scorer.max_batch_wait
+        else:
+            self._fn = scorer
+            self.max_batch_size, self.max_batch_wait = getattr(scorer, _BATCH_ATTR)
+        self._limits = rate_limits(scorer)
+        self._executor = executor
+        # Batches run in the context the batcher was created in, rather than that of the test case which happened to
+        # fill them up, so that the spans they start are not attached to that test case.
+        self._context = contextvars.copy_context()
+        self._pending: List[Tuple[Dict[str, Any], asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._running: Set[asyncio.Future] = set()
+
+    @staticmethod
+    def is_batch_scorer(scorer) -> bool:
+        return isinstance(scorer, BatchScorer) or hasattr(scorer, _BATCH_ATTR)
+
+    async def score(self, **kwargs):
+        """Scores a test case as part of a batch, and returns its result."""
+        future = self._event_loop.create_future()
+        self._pending.append((kwargs, future))
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = self._event_loop.call_later(self.max_batch_wait, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = self._context.run(asyncio.ensure_future, self._run(batch))
+            # Hold a reference to the task until it finishes, so that it is not garbage collected.
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _run(self, batch: List[Tuple[Dict[str, Any], asyncio.Future]]):
+        _default_executor.set(self._executor)
+        try:
+            async with rate_limited(self._limits):
+                results = await call_user_fn(
+                    self._event_loop,
+                    self._fn,
+                    outputs=[kwargs["output"] for kwargs, _ in batch],
+                    expecteds=[kwargs["expected"] for kwargs, _ in batch],
+                    inputs=[kwargs["input"] for kwargs, _ in batch],
+                    metadatas=[kwargs["metadata"] for kwargs, _ in batch],
+                )
+            results = list(results)
+            if len(results) != len(batch):
+                raise ValueError(
+                    f"Batch scorer returned {len(results)} results for a batch of {len(batch)} test cases"
+                )
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+
 @dataclasses.dataclass
 class ReporterDef(SerializableDataClass, Generic[Input, Output, EvalReport]):
     """
@@ -556,13 +1338,27 @@ def _EvalCommon(
     update: bool,
     reporter: Optional[ReporterDef[Input, Output, EvalReport]],
     timeout: Optional[float],
-    max_concurrency: Optional[int],
+    max_concurrency: Optional[Union[int, Literal["auto"]]],
     project_id: Optional[str],
     base_experiment_name: Optional[str],
     base_experiment_id: Optional[str],
     git_metadata_settings: Optional[GitMetadataSettings],
     repo_info: Optional[RepoInfo],
     error_score_handler: Optional[ErrorScoreHandler] = None,
+    summarize_locally: bool = False,
+    results_path: Optional[str] = None,
+    max_results_in_memory: Optional[int] = None,
+    executor: Literal["thread", "process"] = "thread",
+    cache_scorers: bool = False,
+    reuse_task_outputs: Union[bool, str] = False,
+    checkpoint: Union[bool, str] = False,
+    resume: bool = False,
+    shard_index: Optional[int] = None,
+    shard_count: Optional[int] = None,
+    shard_summary_path: Optional[str] = None,
+    task_timeout: Optional[float] = None,
+    scorer_timeout: Optional[float] = None,
+    adaptive_trials: Optional[AdaptiveTrials] = None,
 ) -> Callable[[], Coroutine[Any, Any, EvalResultWithSummary[Input, Output]]]:
     """
     This helper is needed because in case of `_lazy_load`, we need to update
@@ -594,6 +1390,20 @@ def _EvalCommon(
         git_metadata_settings=git_metadata_settings,
         repo_info=repo_info,
         error_score_handler=error_score_handler,
+        summarize_locally=summarize_locally,
+        results_path=results_path,
+        max_results_in_memory=max_results_in_memory,
+        executor=executor,
+        cache_scorers=cache_scorers,
+        reuse_task_outputs=reuse_task_outputs,
+        checkpoint=checkpoint,
+        resume=resume,
+        shard_index=shard_index,
+        shard_count=shard_count,
+        shard_summary_path=shard_summary_path,
+        task_timeout=task_timeout,
+        scorer_timeout=scorer_timeout,
+        adaptive_trials=adaptive_trials,
     )
 
     if _lazy_load:
@@ -611,6 +1421,7 @@ def _EvalCommon(
             )
 
         reporter = reporter or default_reporter
+        evaluator = _shard_evaluator(_resume_evaluator(evaluator))
 
         if base_experiment_name is None and isinstance(evaluator.data, BaseExperiment):
             base_experiment_name = evaluator.data.name
@@ -658,12 +1469,26 @@ async def EvalAsync(
     update: bool = False,
     reporter: Optional[ReporterDef[Input, Output, EvalReport]] = None,
     timeout: Optional[float] = None,
-    max_concurrency: Optional[int] = None,
+    max_concurrency: Optional[Union[int, Literal["auto"]]] = None,
     project_id: Optional[str] = None,
     base_experiment_name: Optional[str] = None,
     base_experiment_id: Optional[str] = None,
     git_metadata_settings: Optional[GitMetadataSettings] = None,
     repo_info: Optional[RepoInfo] = None,
+    summarize_locally: bool = False,
+    results_path: Optional[str] = None,
+    max_results_in_memory: Optional[int] = None,
+    executor: Literal["thread", "process"] = "thread",
+    cache_scorers: bool = False,
+    reuse_task_outputs: Union[bool, str] = False,
+    checkpoint: Union[bool, str] = False,
+    resume: bool = False,
+    shard_index: Optional[int] = None,
+    shard_count: Optional[int] = None,
+    shard_summary_path: Optional[str] = None,
+    task_timeout: Optional[float] = None,
+    scorer_timeout: Optional[float] = None,
+    adaptive_trials: Optional[AdaptiveTrials] = None,
 ) -> EvalResultWithSummary[Input, Output]:
     """
     A function you can use to define an evaluator. This is a convenience wrapper around the `Evaluator` class.
@@ -701,6 +1526,10 @@ async def EvalAsync(
     :param reporter: (Optional) A reporter that takes an evaluator and its result and returns a report.
     :param timeout: (Optional) The duration, in seconds, after which to time out the evaluation.
     Defaults to None, in which case there is no timeout.
+    :param max_concurrency: (Optional) The maximum number of test cases to run concurrently. If "auto", the limit adapts to the observed latency and rate limit errors.
+    :param task_timeout: (Optional) The duration, in seconds, after which to time out the task of each test case. The test case fails with a `TimeoutError` and frees its concurrency slot. Synchronous tasks cannot be interrupted, so they keep running on a daemon thread until they return. The timeout starts once the task runs.
+    :param scorer_timeout: (Optional) The duration, in seconds, after which to time out each scorer of each test case.
+    :param adaptive_trials: (Optional) If specified, each input runs until its scores are stable, up to a maximum number of trials, instead of `trial_count` times. See `AdaptiveTrials`.
     :param project_id: (Optional) If specified, uses the given project ID instead of the evaluator's name to identify the project.
     :param base_experiment_name: An optional experiment name to use as a base. If specified, the new experiment will be
     summarized and compared to this experiment.
@@ -708,6 +1537,17 @@ async def EvalAsync(
     summarized and compared to this experiment. This takes precedence over `base_experiment_name` if specified.
     :param git_metadata_settings: Optional settings for collecting git metadata. By default, will collect all git metadata fields allowed in org-level settings.
     :param repo_info: Optionally explicitly specify the git metadata for this experiment. This takes precedence over `git_metadata_settings` if specified.
+    :param summarize_locally: If true, the experiment is summarized and compared to its base experiment on the client, instead of waiting for the server to summarize it.
+    :param results_path: (Optional) A JSONL file to write each result to as soon as it completes.
+    :param max_results_in_memory: (Optional) The maximum number of results to hold in memory. Further results are written to disk and read back lazily.
+    :param executor: Where to run synchronous task and scorer functions: "thread" (the default) for a thread pool, or "process" for a process pool, which lets CPU-bound functions run in parallel. Functions run in a process pool must be picklable.
+    :param cache_scorers: If true, scorer results are cached on disk, so that re-running the eval only runs the scorers and test cases which changed. A scorer's version defaults to a hash of its source code and JSON serializable attributes, and can be set explicitly with a `scorer_version` attribute.
+    :param reuse_task_outputs: If true, task outputs are recorded on disk and replayed on later runs of the same task (by a hash of its source code, or its `task_version` attribute), instead of running the task again. If the name of an experiment, the outputs logged by that experiment are replayed instead. Test cases without a recorded output run the task.
+    :param checkpoint: If true or a path, each completed test case is recorded in a local journal, so that the eval can be resumed with `resume` if it is interrupted.
+    :param resume: If true, resumes from the eval's checkpoint: completed test cases are skipped and combined with the new results, and the eval continues logging to the same experiment.
+    :param shard_index: The index of the shard to run, to split the eval across several machines. Test cases are assigned to shards by a hash of their input. All shards log to the same experiment, so `experiment_name` must be set.
+    :param shard_count: The total number of shards.
+    :param shard_summary_path: If specified, a JSON file to write the shard's summary to. The summaries of all shards can be combined with `braintrust merge-summary`.
     :return: An `EvalResultWithSummary` object, which contains all results and a summary.
     """
     f = _EvalCommon(
@@ -728,6 +1568,20 @@ async def EvalAsync(
         base_experiment_id=base_experiment_id,
         git_metadata_settings=git_metadata_settings,
         repo_info=repo_info,
+        summarize_locally=summarize_locally,
+        results_path=results_path,
+        max_results_in_memory=max_results_in_memory,
+        executor=executor,
+        cache_scorers=cache_scorers,
+        reuse_task_outputs=reuse_task_outputs,
+        checkpoint=checkpoint,
+        resume=resume,
+        shard_index=shard_index,
+        shard_count=shard_count,
+        shard_summary_path=shard_summary_path,
+        task_timeout=task_timeout,
+        scorer_timeout=scorer_timeout,
+        adaptive_trials=adaptive_trials,
     )
 
     return await f()
@@ -748,13 +1602,27 @@ def Eval(
     update: bool = False,
     reporter: Optional[ReporterDef[Input, Output, EvalReport]] = None,
     timeout: Optional[float] = None,
-    max_concurrency: Optional[int] = None,
+    max_concurrency: Optional[Union[int, Literal["auto"]]] = None,
     project_id: Optional[str] = None,
     base_experiment_name: Optional[str] = None,
     base_experiment_id: Optional[str] = None,
     git_metadata_settings: Optional[GitMetadataSettings] = None,
     repo_info: Optional[RepoInfo] = None,
     error_score_handler: Optional[ErrorScoreHandler] = None,
+    summarize_locally: bool = False,
+    results_path: Optional[str] = None,
+    max_results_in_memory: Optional[int] = None,
+    executor: Literal["thread", "process"] = "thread",
+    cache_scorers: bool = False,
+    reuse_task_outputs: Union[bool, str] = False,
+    checkpoint: Union[bool, str] = False,
+    resume: bool = False,
+    shard_index: Optional[int] = None,
+    shard_count: Optional[int] = None,
+    shard_summary_path: Optional[str] = None,
+    task_timeout: Optional[float] = None,
+    scorer_timeout: Optional[float] = None,
+    adaptive_trials: Optional[AdaptiveTrials] = None,
 ) -> EvalResultWithSummary[Input, Output]:
     """
     A function you can use to define an evaluator. This is a convenience wrapper around the `Evaluator` class.
@@ -792,6 +1660,10 @@ def Eval(
     :param reporter: (Optional) A reporter that takes an evaluator and its result and returns a report.
     :param timeout: (Optional) The duration, in seconds, after which to time out the evaluation.
     Defaults to None, in which case there is no timeout.
+    :param max_concurrency: (Optional) The maximum number of test cases to run concurrently. If "auto", the limit adapts to the observed latency and rate limit errors.
+    :param task_timeout: (Optional) The duration, in seconds, after which to time out the task of each test case. The test case fails with a `TimeoutError` and frees its concurrency slot. Synchronous tasks cannot be interrupted, so they keep running on a daemon thread until they return. The timeout starts once the task runs.
+    :param scorer_timeout: (Optional) The duration, in seconds, after which to time out each scorer of each test case.
+    :param adaptive_trials: (Optional) If specified, each input runs until its scores are stable, up to a maximum number of trials, instead of `trial_count` times. See `AdaptiveTrials`.
     :param project_id: (Optional) If specified, uses the given project ID instead of the evaluator's name to identify the project.
     :param base_experiment_name: An optional experiment name to use as a base. If specified, the new experiment will be
     summarized and compared to this experiment.
@@ -800,6 +1672,17 @@ def Eval(
     :param git_metadata_settings: Optional settings for collecting git metadata. By default, will collect all git metadata fields allowed in org-level settings.
     :param repo_info: Optionally explicitly specify the git metadata for this experiment. This takes precedence over `git_metadata_settings` if specified.
     :param error_score_handler: Optionally supply a custom function to specifically handle score values when tasks or scoring functions have errored.
+    :param summarize_locally: If true, the experiment is summarized and compared to its base experiment on the client, instead of waiting for the server to summarize it.
+    :param results_path: (Optional) A JSONL file to write each result to as soon as it completes.
+    :param max_results_in_memory: (Optional) The maximum number of results to hold in memory. Further results are written to disk and read back lazily.
+    :param executor: Where to run synchronous task and scorer functions: "thread" (the default) for a thread pool, or "process" for a process pool, which lets CPU-bound functions run in parallel. Functions run in a process pool must be picklable.
+    :param cache_scorers: If true, scorer results are cached on disk, so that re-running the eval only runs the scorers and test cases which changed. A scorer's version defaults to a hash of its source code and JSON serializable attributes, and can be set explicitly with a `scorer_version` attribute.
+    :param reuse_task_outputs: If true, task outputs are recorded on disk and replayed on later runs of the same task (by a hash of its source code, or its `task_version` attribute), instead of running the task again. If the name of an experiment, the outputs logged by that experiment are replayed instead. Test cases without a recorded output run the task.
+    :param checkpoint: If true or a path, each completed test case is recorded in a local journal, so that the eval can be resumed with `resume` if it is interrupted.
+    :param resume: If true, resumes from the eval's checkpoint: completed test cases are skipped and combined with the new results, and the eval continues logging to the same experiment.
+    :param shard_index: The index of the shard to run, to split the eval across several machines. Test cases are assigned to shards by a hash of their input. All shards log to the same experiment, so `experiment_name` must be set.
+    :param shard_count: The total number of shards.
+    :param shard_summary_path: If specified, a JSON file to write the shard's summary to. The summaries of all shards can be combined with `braintrust merge-summary`.
     :return: An `EvalResultWithSummary` object, which contains all results and a summary.
     """
 
@@ -822,6 +1705,20 @@ def Eval(
         git_metadata_settings=git_metadata_settings,
         repo_info=repo_info,
         error_score_handler=error_score_handler,
+        summarize_locally=summarize_locally,
+        results_path=results_path,
+        max_results_in_memory=max_results_in_memory,
+        executor=executor,
+        cache_scorers=cache_scorers,
+        reuse_task_outputs=reuse_task_outputs,
+        checkpoint=checkpoint,
+        resume=resume,
+        shard_index=shard_index,
+        shard_count=shard_count,
+        shard_summary_path=shard_summary_path,
+        task_timeout=task_timeout,
+        scorer_timeout=scorer_timeout,
+        adaptive_trials=adaptive_trials,
     )
 
     # https://stackoverflow.com/questions/55409641/asyncio-run-cannot-be-called-from-a-running-event-loop-when-using-jupyter-no
@@ -981,6 +1878,83 @@ def init_experiment(
     return ret
 
 
+class _DaemonThreadPoolExecutor(Executor):
+    """
+    A minimal thread pool whose workers are daemon threads. Unlike `ThreadPoolExecutor`, whose workers are joined when
+    the interpreter exits, it does not keep the process alive while a synchronous function which timed out is still
+    running. Such a worker can be detached, so that it no longer counts against `max_workers`.
+    """
+
+    def __init__(self, max_workers: int):
+        self._max_workers = max_workers
+        self._work_queue = queue.SimpleQueue()
+        self._lock = threading.Lock()
+        self._num_workers = 0
+        self._num_idle = 0
+        self._num_pending = 0
+        self._detached = set()
+        self._shutdown = False
+
+    def submit(self, fn, *args, **kwargs):
+        with self._lock:
+            if self._shutdown:
+                raise RuntimeError("cannot schedule new futures after shutdown")
+            future = Future()
+            self._work_queue.put((future, fn, args, kwargs))
+            self._num_pending += 1
+            self._adjust_thread_count()
+            return future
+
+    def detach(self, future: Future):
+        """
+        Stops counting the worker which is running `future` against `max_workers`, so that queued functions do not wait
+        for it. The worker exits once the function returns.
+        """
+        with self._lock:
+            if future.done() or future in self._detached:
+                return
+            self._detached.add(future)
+            self._num_workers -= 1
+            self._adjust_thread_count()
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            self._shutdown = True
+            self._work_queue.put(None)
+        # The workers are daemon threads, so there is nothing to wait for at exit, and a hung function would block a
+        # wait here forever.
+
+    def _adjust_thread_count(self):
+        if self._num_pending > self._num_idle and self._num_workers < self._max_workers:
+            self._num_workers += 1
+            self._num_idle += 1
+            threading.Thread(target=self._worker, name="braintrust-eval-worker", daemon=True).start()
+
+    def _worker(self):
+        while True:
+            item = self._work_queue.get()
+            if item is None:
+                # Let the other workers see the sentinel too.
+                self._work_queue.put(None)
+                return
+            with self._lock:
+                self._num_idle -= 1
+                self._num_pending -= 1
+            future, fn, args, kwargs = item
+            if future.set_running_or_notify_cancel():
+                try:
+                    result = fn(*args, **kwargs)
+                except BaseException as e:
+                    future.set_exception(e)
+                else:
+                    future.set_result(result)
+            with self._lock:
+                if future in self._detached:
+                    self._detached.discard(future)
+                    return
+                self._num_idle += 1
+
+
 class EvalThreadPoolSingleton:
     def __init__(self):
         self._thread_pool = None
@@ -992,7 +1966,7 @@ class EvalThreadPoolSingleton:
 
     def thread_pool(self):
         if self._thread_pool is None:
-            self._thread_pool = ThreadPoolExecutor(max_workers=self._max_workers)
+            self._thread_pool = _DaemonThreadPoolExecutor(max_workers=self._max_workers)
         return self._thread_pool
 
 
@@ -1008,6 +1982,130 @@ def set_thread_pool_max_workers(max_workers):
         obj.set_max_workers(max_workers)
 
 
+class EvalProcessPoolSingleton:
+    def __init__(self):
+        self._process_pool = None
+        self._max_workers = cpu_count()
+
+    def set_max_workers(self, max_workers):
+        assert self._process_pool is None, "Cannot set max_workers. Process pool has already been initialized"
+        self._max_workers = max_workers
+
+    def process_pool(self):
+        if self._process_pool is None:
+            # Worker processes are spawned rather than forked, because forking a process with running threads (such
+            # as the background logger) is unsafe.
+            self._process_pool = ProcessPoolExecutor(
+                max_workers=self._max_workers, mp_context=get_context("spawn"), initializer=_init_process_worker
+            )
+        return self._process_pool
+
+
+_PROCESS_POOL_SINGLETON = ResourceManager(EvalProcessPoolSingleton())
+
+
+def set_process_pool_max_workers(max_workers):
+    """
+    Set the maximum number of processes to use for running functions with the "process" executor. By default, this is
+    the number of CPUs on the machine.
+    """
+    with _PROCESS_POOL_SINGLETON.get() as obj:
+        obj.set_max_workers(max_workers)
+
+
+def _init_process_worker():
+    # Worker processes do not run atexit handlers, but they do run multiprocessing finalizers, so the spans logged in a
+    # worker are flushed once, when it exits. Until then, the worker's background logger publishes them as usual.
+    multiprocessing.util.Finalize(None, flush, exitpriority=0)
+
+
+def _run_in_process(
+    f,
+    args,
+    kwargs,
+    parent: Optional[str],
+    parent_span_parents: Optional[List[str]],
+    login_args: Optional[Dict[str, Any]],
+):
+    """
+    Runs `f` in a process pool worker. If `parent` is specified, it is the current span while `f` runs, as it would be
+    in a thread, so that the trace has the same shape either way.
+    """
+    if parent is None:
+        return f(*args, **kwargs)
+
+    if login_args is not None:
+        login(**login_args)
+    with _resume_span(parent, parent_span_parents):
+        return f(*args, **kwargs)
+
+
+class _TimeoutClock:
+    """
+    Tracks when a timed function starts running, so that the time it spends queued for a worker thread does not count
+    towards its timeout.
+    """
+
+    def __init__(self, event_loop):
+        self._event_loop = event_loop
+        self.queued = False
+        self.started_at = event_loop.time()
+        self._started = False
+        self.changed = event_loop.create_future()
+
+    def enqueue(self):
+        if not self._started:
+            self.queued = True
+
+    def start(self):
+        if self._started:
+            return
+        self._started = True
+        self.queued = False
+        self.started_at = self._event_loop.time()
+        if not self.changed.done():
+            self.changed.set_result(None)
+
+
+_timeout_clock: contextvars.ContextVar[Optional[_TimeoutClock]] = contextvars.ContextVar(
+    "braintrust_eval_timeout_clock", default=None
+)
+
+
+async def _with_timeout(aw: Awaitable, timeout: Optional[float], description: str):
+    if timeout is None:
+        return await aw
+    event_loop = asyncio.get_running_loop()
+    clock = _TimeoutClock(event_loop)
+    token = _timeout_clock.set(clock)
+    try:
+        task = asyncio.ensure_future(aw)
+    finally:
+        _timeout_clock.reset(token)
+    # Unlike `asyncio.wait_for`, `asyncio.wait` does not raise when the timeout expires, so an `asyncio.TimeoutError`
+    # raised by the awaitable itself is not mistaken for the timeout.
+    try:
+        while True:
+            if clock.queued:
+                remaining = None
+            else:
+                remaining = clock.started_at + timeout - event_loop.time()
+                if remaining <= 0:
+                    break
+            waiting = {task} if clock.changed.done() else {task, clock.changed}
+            done, _ = await asyncio.wait(waiting, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+            if task in done:
+                return task.result()
+            if not done and not clock.queued:
+                break
+    except asyncio.CancelledError:
+        task.cancel()
+        raise
+    task.cancel()
+    await asyncio.wait({task})
+    raise TimeoutError(f"{description} timed out after {timeout} seconds")
+
+
 def _scorer_name(scorer, scorer_idx):
     def helper():
         if hasattr(scorer, "_name"):
@@ -1030,18 +2128,86 @@ async def run_evaluator(
     filters: List[Filter],
 ) -> EvalResultWithSummary[Input, Output]:
     """Wrapper on _run_evaluator_internal that times out execution after evaluator.timeout."""
-    results = await asyncio.wait_for(
-        _run_evaluator_internal(experiment, evaluator, position, filters), evaluator.timeout
+    if (evaluator.shard_index is None) != (evaluator.shard_count is None) or (
+        evaluator.shard_count is not None and not 0 <= evaluator.shard_index < evaluator.shard_count
+    ):
+        raise ValueError(
+            f"Invalid shard {evaluator.shard_index} of {evaluator.shard_count}. The shard index must be between 0 and the shard count minus one"
+        )
+
+    # Scores and metrics are aggregated as results arrive, so summarizing does not need another pass over them. The
+    # values of each test case are only kept when they are compared against the base experiment on the client, or
+    # written to a shard summary.
+    columns = ExperimentColumns(
+        keep_rows=evaluator.shard_summary_path is not None
+        or (experiment is not None and (evaluator.summarize_locally or evaluator.shard_count is not None))
     )
+    scorer_cache = _make_scorer_cache() if evaluator.cache_scorers else None
+    checkpoint = _open_checkpoint(evaluator, experiment)
+    trial_counts = [] if evaluator.adaptive_trials is not None else None
+    try:
+        results = await asyncio.wait_for(
+            _run_evaluator_internal(
+                experiment,
+                evaluator,
+                position,
+                filters,
+                summary_columns=columns,
+                scorer_cache=scorer_cache,
+                checkpoint=checkpoint,
+                trial_counts=trial_counts,
+            ),
+            evaluator.timeout,
+        )
+    finally:
+        if checkpoint is not None:
+            checkpoint.close()
 
-    if experiment:
-        summary = experiment.summarize()
+    # The other shards may still be running, so a shard is always summarized locally.
+    base = None
+    if experiment and not evaluator.summarize_locally and evaluator.shard_count is None:
+        summary = with_distributions(experiment.summarize(), columns)
     else:
-        summary = build_local_summary(evaluator, results)
+        base = _fetch_base_columns(experiment) if experiment else None
+        summary = build_local_summary(evaluator, results, experiment=experiment, columns=columns, base=base)
+    if scorer_cache is not None:
+        summary = dataclasses.replace(summary, scorer_cache=scorer_cache.summary())
+    if trial_counts is not None:
+        summary = dataclasses.replace(
+            summary,
+            trials=TrialsSummary(
+                test_cases=len(trial_counts), trials=sum(trial_counts), max_trials=evaluator.adaptive_trials.max_trials
+            ),
+        )
+
+    if evaluator.shard_summary_path is not None:
+        if base is None and experiment:
+            base = _fetch_base_columns(experiment)
+        with open(evaluator.shard_summary_path, "w", encoding="utf-8") as f:
+            f.write(
+                bt_dumps(
+                    shard_summary(
+                        summary, columns, base[1] if base else None, evaluator.shard_index, evaluator.shard_count
+                    )
+                )
+            )
 
     return EvalResultWithSummary(results=results, summary=summary)
 
 
+def _make_scorer_cache() -> ScorerCache:
+    # The cache is unbounded by default, because bounding it requires listing the cache directory on every write.
+    max_size = os.environ.get("BRAINTRUST_SCORER_CACHE_MAX_SIZE")
+    return ScorerCache(
+        DiskCache(
+            cache_dir=os.environ.get(
+                "BRAINTRUST_SCORER_CACHE_DIR", f"{os.environ.get('HOME')}/.braintrust/scorer_cache"
+            ),
+            max_size=int(max_size) if max_size else None,
+        )
+    )
+
+
 def default_error_score_handler(
     root_span: Span,
     data: EvalCase[Input, Output],
@@ -1052,35 +2218,68 @@ def default_error_score_handler(
     return scores
 
 
-async def _run_evaluator_internal(experiment, evaluator: Evaluator, position: Optional[int], filters: List[Filter]):
+async def _run_evaluator_internal(
+    experiment,
+    evaluator: Evaluator,
+    position: Optional[int],
+    filters: List[Filter],
+    summary_columns: Optional[ExperimentColumns] = None,
+    scorer_cache: Optional[ScorerCache] = None,
+    checkpoint: Optional[EvalCheckpoint] = None,
+    trial_counts: Optional[List[int]] = None,
+):
     event_loop = asyncio.get_event_loop()
 
     async def await_or_run_scorer(root_span, scorer, name, **kwargs):
         with root_span.start_span(
             name=name, span_attributes={"type": SpanTypeAttribute.SCORE}, input=dict(**kwargs)
         ) as span:
-            score = scorer.eval_async if isinstance(scorer, Scorer) else scorer
+            if isinstance(scorer, Scorer):
+                if _uses_process_executor(scorer) and type(scorer)._run_eval_async is Scorer._run_eval_async:
+                    # The default `eval_async` just runs the scorer synchronously, so run the synchronous version in
+                    # the process pool instead.
+                    score = process_executor(partial(scorer.eval))
+                else:
+                    score = scorer.eval_async
+            else:
+                score = scorer
 
             scorer_args = kwargs
 
-            result = await call_user_fn(event_loop, score, **scorer_args)
-            if isinstance(result, dict):
-                try:
-                    result = Score.from_dict(result)
-                except Exception as e:
-                    raise ValueError(f"When returning a dict, it must be a valid Score object. Got: {result}") from e
-
-            if isinstance(result, Iterable):
-                for s in result:
-                    if not isinstance(s, Score):
+            result = None
+            cache_key = None
+            if scorer_cache is not None:
+                cache_key = create_cache_key(name, scorer_versions[name], scorer_args)
+                if cache_key is not None:
+                    result = scorer_cache.get(name, cache_key)
+
+            if result is None:
+                if name in batchers:
+                    result = await batchers[name].score(**scorer_args)
+                else:
+                    async with rate_limited(rate_limits(scorer)):
+                        result = await call_user_fn(event_loop, score, **scorer_args)
+                if isinstance(result, dict):
+                    try:
+                        result = Score.from_dict(result)
+                    except Exception as e:
                         raise ValueError(
-                            f"When returning an array of scores, each score must be a non-empty object. Got: {s}"
-                        )
-                result = list(result)
-            elif isinstance(result, Score):
-                result = [result]
-            else:
-                result = [Score(name=name, score=result)]
+                            f"When returning a dict, it must be a valid Score object. Got: {result}"
+                        ) from e
+
+                if isinstance(result, Iterable):
+                    for s in result:
+                        if not isinstance(s, Score):
+                            raise ValueError(
+                                f"When returning an array of scores, each score must be a non-empty object. Got: {s}"
+                            )
+                    result = list(result)
+                elif isinstance(result, Score):
+                    result = [result]
+                else:
+                    result = [Score(name=name, score=result)]
+                if cache_key is not None:
+                    scorer_cache.set(cache_key, result)
 
             def get_other_fields(s):
                 return {k: v for k, v in s.as_dict().items() if k not in ["metadata", "name"]}
@@ -1099,11 +2298,35 @@ async def _run_evaluator_internal(experiment, evaluator: Evaluator, position: Op
         scorer() if inspect.isclass(scorer) and issubclass(scorer, Scorer) else scorer for scorer in evaluator.scores
     ]
     scorer_names = [_scorer_name(scorer, i) for i, scorer in enumerate(scorers)]
+    scorer_versions = {}
+    if scorer_cache is not None:
+        scorer_versions = {name: scorer_version(scorer) for scorer, name in zip(scorers, scorer_names)}
     unhandled_scores = scorer_names
+    batchers = {
+        name: _ScorerBatcher(event_loop, scorer, evaluator.executor)
+        for scorer, name in zip(scorers, scorer_names)
+        if _ScorerBatcher.is_batch_scorer(scorer)
+    }
+
+    if evaluator.max_concurrency == "auto":
+        # The limit is capped so that the window of in-flight tasks (see below) has room for twice as many.
+        adaptive_concurrency = AdaptiveConcurrencyLimit(max_limit=_DEFAULT_TASK_WINDOW // 2)
+    elif evaluator.max_concurrency is None or isinstance(evaluator.max_concurrency, int):
+        adaptive_concurrency = None
+    else:
+        raise ValueError(f'max_concurrency must be an integer or "auto", got {evaluator.max_concurrency!r}')
+
+    def observe_error(e):
+        if adaptive_concurrency and is_rate_limit_error(e):
+            adaptive_concurrency.on_rate_limit()
+
+    async def run_task(task_args):
+        async with rate_limited(rate_limits(evaluator.task)):
+            return await await_or_run(event_loop, evaluator.task, *task_args)
 
-    async def run_evaluator_task(datum):
-        if isinstance(datum, dict):
-            datum = EvalCase.from_dict(datum)
+    async def run_evaluator_task(datum, trial_index):
+        # This only applies to the functions run for this test case, because each test case runs in its own task.
+        _default_executor.set(evaluator.executor)
 
         metadata = {**(datum.metadata or {})}
         output = None
@@ -1130,6 +2353,11 @@ async def _run_evaluator_internal(experiment, evaluator: Evaluator, position: Op
             )
         else:
             root_span = NOOP_SPAN
+
+        # Each test case runs in its own task, so the accumulator only sees the spans of this test case.
+        metrics_accumulator = _SpanMetricsAccumulator()
+        _span_metrics_accumulator.set(metrics_accumulator)
+        start = time.time()
         with root_span:
             try:
                 hooks = DictEvalHooks(metadata, expected=datum.expected)
@@ -1142,24 +2370,40 @@ async def _run_evaluator_internal(experiment, evaluator: Evaluator, position: Op
                 except:
                     pass
 
+                stored_output = task_output_store.get(datum, trial_index) if task_output_store is not None else None
+                if stored_output is None and len(task_args) == 2 and _uses_process_executor(evaluator.task):
+                    raise ValueError(
+                        "Tasks which take a hooks argument cannot run in a process pool, because the hooks cannot be sent to another process"
+                    )
+
                 with root_span.start_span("task", span_attributes={"type": SpanTypeAttribute.TASK}) as span:
                     hooks.set_span(span)
-                    output = await await_or_run(event_loop, evaluator.task, *task_args)
+                    if stored_output is not None:
+                        output = stored_output["output"]
+                        metadata.update(stored_output["metadata"])
+                    else:
+                        output = await _with_timeout(run_task(task_args), evaluator.task_timeout, "Task")
+                        if task_output_store is not None:
+                            task_output_store.set(datum, trial_index, output, metadata)
                     span.log(input=task_args[0], output=output)
                 root_span.log(output=output, metadata=metadata)
 
                 score_promises = [
                     asyncio.create_task(
-                        await_or_run_scorer(
-                            root_span,
-                            score,
-                            name,
-                            **{
-                                "input": datum.input,
-                                "expected": datum.expected,
-                                "metadata": metadata,
-                                "output": output,
-                            },
+                        _with_timeout(
+                            await_or_run_scorer(
+                                root_span,
+                                score,
+                                name,
+                                **{
+                                    "input": datum.input,
+                                    "expected": datum.expected,
+                                    "metadata": metadata,
+                                    "output": output,
+                                },
+                            ),
+                            evaluator.scorer_timeout,
+                            f"Scorer {name}",
                         )
                     )
                     for score, name in zip(scorers, scorer_names)
@@ -1175,6 +2419,7 @@ async def _run_evaluator_internal(experiment, evaluator: Evaluator, position: Op
                     except Exception as e:
                         exc_info = traceback.format_exc()
                         failing_scorers_and_exceptions.append((name, e, exc_info))
+                        observe_error(e)
 
                 nonlocal unhandled_scores
                 unhandled_scores = None
@@ -1196,9 +2441,11 @@ async def _run_evaluator_internal(experiment, evaluator: Evaluator, position: Op
                 root_span.log(error=stringify_exception(exc_type, exc_value, tb))
 
                 error = e
+                observe_error(e)
                 # Python3.10 has a different set of arguments to format_exception than earlier versions,
                 # so just capture the stack trace here.
                 exc_info = traceback.format_exc()
+        metrics = {"duration": time.time() - start, **metrics_accumulator.metrics}
 
         return EvalResult(
             input=datum.input,
@@ -1216,6 +2463,7 @@ async def _run_evaluator_internal(experiment, evaluator: Evaluator, position: Op
             },
             error=error,
             exc_info=exc_info,
+            metrics=metrics,
         )
 
     data_iterator = evaluator.data
@@ -1242,6 +2490,34 @@ async def _run_evaluator_internal(experiment, evaluator: Evaluator, position: Op
             set_current=False,
         ).as_dataset()
 
+    task_output_store = None
+    if isinstance(evaluator.reuse_task_outputs, str):
+        if experiment is None:
+            raise ValueError(
+                "Cannot reuse task outputs from an experiment without connecting to Braintrust (you most likely set --no-send-logs)"
+            )
+        task_output_store = ExperimentTaskOutputStore.from_rows(
+            _init_experiment(
+                project=evaluator.project_name if evaluator.project_id is None else None,
+                project_id=evaluator.project_id,
+                experiment=evaluator.reuse_task_outputs,
+                open=True,
+                set_current=False,
+            ).fetch(
+                batch_size=_BASE_EXPERIMENT_FETCH_BATCH_SIZE,
+                columns=["input", "output", "metadata", "error", "span_parents"],
+            )
+        )
+    elif evaluator.reuse_task_outputs:
+        task_output_store = LocalTaskOutputStore(
+            DiskCache(
+                cache_dir=os.environ.get(
+                    "BRAINTRUST_TASK_OUTPUT_CACHE_DIR", f"{os.environ.get('HOME')}/.braintrust/task_output_cache"
+                ),
+            ),
+            task_fingerprint(evaluator.task),
+        )
+
     if inspect.isfunction(data_iterator) or inspect.isroutine(data_iterator):
         data_iterator = data_iterator()
 
@@ -1259,66 +2535,192 @@ async def _run_evaluator_internal(experiment, evaluator: Evaluator, position: Op
                 yield datum
 
     max_concurrency_semaphore = (
-        asyncio.Semaphore(evaluator.max_concurrency) if evaluator.max_concurrency is not None else None
+        asyncio.Semaphore(evaluator.max_concurrency) if isinstance(evaluator.max_concurrency, int) else None
     )
 
     async def with_max_concurrency(coro):
         if max_concurrency_semaphore:
             async with max_concurrency_semaphore:
                 return await coro
+        elif adaptive_concurrency:
+            async with adaptive_concurrency.slot():
+                return await coro
         else:
             return await coro
 
-    tasks = []
-    with async_tqdm(
-        filtered_iterator(data_iterator),
-        desc=f"{evaluator.eval_name} (data)",
-        position=position,
-        disable=position is None,
-    ) as pbar:
-        async for datum in pbar:
-            for _ in range(evaluator.trial_count):
-                tasks.append(asyncio.create_task(with_max_concurrency(run_evaluator_task(datum))))
-
-    results = []
-    for task in std_tqdm(tasks, desc=f"{evaluator.eval_name} (tasks)", position=position, disable=position is None):
-        results.append(await task)
+    async def run_and_checkpoint(datum, trial_index):
+        result = await run_evaluator_task(datum, trial_index)
+        if checkpoint is not None and result.error is None:
+            checkpoint.record(datum, trial_index, result)
+        return result
+
+    def start_trial(datum, trial_index) -> asyncio.Future:
+        completed = checkpoint.completed(datum, trial_index) if checkpoint is not None else None
+        if completed is not None:
+            # Test cases which completed before resuming keep their place in the results.
+            future = event_loop.create_future()
+            future.set_result(completed)
+            return future
+        return asyncio.create_task(with_max_concurrency(run_and_checkpoint(datum, trial_index)))
+
+    async def run_adaptive_trials(datum):
+        adaptive_trials = evaluator.adaptive_trials
+        trial_results = list(await asyncio.gather(*[start_trial(datum, i) for i in range(adaptive_trials.min_trials)]))
+        while len(trial_results) < adaptive_trials.max_trials and not adaptive_trials.is_stable(trial_results):
+            trial_results.append(await start_trial(datum, len(trial_results)))
+        return trial_results
+
+    # Tasks are created as the data is read, but only up to a window of in-flight tasks. Once the window is full, we
+    # wait for any task to finish before reading more data, so a slow test case only holds up its own slot. Results
+    # which finish before an earlier one are held in a reorder buffer, keyed by their index in the data, so they are
+    # still collected in order. The window is twice the max concurrency so that the next tasks are ready to run as soon
+    # as a slot frees up.
+    window = 2 * evaluator.max_concurrency if isinstance(evaluator.max_concurrency, int) else _DEFAULT_TASK_WINDOW
+    tasks: Dict[int, asyncio.Future] = {}
+    reorder_buffer: Dict[int, Any] = {}
+    # The indices of the tasks which have finished but not been collected yet. Tasks add themselves when they finish,
+    # so that waiting for the next one is O(1) rather than O(window) as with `asyncio.wait`.
+    finished_indices: Deque[int] = deque()
+    task_finished = asyncio.Event()
+    next_index = 0
+    next_result_index = 0
+    results: EvalResults[Input, Output] = EvalResults(
+        path=evaluator.results_path, max_in_memory=evaluator.max_results_in_memory
+    )
+
+    def add_task(task: asyncio.Future):
+        nonlocal next_index
+        index = next_index
+        next_index += 1
+        tasks[index] = task
+
+        def on_done(_):
+            finished_indices.append(index)
+            task_finished.set()
+
+        task.add_done_callback(on_done)
+
+    async def collect_finished_tasks():
+        nonlocal next_result_index
+        while not finished_indices:
+            task_finished.clear()
+            await task_finished.wait()
+        while finished_indices:
+            index = finished_indices.popleft()
+            reorder_buffer[index] = tasks.pop(index).result()
+        while next_result_index in reorder_buffer:
+            collect_result(reorder_buffer.pop(next_result_index))
+            next_result_index += 1
+
+    async def wait_for_slot():
+        while len(tasks) >= window or len(reorder_buffer) >= _MAX_REORDER_BUFFER:
+            await collect_finished_tasks()
+
+    def collect_result(ret):
+        # With adaptive trials, each task runs all of the trials of a test case, and returns all of their results.
+        if isinstance(ret, list) and trial_counts is not None:
+            trial_counts.append(len(ret))
+        for result in ret if isinstance(ret, list) else [ret]:
+            if summary_columns is not None:
+                summary_columns.add(result.input, result.scores, result.metrics)
+            results.append(result)
+            if adaptive_concurrency:
+                tasks_pbar.set_postfix(concurrency=adaptive_concurrency.current, refresh=False)
+            tasks_pbar.update(1)
+
+    # Reading data and running tasks overlap, so a single progress bar tracks completed tasks.
+    with std_tqdm(desc=f"{evaluator.eval_name} (tasks)", position=position, disable=position is None) as tasks_pbar:
+        try:
+            async for datum in filtered_iterator(data_iterator):
+                if isinstance(datum, dict):
+                    datum = EvalCase.from_dict(datum)
+                if not _in_shard(evaluator, datum):
+                    continue
+                if evaluator.adaptive_trials is not None:
+                    await wait_for_slot()
+                    add_task(asyncio.create_task(run_adaptive_trials(datum)))
+                    continue
+                for trial_index in range(evaluator.trial_count):
+                    await wait_for_slot()
+                    add_task(start_trial(datum, trial_index))
+            while tasks:
+                await collect_finished_tasks()
+        finally:
+            # If the eval is cancelled (e.g. by its timeout), don't leave the in-flight tasks running.
+            for task in tasks.values():
+                task.cancel()
+            results.close()
     return results
 
 
 def build_local_summary(
-    evaluator: Evaluator[Input, Output], results: List[EvalResultWithSummary[Input, Output]]
+    evaluator: Evaluator[Input, Output],
+    results: Iterable[EvalResult[Input, Output]],
+    experiment: Optional[Experiment] = None,
+    columns: Optional[ExperimentColumns] = None,
+    base: Optional[Tuple[Optional[str], Optional[ExperimentColumns]]] = None,
 ) -> ExperimentSummary:
-    scores_by_name = defaultdict(lambda: (0, 0))
-    for result in results:
-        for name, score in result.scores.items():
-            curr = scores_by_name[name]
-            if curr is None:
-                continue
-            scores_by_name[name] = (curr[0] + score, curr[1] + 1)
-    longest_score_name = max(len(name) for name in scores_by_name) if scores_by_name else 0
-    avg_scores = {
-        name: ScoreSummary(
-            name=name,
-            score=total / count,
-            diff=None,
-            improvements=0,
-            regressions=0,
-            _longest_score_name=longest_score_name,
-        )
-        for name, (total, count) in scores_by_name.items()
-    }
+    """
+    Summarizes the results of an evaluator on the client. If `experiment` is specified, the results are compared to
+    the rows of its base experiment, and the experiment's metadata is included in the summary. If `columns` is
+    specified, it must already hold the results, aggregated as they arrived. If `base` is specified, it must hold the
+    name and columns of the base experiment, as returned by `_fetch_base_columns`.
+    """
+    current = columns
+    if current is None:
+        current = ExperimentColumns()
+        for result in results:
+            current.add(result.input, result.scores, result.metrics)
+
+    base_columns = None
+    comparison_experiment_name = None
+    summary = None
+    if experiment is not None:
+        summary = experiment.summarize(summarize_scores=False)
+        comparison_experiment_name, base_columns = base if base is not None else _fetch_base_columns(experiment)
+
     return ExperimentSummary(
-        experiment_id=None,
-        experiment_name=evaluator.experiment_name,
-        project_name=evaluator.project_name,
-        project_id=None,
-        project_url=None,
-        experiment_url=None,
-        comparison_experiment_name=None,
-        scores=avg_scores,
-        metrics={},
+        experiment_id=summary.experiment_id if summary else None,
+        experiment_name=summary.experiment_name if summary else evaluator.experiment_name,
+        project_name=summary.project_name if summary else evaluator.project_name,
+        project_id=summary.project_id if summary else None,
+        project_url=summary.project_url if summary else None,
+        experiment_url=summary.experiment_url if summary else None,
+        comparison_experiment_name=comparison_experiment_name,
+        scores=summarize_scores(current, base_columns),
+        metrics=summarize_metrics(current, base_columns),
     )
 
 
-__all__ = ["Evaluator", "Eval", "EvalAsync", "Score", "EvalCase", "EvalHooks", "BaseExperiment", "Reporter"]
+def _fetch_base_columns(experiment: Experiment) -> Tuple[Optional[str], Optional[ExperimentColumns]]:
+    """Returns the name and columns of an experiment's base experiment, or `None`s if it does not have one."""
+    base_experiment = experiment.fetch_base_experiment()
+    if base_experiment is None:
+        return None, None
+    base_rows = _init_experiment(
+        project_id=experiment.project.id,
+        experiment=base_experiment.name,
+        open=True,
+        set_current=False,
+    ).fetch(
+        batch_size=_BASE_EXPERIMENT_FETCH_BATCH_SIZE,
+        columns=["input", "scores", "metrics", "span_parents"],
+    )
+    return base_experiment.name, ExperimentColumns.from_rows(base_rows)
+
+
+__all__ = [
+    "Evaluator",
+    "Eval",
+    "EvalAsync",
+    "Score",
+    "EvalCase",
+    "EvalHooks",
+    "BaseExperiment",
+    "Reporter",
+    "process_executor",
+    "RateLimit",
+    "BatchScorer",
+    "batch_scorer",
+    "AdaptiveTrials",
+]
@@ -0,0 +1,548 @@
+"""
+This module implements a local engine for summarizing experiments and comparing them to a base experiment.
+
+It computes the same score and metric summaries as the server, without waiting for the experiment's rows to be
+ingested: score means, diffs against the base experiment, and the number of test cases which improved or regressed.
+Test cases are matched across experiments by their input. When a test case was run several times (e.g. with trials),
+its mean is compared.
+
+Rows are stored column-wise in `array` buffers of floats, with missing values stored as NaN, so that an experiment
+of any size is held as a handful of flat arrays rather than a list of dictionaries. When numpy is installed, the
+columns are aggregated and compared with vectorized operations over those buffers, without copying them. Otherwise, the
+same computations run as plain Python loops.
+
+Each column also feeds a `StreamingStats` aggregator as rows are added, which tracks the mean, standard deviation,
+percentiles, and a confidence interval of the mean in constant memory, so the distribution of a score is available
+without a second pass over the rows.
+
+Columns can be serialized and concatenated, so that the shards of an experiment which ran on several machines can be
+summarized as a whole (see `shard_summary` and `merge_shard_summaries`).
+"""
+
+import dataclasses
+import hashlib
+import json
+import math
+from array import array
+from statistics import NormalDist
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+from .logger import ExperimentSummary, MetricSummary, ScorerCacheSummary, ScoreSummary, TrialsSummary
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# The metrics which are summarized, and their units. Lower is better for all of them.
+SUMMARY_METRICS = {
+    "duration": "s",
+    "prompt_tokens": "tok",
+    "completion_tokens": "tok",
+    "total_tokens": "tok",
+}
+
+_NAN = float("nan")
+
+# The confidence level of confidence intervals.
+CONFIDENCE_LEVEL = 0.95
+
+# The number of distinct values counted exactly before switching to the percentile sketch. Most scores take few
+# distinct values (e.g. 0 and 1), so their percentiles stay exact.
+MAX_EXACT_VALUES = 1024
+
+
+class StreamingStats:
+    """
+    Summary statistics of a stream of values, computed in constant memory.
+
+    The mean and standard deviation are computed exactly with Welford's algorithm. Percentiles are exact while the
+    stream has at most `MAX_EXACT_VALUES` distinct values, and are then estimated with a log-bucketed sketch (as in
+    DDSketch) whose estimates are within `relative_accuracy` of the true value. Percentiles are always values between
+    the smallest and largest value of the stream. The confidence interval of the mean is the normal approximation from
+    the running mean and standard deviation.
+    """
+
+    def __init__(self, relative_accuracy: float = 0.01):
+        """
+        Args:
+            relative_accuracy: The relative accuracy of the percentile estimates, once they are estimated.
+        """
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+        # The number of occurrences of each value, until there are too many distinct values.
+        self._exact: Optional[Dict[float, int]] = {}
+
+        self._gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self._gamma)
+        # The smallest magnitude tracked by the sketch. Smaller values are counted as zero.
+        self._min_indexable = 1e-9
+        self._positive: Dict[int, int] = {}
+        self._negative: Dict[int, int] = {}
+        self._zero_count = 0
+
+    def add(self, value: float) -> None:
+        """Adds a value to the stream. NaN values are ignored."""
+        if math.isnan(value):
+            return
+
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+        if self._exact is not None:
+            self._exact[value] = self._exact.get(value, 0) + 1
+            if len(self._exact) <= MAX_EXACT_VALUES:
+                return
+            exact, self._exact = self._exact, None
+            for v, n in exact.items():
+                self._add_to_sketch(v, n)
+        else:
+            self._add_to_sketch(value, 1)
+
+    def _add_to_sketch(self, value: float, n: int) -> None:
+        if abs(value) < self._min_indexable:
+            self._zero_count += n
+        else:
+            buckets = self._positive if value > 0 else self._negative
+            index = math.ceil(math.log(abs(value)) / self._log_gamma)
+            buckets[index] = buckets.get(index, 0) + n
+
+    @property
+    def stddev(self) -> Optional[float]:
+        """The sample standard deviation, or `None` if there are fewer than two values."""
+        if self.count < 2:
+            return None
+        return math.sqrt(self._m2 / (self.count - 1))
+
+    def _bucket_value(self, index: int) -> float:
+        return 2 * self._gamma**index / (self._gamma + 1)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """
+        Computes a quantile of the stream, as the value whose rank is `q * (count - 1)`.
+
+        Args:
+            q: The quantile to compute, between 0 and 1.
+
+        Returns:
+            The quantile (exact, or estimated once the stream has too many distinct values), or `None` if the stream
+            is empty.
+        """
+        if self.count == 0:
+            return None
+        rank = q * (self.count - 1)
+        if rank >= self.count - 1:
+            return self.max
+        if self._exact is not None:
+            counts = sorted(self._exact.items())
+        else:
+            counts = (
+                [(-self._bucket_value(i), n) for i, n in sorted(self._negative.items(), reverse=True)]
+                + [(0.0, self._zero_count)]
+                + [(self._bucket_value(i), n) for i, n in sorted(self._positive.items())]
+            )
+        ret = self.max
+        seen = 0
+        for value, n in counts:
+            seen += n
+            if seen > rank:
+                ret = value
+                break
+        # Bucket values are approximations, so clamp them to the values which were actually seen.
+        return min(max(ret, self.min), self.max)
+
+    def confidence_interval(self) -> Optional[Tuple[float, float]]:
+        """
+        Estimates the `CONFIDENCE_LEVEL` confidence interval of the mean, or `None` if there are fewer than two values.
+        """
+        stddev = self.stddev
+        if stddev is None:
+            return None
+        half_width = NormalDist().inv_cdf((1 + CONFIDENCE_LEVEL) / 2) * stddev / math.sqrt(self.count)
+        return self.mean - half_width, self.mean + half_width
+
+    def summary_fields(self) -> Dict[str, Optional[float]]:
+        """Returns the distribution fields of `ScoreSummary` and `MetricSummary`."""
+        ci = self.confidence_interval()
+        return dict(
+            stddev=self.stddev,
+            p50=self.quantile(0.5),
+            p90=self.quantile(0.9),
+            p99=self.quantile(0.99),
+            ci_lower=ci[0] if ci else None,
+            ci_upper=ci[1] if ci else None,
+        )
+
+
+def input_key(input: Any) -> bytes:
+    """Returns a compact key identifying a test case by its input."""
+    serialized = json.dumps(input, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.blake2b(serialized.encode("utf-8"), digest_size=16).digest()
+
+
+def _row_metrics(metrics: Optional[Mapping[str, Any]]) -> Dict[str, float]:
+    if not metrics:
+        return {}
+    ret = {name: metrics[name] for name in SUMMARY_METRICS if isinstance(metrics.get(name), (int, float))}
+    # Spans log the total number of tokens as `tokens`.
+    if "total_tokens" not in ret and isinstance(metrics.get("tokens"), (int, float)):
+        ret["total_tokens"] = metrics["tokens"]
+    start, end = metrics.get("start"), metrics.get("end")
+    if "duration" not in ret and isinstance(start, (int, float)) and isinstance(end, (int, float)):
+        ret["duration"] = end - start
+    return ret
+
+
+class ExperimentColumns:
+    """The scores and metrics of an experiment's test cases, stored column-wise, with running statistics per column."""
+
+    def __init__(self, keep_rows: bool = True):
+        """
+        Args:
+            keep_rows: Whether to store the values of every test case. They are needed to compare test cases against a
+                base experiment and to serialize the columns. Otherwise, only the running statistics are kept, in
+                constant memory.
+        """
+        self.keep_rows = keep_rows
+        self.num_rows = 0
+        self.keys: List[bytes] = []
+        self.scores: Dict[str, array] = {}
+        self.metrics: Dict[str, array] = {}
+        self.score_stats: Dict[str, StreamingStats] = {}
+        self.metric_stats: Dict[str, StreamingStats] = {}
+
+    def __len__(self) -> int:
+        return self.num_rows
+
+    def _check_rows(self) -> None:
+        if not self.keep_rows:
+            raise ValueError("The values of each test case were not kept. Construct the columns with keep_rows=True")
+
+    def _append(
+        self,
+        columns: Dict[str, array],
+        stats: Dict[str, StreamingStats],
+        values: Mapping[str, Optional[float]],
+    ) -> None:
+        if not self.keep_rows:
+            for name, value in values.items():
+                if name not in stats:
+                    stats[name] = StreamingStats()
+                stats[name].add(_NAN if value is None else float(value))
+            return
+
+        num_rows = self.num_rows
+        for name in values:
+            if name not in columns:
+                columns[name] = array("d", [_NAN]) * num_rows
+                stats[name] = StreamingStats()
+        for name, column in columns.items():
+            value = values.get(name)
+            value = _NAN if value is None else float(value)
+            column.append(value)
+            stats[name].add(value)
+
+    def add(
+        self,
+        input: Any,
+        scores: Optional[Mapping[str, Optional[float]]],
+        metrics: Optional[Mapping[str, Any]] = None,
+    ) -> None:
+        """
+        Adds a test case.
+
+        Args:
+            input: The input of the test case, which identifies it across experiments.
+            scores: The scores of the test case. Missing and `None` scores are ignored.
+            metrics: The span metrics of the test case. `start` and `end` are summarized as `duration`, and `tokens` as
+                `total_tokens`.
+        """
+        self._add_row(input_key(input) if self.keep_rows else b"", scores or {}, _row_metrics(metrics))
+
+    def _add_row(self, key: bytes, scores: Mapping[str, Optional[float]], metrics: Mapping[str, Optional[float]]):
+        self._append(self.scores, self.score_stats, scores)
+        self._append(self.metrics, self.metric_stats, metrics)
+        if self.keep_rows:
+            self.keys.append(key)
+        self.num_rows += 1
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Serializes the columns as JSON, with missing values as `None`. Requires `keep_rows`."""
+        self._check_rows()
+
+        def serialize(columns):
+            return {name: [None if math.isnan(v) else v for v in column] for name, column in columns.items()}
+
+        return dict(
+            keys=[key.hex() for key in self.keys], scores=serialize(self.scores), metrics=serialize(self.metrics)
+        )
+
+    @classmethod
+    def from_dicts(cls, dicts: Iterable[Mapping[str, Any]]) -> "ExperimentColumns":
+        """Deserializes and concatenates columns serialized with `to_dict`."""
+        ret = cls()
+        for d in dicts:
+            for i, key in enumerate(d["keys"]):
+                ret._add_row(
+                    bytes.fromhex(key),
+                    {name: column[i] for name, column in d["scores"].items()},
+                    {name: column[i] for name, column in d["metrics"].items()},
+                )
+        return ret
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Mapping[str, Any]]) -> "ExperimentColumns":
+        """
+        Builds the columns from fetched experiment rows. Only root spans, which hold the test cases, are used.
+        """
+        ret = cls()
+        for row in rows:
+            if row.get("span_parents"):
+                continue
+            ret.add(row.get("input"), row.get("scores"), row.get("metrics"))
+        return ret
+
+
+def _mean(column: array) -> Optional[float]:
+    if np is not None:
+        values = np.frombuffer(column, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        return float(values.mean()) if len(values) else None
+    values = [v for v in column if not math.isnan(v)]
+    return math.fsum(values) / len(values) if values else None
+
+
+class _KeyAlignment:
+    """Maps the test cases of two experiments to shared group ids, so that their columns can be compared by input."""
+
+    def __init__(self, current_keys: List[bytes], base_keys: List[bytes]):
+        index: Dict[bytes, int] = {}
+        current_ids = [index.setdefault(key, len(index)) for key in current_keys]
+        base_ids = [index.setdefault(key, len(index)) for key in base_keys]
+        self.num_groups = len(index)
+        if np is not None:
+            self.current_ids: Sequence[int] = np.array(current_ids, dtype=np.intp)
+            self.base_ids: Sequence[int] = np.array(base_ids, dtype=np.intp)
+        else:
+            self.current_ids, self.base_ids = current_ids, base_ids
+
+    def _group_means(self, ids: Sequence[int], column: array) -> Sequence[float]:
+        """Returns the mean value of each group, or NaN for groups without values."""
+        if np is not None:
+            values = np.frombuffer(column, dtype=np.float64)
+            present = ~np.isnan(values)
+            sums = np.bincount(ids[present], weights=values[present], minlength=self.num_groups)
+            counts = np.bincount(ids[present], minlength=self.num_groups)
+            with np.errstate(invalid="ignore"):
+                return sums / counts
+        sums = [0.0] * self.num_groups
+        counts = [0] * self.num_groups
+        for group, value in zip(ids, column):
+            if not math.isnan(value):
+                sums[group] += value
+                counts[group] += 1
+        return [total / count if count else _NAN for total, count in zip(sums, counts)]
+
+    def compare(self, current_column: array, base_column: array) -> Tuple[int, int]:
+        """Returns the number of matching test cases whose value increased and decreased."""
+        current_means = self._group_means(self.current_ids, current_column)
+        base_means = self._group_means(self.base_ids, base_column)
+        # Comparisons with NaN are false, so test cases missing from either experiment are not counted.
+        if np is not None:
+            return int(np.count_nonzero(current_means > base_means)), int(np.count_nonzero(current_means < base_means))
+        increases = sum(1 for c, b in zip(current_means, base_means) if c > b)
+        decreases = sum(1 for c, b in zip(current_means, base_means) if c < b)
+        return increases, decreases
+
+
+def summarize_scores(current: ExperimentColumns, base: Optional[ExperimentColumns] = None) -> Dict[str, ScoreSummary]:
+    """
+    Summarizes an experiment's scores, compared to a base experiment if one is given.
+
+    Args:
+        current: The experiment to summarize.
+        base: The experiment to compare against. If given, `current` must keep its rows.
+
+    Returns:
+        A summary of each score, keyed by score name.
+    """
+    alignment = None
+    if base is not None:
+        current._check_rows()
+        alignment = _KeyAlignment(current.keys, base.keys)
+    longest_score_name = max((len(name) for name in current.score_stats), default=0)
+    ret = {}
+    for name, stats in current.score_stats.items():
+        if stats.count == 0:
+            continue
+        score = stats.mean
+        diff, improvements, regressions = None, 0, 0
+        base_column = base.scores.get(name) if base is not None else None
+        base_score = _mean(base_column) if base_column is not None else None
+        if alignment is not None and base_column is not None and base_score is not None:
+            diff = score - base_score
+            improvements, regressions = alignment.compare(current.scores[name], base_column)
+        ret[name] = ScoreSummary(
+            name=name,
+            score=score,
+            diff=diff,
+            improvements=improvements,
+            regressions=regressions,
+            _longest_score_name=longest_score_name,
+            **stats.summary_fields(),
+        )
+    return ret
+
+
+def summarize_metrics(
+    current: ExperimentColumns, base: Optional[ExperimentColumns] = None
+) -> Dict[str, MetricSummary]:
+    """
+    Summarizes an experiment's metrics, compared to a base experiment if one is given. Lower values are improvements.
+
+    Args:
+        current: The experiment to summarize.
+        base: The experiment to compare against. If given, `current` must keep its rows.
+
+    Returns:
+        A summary of each metric, keyed by metric name.
+    """
+    alignment = None
+    if base is not None:
+        current._check_rows()
+        alignment = _KeyAlignment(current.keys, base.keys)
+    longest_metric_name = max((len(name) for name in current.metric_stats), default=0)
+    ret = {}
+    for name, stats in current.metric_stats.items():
+        if stats.count == 0:
+            continue
+        metric = stats.mean
+        diff, improvements, regressions = None, 0, 0
+        base_column = base.metrics.get(name) if base is not None else None
+        base_metric = _mean(base_column) if base_column is not None else None
+        if alignment is not None and base_column is not None and base_metric:
+            # Metrics are not on a fixed scale, so their diffs are relative.
+            diff = (metric - base_metric) / base_metric
+            regressions, improvements = alignment.compare(current.metrics[name], base_column)
+        ret[name] = MetricSummary(
+            name=name,
+            metric=metric,
+            unit=SUMMARY_METRICS.get(name, ""),
+            diff=diff,
+            improvements=improvements,
+            regressions=regressions,
+            _longest_metric_name=longest_metric_name,
+            **stats.summary_fields(),
+        )
+    return ret
+
+
+def with_distributions(summary: ExperimentSummary, current: ExperimentColumns) -> ExperimentSummary:
+    """
+    Adds the distribution fields computed from `current` (standard deviation, percentiles, and confidence intervals)
+    to a summary computed by the server.
+    """
+
+    def merge(summaries, stats):
+        return {
+            name: dataclasses.replace(s, **stats[name].summary_fields()) if name in stats and stats[name].count else s
+            for name, s in summaries.items()
+        }
+
+    return dataclasses.replace(
+        summary,
+        scores=merge(summary.scores, current.score_stats),
+        metrics=merge(summary.metrics, current.metric_stats),
+    )
+
+
+def shard_summary(
+    summary: ExperimentSummary,
+    current: ExperimentColumns,
+    base: Optional[ExperimentColumns],
+    shard_index: Optional[int] = None,
+    shard_count: Optional[int] = None,
+) -> Dict[str, Any]:
+    """
+    Serializes the summary of one shard of an experiment as JSON, so that it can be merged with the summaries of the
+    other shards by `merge_shard_summaries`. The rows of the shard, and of the base experiment, are included, because
+    comparisons with the base experiment (and the distributions of scores) cannot be merged from summary statistics.
+
+    Args:
+        summary: The summary of the shard.
+        current: The columns of the shard's test cases.
+        base: The columns of the base experiment, if there is one.
+        shard_index: The index of the shard.
+        shard_count: The total number of shards.
+    """
+    return dict(
+        shard_index=shard_index,
+        shard_count=shard_count,
+        experiment={
+            k: getattr(summary, k)
+            for k in [
+                "project_name",
+                "project_id",
+                "experiment_id",
+                "experiment_name",
+                "project_url",
+                "experiment_url",
+                "comparison_experiment_name",
+            ]
+        },
+        scorer_cache={name: cache.as_dict() for name, cache in summary.scorer_cache.items()}
+        if summary.scorer_cache is not None
+        else None,
+        trials=summary.trials.as_dict() if summary.trials is not None else None,
+        columns=current.to_dict(),
+        base_columns=base.to_dict() if base is not None else None,
+    )
+
+
+def merge_shard_summaries(shards: List[Mapping[str, Any]]) -> ExperimentSummary:
+    """
+    Summarizes an experiment from the summaries of its shards, as serialized by `shard_summary`. The result is the
+    same as summarizing all of the shards' test cases together.
+
+    Args:
+        shards: The summaries of the shards. They must not be empty.
+    """
+    current = ExperimentColumns.from_dicts(shard["columns"] for shard in shards)
+    base_columns = next((shard["base_columns"] for shard in shards if shard.get("base_columns") is not None), None)
+    base = ExperimentColumns.from_dicts([base_columns]) if base_columns is not None else None
+
+    scorer_cache = None
+    for shard in shards:
+        for name, cache in (shard.get("scorer_cache") or {}).items():
+            scorer_cache = scorer_cache or {}
+            merged = scorer_cache.get(name, ScorerCacheSummary(hits=0, misses=0))
+            scorer_cache[name] = ScorerCacheSummary(
+                hits=merged.hits + cache["hits"], misses=merged.misses + cache["misses"]
+            )
+
+    trials = None
+    for shard in shards:
+        if shard.get("trials") is not None:
+            trials = TrialsSummary(
+                test_cases=(trials.test_cases if trials else 0) + shard["trials"]["test_cases"],
+                trials=(trials.trials if trials else 0) + shard["trials"]["trials"],
+                max_trials=shard["trials"]["max_trials"],
+            )
+
+    return ExperimentSummary(
+        **shards[0]["experiment"],
+        scores=summarize_scores(current, base),
+        metrics=summarize_metrics(current, base),
+        scorer_cache=scorer_cache,
+        trials=trials,
+    )
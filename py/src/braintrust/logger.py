@@ -1,4 +1,6 @@
 import atexit
+import base64
+import binascii
 import concurrent.futures
 import contextlib
 import contextvars
@@ -6,10 +8,15 @@ import copy
 import dataclasses
 import datetime
 import inspect
+import io
+import itertools
 import json
 import logging
+import mimetypes
 import os
 import queue
+import re
+import shutil
 import sys
 import textwrap
 import threading
@@ -22,10 +29,13 @@ from functools import partial, wraps
 from multiprocessing import cpu_count
 from types import TracebackType
 from typing import (
+    AbstractSet,
     Any,
+    BinaryIO,
     Callable,
     Dict,
     Generic,
+    Iterable,
     Iterator,
     List,
     Literal,
@@ -53,17 +63,23 @@ from urllib3.util.retry import Retry
 
 from braintrust.functions.stream import BraintrustStream
 
-from .bt_json import bt_dumps
+from .attachment_cache import AttachmentUploadRegistry, compute_content_digest, create_registry_key
+from .bt_json import bt_dumps, iter_json_object_array
+from .dataset_cache import DatasetCache, apply_delta
 from .db_fields import (
     ASYNC_SCORING_CONTROL_FIELD,
     AUDIT_METADATA_FIELD,
     AUDIT_SOURCE_FIELD,
+    CREATED_FIELD,
+    ID_FIELD,
     IS_MERGE_FIELD,
     MERGE_PATHS_FIELD,
+    OBJECT_DELETE_FIELD,
     SKIP_ASYNC_SCORING_FIELD,
     TRANSACTION_ID_FIELD,
     VALID_SOURCES,
 )
+from .file_cache import FileCache
 from .git_fields import GitMetadataSettings, RepoInfo
 from .gitutil import get_past_n_ancestors, get_repo_info
 from .merge_row_batch import batch_items, merge_row_batch
@@ -318,6 +334,68 @@ class BraintrustState:
             ),
         )
 
+        # Attachments are only deduplicated by content when they opt in, or
+        # when deduplication is enabled for the whole process.
+        try:
+            self.deduplicate_attachments = bool(int(os.environ["BRAINTRUST_ATTACHMENT_DEDUPLICATE"]))
+        except:
+            self.deduplicate_attachments = False
+
+        def make_attachment_registry():
+            return AttachmentUploadRegistry(
+                memory_cache=LRUCache(
+                    max_size=int(os.environ.get("BRAINTRUST_ATTACHMENT_REGISTRY_MEMORY_MAX_SIZE", str(1 << 12)))
+                ),
+                disk_cache=DiskCache(
+                    cache_dir=os.environ.get(
+                        "BRAINTRUST_ATTACHMENT_REGISTRY_DIR",
+                        f"{os.environ.get('HOME')}/.braintrust/attachment_registry",
+                    ),
+                    max_size=int(os.environ.get("BRAINTRUST_ATTACHMENT_REGISTRY_DISK_MAX_SIZE", str(1 << 20))),
+                ),
+            )
+
+        # The registry is only built once an attachment is deduplicated.
+        self._attachment_registry: LazyValue[AttachmentUploadRegistry] = LazyValue(
+            make_attachment_registry, use_mutex=True
+        )
+
+        # Downloaded attachments and dataset snapshots are only cached on disk
+        # when the cache's maximum size is set, since the cached data stays on
+        # the machine. The caches are built on first use.
+        def make_attachment_blob_cache():
+            max_size = int(os.environ.get("BRAINTRUST_ATTACHMENT_CACHE_MAX_SIZE", "0"))
+            if max_size <= 0:
+                return None
+            return FileCache(
+                cache_dir=os.environ.get(
+                    "BRAINTRUST_ATTACHMENT_CACHE_DIR", f"{os.environ.get('HOME')}/.braintrust/attachment_cache"
+                ),
+                max_size=max_size,
+            )
+
+        def make_dataset_cache():
+            max_size = int(os.environ.get("BRAINTRUST_DATASET_CACHE_MAX_SIZE", "0"))
+            if max_size <= 0:
+                return None
+            return DatasetCache(
+                FileCache(
+                    cache_dir=os.environ.get(
+                        "BRAINTRUST_DATASET_CACHE_DIR", f"{os.environ.get('HOME')}/.braintrust/dataset_cache"
+                    ),
+                    max_size=max_size,
+                )
+            )
+
+        self._attachment_blob_cache: LazyValue[Optional[FileCache]] = LazyValue(
+            make_attachment_blob_cache, use_mutex=True
+        )
+        self._dataset_cache: LazyValue[Optional[DatasetCache]] = LazyValue(make_dataset_cache, use_mutex=True)
+
+        # Object store requests go to signed URLs, so they do not depend on the
+        # login info and can share a connection pool for the whole process.
+        self._object_store_conn: Optional[HTTPConnection] = None
+
     def reset_login_info(self):
         self.app_url: Optional[str] = None
         self.app_public_url: Optional[str] = None
@@ -358,6 +436,11 @@ class BraintrustState:
             self._proxy_conn = HTTPConnection(self.proxy_url, adapter=_http_adapter)
         return self._proxy_conn
 
+    def object_store_conn(self):
+        if not self._object_store_conn:
+            self._object_store_conn = HTTPConnection(base_url="", adapter=_http_adapter)
+        return self._object_store_conn
+
     def user_info(self) -> Mapping[str, Any]:
         if not self._user_info:
             self._user_info = self.api_conn().get_json("ping")
@@ -399,6 +482,9 @@ def set_http_adapter(adapter: HTTPAdapter) -> None:
     if _state._api_conn:
         _state._api_conn._set_adapter(adapter=adapter)
         _state._api_conn._reset()
+    if _state._object_store_conn:
+        _state._object_store_conn._set_adapter(adapter=adapter)
+        _state._object_store_conn._reset()
 
 
 class HTTPConnection:
@@ -525,6 +611,26 @@ def _check_json_serializable(event):
         raise Exception(f"All logged values must be JSON-serializable: {event}") from e
 
 
+def _check_json_serializable_rows(rows: Sequence[Mapping[str, Any]]) -> None:
+    try:
+        bt_dumps(rows)
+    except TypeError:
+        # Re-check the rows one at a time, so that the error names the
+        # offending row.
+        for row in rows:
+            _check_json_serializable(row)
+        raise
+
+
+def _chunked(items: Iterable[T], chunk_size: int) -> Iterator[List[T]]:
+    it = iter(items)
+    while True:
+        chunk = list(itertools.islice(it, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
 # We should only have one instance of this object in
 # 'BraintrustState._global_bg_logger'. Be careful about spawning multiple
 # instances of this class, because concurrent _BackgroundLoggers will not log to
@@ -583,6 +689,34 @@ class _BackgroundLogger:
         except:
             self.all_publish_payloads_dir = None
 
+        # String or binary values in `input`, `output`, `expected`, or
+        # `metadata` longer than this threshold are converted into attachments
+        # before they are queued, so that they are uploaded to object storage
+        # instead of bloating the logs payloads.
+        try:
+            self.attachment_offload_threshold: Optional[int] = int(
+                os.environ["BRAINTRUST_ATTACHMENT_OFFLOAD_THRESHOLD"]
+            )
+        except:
+            self.attachment_offload_threshold = None
+
+        try:
+            self.attachment_upload_concurrency = int(os.environ["BRAINTRUST_ATTACHMENT_UPLOAD_CONCURRENCY"])
+        except:
+            self.attachment_upload_concurrency = 4
+
+        # Attachments are uploaded on a separate, bounded pool so that large
+        # files neither block publishing rows nor compete with the logs
+        # requests for threads.
+        self.attachment_upload_pool = concurrent.futures.ThreadPoolExecutor(
+            max_workers=self.attachment_upload_concurrency
+        )
+        # In-flight uploads by attachment key. Deduplicated attachments with
+        # identical contents share a key, so they also share the upload, even
+        # if they are flushed separately.
+        self._pending_attachment_uploads: Dict[str, concurrent.futures.Future] = {}
+        self._pending_attachment_uploads_lock = threading.Lock()
+
         # Don't limit the queue size if we're in 'sync_flush' mode and are not
         # dropping when full, otherwise logging could block indefinitely.
         if self.sync_flush and not self.queue_drop_when_full:
@@ -644,14 +778,25 @@ class _BackgroundLogger:
                 time.sleep(0.1)
 
             try:
-                self.flush()
+                self.flush(wait_for_attachments=False)
             except:
                 traceback.print_exc(file=self.outfile)
 
-    def flush(self, batch_size: Optional[int] = None):
+    def flush(self, batch_size: Optional[int] = None, wait_for_attachments: bool = True):
         if batch_size is None:
             batch_size = self.default_batch_size
 
+        attachment_uploads: List[concurrent.futures.Future] = []
+        try:
+            self._flush_rows(batch_size, attachment_uploads)
+        finally:
+            if wait_for_attachments:
+                self._wait_for_attachment_uploads(attachment_uploads)
+            else:
+                for future in attachment_uploads:
+                    future.add_done_callback(self._print_attachment_upload_error)
+
+    def _flush_rows(self, batch_size: int, attachment_uploads: List[concurrent.futures.Future]):
         # We cannot have multiple threads flushing in parallel, because the
         # order of published elements would be undefined.
         with self.flush_lock:
@@ -692,22 +837,67 @@ class _BackgroundLogger:
                         f"Encountered the following errors while logging:", post_promise_exceptions
                     )
 
-            attachment_errors: List[Exception] = []
+            # Attachments are uploaded after their rows have been published.
+            # The uploads are not ordered with respect to each other, so we
+            # let them run in the background and only wait for them outside of
+            # the flush lock.
             for attachment in attachments:
-                try:
-                    result = attachment.upload()
-                    if result["upload_status"] == "error":
-                        raise RuntimeError(result.get("error_message"))
-                except Exception as e:
-                    attachment_errors.append(e)
-
-            if len(attachment_errors) == 1:
-                raise attachment_errors[0]
-            elif len(attachment_errors) > 1:
-                raise exceptiongroup.ExceptionGroup(
-                    "Encountered errors while uploading attachments",
-                    attachment_errors,
-                )
+                attachment_uploads.append(self._submit_attachment_upload(attachment))
+
+    def _submit_attachment_upload(self, attachment: "Attachment") -> concurrent.futures.Future:
+        key = attachment.reference["key"]
+        # The upload is registered under the lock before it starts, so that
+        # concurrent flushes of the same attachment share one upload.
+        future: concurrent.futures.Future = concurrent.futures.Future()
+        with self._pending_attachment_uploads_lock:
+            pending = self._pending_attachment_uploads.setdefault(key, future)
+        if pending is not future:
+            return pending
+
+        def upload():
+            future.set_running_or_notify_cancel()
+            try:
+                future.set_result(_upload_attachment(attachment))
+            except Exception as e:
+                future.set_exception(e)
+
+        try:
+            self.attachment_upload_pool.submit(upload)
+        except RuntimeError:
+            # If the thread pool has shut down, e.g. because the process is
+            # terminating, upload the attachment synchronously.
+            upload()
+        future.add_done_callback(lambda f: self._on_attachment_upload_done(key, f))
+        return future
+
+    def _on_attachment_upload_done(self, key: str, future: concurrent.futures.Future):
+        with self._pending_attachment_uploads_lock:
+            if self._pending_attachment_uploads.get(key) is future:
+                del self._pending_attachment_uploads[key]
+
+    def _print_attachment_upload_error(self, future: concurrent.futures.Future):
+        e = future.exception()
+        if e is not None:
+            print("Failed to upload attachment", file=self.outfile)
+            traceback.print_exception(type(e), e, e.__traceback__, file=self.outfile)
+
+    def _wait_for_attachment_uploads(self, attachment_uploads: Sequence[concurrent.futures.Future]):
+        # Wait for every in-flight upload, including the ones started by
+        # background flushes, so that a flush only returns once all the
+        # previously-logged attachments have been uploaded. Only the errors
+        # from our own uploads are raised.
+        with self._pending_attachment_uploads_lock:
+            pending = list(self._pending_attachment_uploads.values())
+        concurrent.futures.wait([*attachment_uploads, *pending])
+
+        attachment_errors = [e for e in (f.exception() for f in attachment_uploads) if e is not None]
+        if len(attachment_errors) == 1:
+            raise attachment_errors[0]
+        elif len(attachment_errors) > 1:
+            raise exceptiongroup.ExceptionGroup(
+                "Encountered errors while uploading attachments",
+                attachment_errors,
+            )
 
     def _unwrap_lazy_values(
         self, wrapped_items: Sequence[LazyValue[Dict[str, Any]]]
@@ -828,6 +1018,13 @@ class _BackgroundLogger:
         self.api_conn = LazyValue(lambda: api_conn, use_mutex=False)
 
 
+def _upload_attachment(attachment: "Attachment") -> AttachmentStatus:
+    result = attachment.upload()
+    if result["upload_status"] == "error":
+        raise RuntimeError(result.get("error_message"))
+    return result
+
+
 def _internal_reset_global_state() -> None:
     global _state
     _state = BraintrustState()
@@ -1098,7 +1295,7 @@ def init_dataset(
     :param project_name: The name of the project to create the dataset in. Must specify at least one of `project_name` or `project_id`.
     :param name: The name of the dataset to create. If not specified, a name will be generated automatically.
     :param description: An optional description of the dataset.
-    :param version: An optional version of the dataset (to read). If not specified, the latest version will be used.
+    :param version: An optional version of the dataset (to read). If not specified, the latest version will be used. If `BRAINTRUST_DATASET_CACHE_MAX_SIZE` is set, datasets are cached on disk (in `BRAINTRUST_DATASET_CACHE_DIR`), so that pinned versions are only fetched once and later versions are synced incrementally.
     :param app_url: The URL of the Braintrust App. Defaults to https://www.braintrust.dev.
     :param api_key: The API key to use. If the parameter is not specified, will try to use the `BRAINTRUST_API_KEY` environment variable. If no API
     key is specified, will prompt the user to login.
@@ -1607,6 +1804,42 @@ def flush():
     _state.global_bg_logger().flush()
 
 
+def _export_login_args() -> Optional[Dict[str, Any]]:
+    """Mainly for internal use. Returns the arguments to `login` which log another process into the same org as this one, or None if this process is not logged in."""
+
+    if not _state.logged_in:
+        return None
+    return dict(app_url=_state.app_url, api_key=_state.login_token, org_name=_state.org_name)
+
+
+@contextlib.contextmanager
+def _resume_span(exported: str, span_parents: Optional[List[str]]) -> Iterator[Span]:
+    """Mainly for internal use. Makes a span which was exported by another process (see `Span.export`) the current span, without logging a new row for it. Data logged to it is merged into the existing span, and spans started under it are its children. `span_parents` must be the parents of the exported span, so that the merged rows keep them."""
+
+    components = SpanComponentsV3.from_str(exported)
+    if not (components.row_id and components.span_id and components.root_span_id):
+        raise ValueError("Exported span does not refer to an individual span")
+
+    span = SpanImpl.__new__(SpanImpl)
+    span.set_current = True
+    span._logged_end_time = None
+    span.parent_object_type = components.object_type
+    span.parent_object_id = LazyValue(_span_components_to_object_id_lambda(components), use_mutex=False)
+    span.parent_compute_object_metadata_args = components.compute_object_metadata_args
+    span.propagated_event = components.propagated_event
+    span._id = components.row_id
+    span.span_id = components.span_id
+    span.root_span_id = components.root_span_id
+    span.span_parents = span_parents
+    span._is_merge = True
+
+    token = _state.current_span.set(span)
+    try:
+        yield span
+    finally:
+        _state.current_span.reset(token)
+
+
 def _check_org_info(org_info, org_name):
     global _state
 
@@ -1636,6 +1869,18 @@ def _populate_args(d, **kwargs):
     return d
 
 
+def _merge_dicts_copy(merge_into: Mapping[str, Any], merge_from: Mapping[str, Any]) -> Dict[str, Any]:
+    """Like `merge_dicts`, but returns a new dictionary instead of updating `merge_into`."""
+    merged = dict(merge_into)
+    for k, merge_from_v in merge_from.items():
+        merge_into_v = merged.get(k)
+        if isinstance(merge_into_v, dict) and isinstance(merge_from_v, dict):
+            merged[k] = _merge_dicts_copy(merge_into_v, merge_from_v)
+        else:
+            merged[k] = merge_from_v
+    return merged
+
+
 def _filter_none_args(args):
     new_args = {}
     for k, v in args.items():
@@ -1672,7 +1917,7 @@ def _extract_attachments(event: Dict[str, Any], attachments: List["Attachment"])
         # Base case: Attachment.
         if isinstance(v, Attachment):
             attachments.append(v)
-            return v.reference  # Attachment cannot be nested.
+            return v.resolve_reference()  # Attachment cannot be nested.
 
         # Recursive case: object.
         if isinstance(v, Dict):
@@ -1810,6 +2055,23 @@ def _validate_and_sanitize_experiment_log_partial_args(event: Mapping[str, Any])
         return {k: v for k, v in event.items()}
 
 
+# The fields accepted by `Logger.log`, and by `Logger.log_many` for each event.
+_LOGGER_LOG_FIELDS = frozenset(["input", "output", "expected", "error", "tags", "scores", "metadata", "metrics", "id"])
+
+# The fields accepted by `Experiment.log`, and by `Experiment.log_many` for
+# each event. `inputs` is the deprecated spelling of `input`.
+_EXPERIMENT_LOG_FIELDS = _LOGGER_LOG_FIELDS | {"dataset_record_id", "inputs"}
+
+
+def _validate_log_many_event(event: Mapping[str, Any], permitted_fields: AbstractSet[str]) -> Mapping[str, Any]:
+    # Reject unknown fields the same way `log` rejects unknown keyword
+    # arguments.
+    unknown_fields = set(event.keys()) - permitted_fields
+    if unknown_fields:
+        raise TypeError(f"log_many() got unexpected event fields: {sorted(unknown_fields)}")
+    return event
+
+
 # Note that this only checks properties that are expected of a complete event.
 # _validate_and_sanitize_experiment_log_partial_args should still be invoked
 # (after handling special fields like 'id').
@@ -1829,23 +2091,67 @@ def _validate_and_sanitize_experiment_log_full_args(event: Mapping[str, Any], ha
     return event
 
 
+# Top-level event fields whose oversized values may be offloaded to attachments.
+_OFFLOADABLE_FIELDS = ("input", "output", "expected", "metadata")
+
+_DATA_URL_PREFIX_RE = re.compile(r"data:([\w.+-]+/[\w.+-]+)?;base64,")
+
+
+def _offload_to_attachment(value: Union[str, bytes, bytearray], path: Sequence[str]) -> "Attachment":
+    """
+    Converts an oversized string or binary value into an `Attachment`. Base64
+    data URLs (e.g. inline images) are decoded so the attachment holds the raw
+    file contents with the right content type.
+
+    :param value: The value to offload.
+    :param path: The path of the value within the event, used to name the attachment.
+    """
+    name = ".".join(path)
+    if isinstance(value, str):
+        match = _DATA_URL_PREFIX_RE.match(value)
+        if match:
+            content_type = match.group(1) or "application/octet-stream"
+            try:
+                data = base64.b64decode(value[match.end() :], validate=True)
+            except binascii.Error:
+                pass
+            else:
+                extension = mimetypes.guess_extension(content_type) or ""
+                return Attachment(data=data, filename=f"{name}{extension}", content_type=content_type)
+        return Attachment(data=value.encode("utf-8"), filename=f"{name}.txt", content_type="text/plain")
+    return Attachment(data=bytes(value), filename=f"{name}.bin", content_type="application/octet-stream")
+
+
 def _deep_copy_event(event: Mapping[str, Any]) -> Dict[str, Any]:
     """
     Creates a deep copy of the given event. Replaces references to user objects
     with placeholder strings to ensure serializability, except for `Attachment`
     objects, which are preserved and not deep-copied.
+
+    If the background logger has an `attachment_offload_threshold`, string and
+    binary values under `input`, `output`, `expected` or `metadata` which are
+    longer than the threshold are replaced with `Attachment` objects.
     """
+    offload_threshold = _state.global_bg_logger().attachment_offload_threshold
 
-    def _deep_copy_object(v: Any) -> Any:
+    # `path` is only tracked for values which are eligible for offloading.
+    def _deep_copy_object(v: Any, path: Optional[Tuple[str, ...]] = None) -> Any:
         if isinstance(v, Mapping):
             # Prevent dict keys from holding references to user data. Note that
             # `bt_json` already coerces keys to string, a behavior that comes from
             # `json.dumps`. However, that runs at log upload time, while we want to
             # cut out all the references to user objects synchronously in this
             # function.
-            return {str(k): _deep_copy_object(v[k]) for k in v}
+            return {str(k): _deep_copy_object(v[k], path and path + (str(k),)) for k in v}
         elif isinstance(v, (List, Tuple, Set)):
-            return [_deep_copy_object(x) for x in v]
+            return [_deep_copy_object(x, path and path + (str(i),)) for i, x in enumerate(v)]
+        elif (
+            path is not None
+            and offload_threshold is not None
+            and isinstance(v, (str, bytes, bytearray))
+            and len(v) > offload_threshold
+        ):
+            return _offload_to_attachment(v, path)
         elif isinstance(v, Span):
             return "<span>"
         elif isinstance(v, Experiment):
@@ -1869,27 +2175,39 @@ def _deep_copy_event(event: Mapping[str, Any]) -> Dict[str, Any]:
             # fully-independent from the original.
             return json.loads(bt_dumps(v))
 
-    return _deep_copy_object(event)
+    return {str(k): _deep_copy_object(event[k], (str(k),) if k in _OFFLOADABLE_FIELDS else None) for k in event}
 
 
 class ObjectIterator(Generic[T]):
     def __init__(self, refetch_fn: Callable[[], Sequence[T]]):
         self.refetch_fn = refetch_fn
+        self.data: Optional[Sequence[T]] = None
         self.idx = 0
 
     def __iter__(self):
         return self
 
     def __next__(self) -> T:
-        data = self.refetch_fn()
-        if self.idx >= len(data):
+        # Only fetch once, so that each step does not go back to the (possibly
+        # invalidated) cache.
+        if self.data is None:
+            self.data = self.refetch_fn()
+        if self.idx >= len(self.data):
             raise StopIteration
-        value = data[self.idx]
+        value = self.data[self.idx]
         self.idx += 1
 
         return value
 
 
+# Fetch responses are decoded in chunks of this size.
+_FETCH_RESPONSE_CHUNK_SIZE = 1 << 16
+
+# Fields that are always fetched, even when only some columns are requested,
+# since records cannot be identified or versioned without them.
+_FETCH_REQUIRED_COLUMNS = (ID_FIELD, TRANSACTION_ID_FIELD, CREATED_FIELD)
+
+
 class ObjectFetcher(ABC, Generic[TMapping]):
     def __init__(
         self,
@@ -1913,7 +2231,12 @@ class ObjectFetcher(ABC, Generic[TMapping]):
         self._fetched_data: Optional[List[TMapping]] = None
         self._internal_btql = _internal_btql
 
-    def fetch(self) -> Iterator[TMapping]:
+    def fetch(
+        self,
+        batch_size: Optional[int] = None,
+        columns: Optional[Sequence[str]] = None,
+        filter: Optional[Dict[str, Any]] = None,
+    ) -> Iterator[TMapping]:
         """
         Fetch all records.
 
@@ -1924,10 +2247,32 @@ class ObjectFetcher(ABC, Generic[TMapping]):
         # You can also iterate over the object directly.
         for record in object:
             print(record)
+
+        # Stream large objects page by page, without holding every record in memory.
+        for record in object.fetch(batch_size=1000):
+            print(record)
+
+        # Only fetch the columns you need, and only the records matching a BTQL filter.
+        is_test = {
+            "op": "eq",
+            "left": {"op": "ident", "name": ["metadata", "split"]},
+            "right": {"op": "literal", "value": "test"},
+        }
+        for record in object.fetch(columns=["input", "expected"], filter=is_test):
+            print(record)
         ```
 
-        :returns: An iterator over the records.
+        :param batch_size: If specified, records are fetched in pages of (at most) this many records, and the next page is fetched in the background while the current one is consumed. Paginated fetches are not cached, so iterating again fetches the records again. By default, all records are fetched in a single request and cached.
+        :param columns: If specified, only these top-level fields are fetched, in addition to `id`, `_xact_id` and `created`, which are always included. The projection is applied by the server, so fields which are not needed are never transferred.
+        :param filter: If specified, only the records matching this BTQL filter expression are fetched. The filter is evaluated by the server. It cannot be used with a pinned `version`.
+        :returns: An iterator over the records. Fetches with `columns` or `filter` are not cached.
         """
+        if batch_size is not None and batch_size <= 0:
+            raise ValueError(f"batch_size ({batch_size}) must be a positive integer")
+        if columns is not None or filter is not None:
+            return self._fetch_query(batch_size, columns, filter)
+        if batch_size is not None and self._fetched_data is None:
+            return self._fetch_paginated(batch_size)
         return ObjectIterator(self._refetch)
 
     def __iter__(self) -> Iterator[TMapping]:
@@ -1949,52 +2294,138 @@ class ObjectFetcher(ABC, Generic[TMapping]):
     def id(self) -> str:
         ...
 
-    def _refetch(self) -> List[TMapping]:
+    def _fetch_page(
+        self, cursor: Optional[str] = None, limit: Optional[int] = None, btql: Optional[Dict[str, Any]] = None
+    ) -> Tuple[List[TMapping], Optional[str]]:
+        """Fetches one page of raw records, and the cursor for the next page. Without a limit, fetches every record. If
+        `btql` is specified, its clauses are used in place of the object's internal BTQL query."""
+        fields: Dict[str, Any] = {}
+        data = list(self._iter_page(fields, cursor=cursor, limit=limit, btql=btql))
+        return data, fields.get("cursor")
+
+    def _iter_page(
+        self,
+        fields: Dict[str, Any],
+        cursor: Optional[str] = None,
+        limit: Optional[int] = None,
+        btql: Optional[Dict[str, Any]] = None,
+    ) -> Iterator[TMapping]:
+        """Like `_fetch_page`, but decodes the records one at a time as the response is received, instead of
+        buffering and parsing the whole response. The other fields of the response, such as the cursor, are stored in
+        `fields` once the iterator is exhausted."""
         state = self._get_state()
-        if self._fetched_data is None:
-            if self._internal_btql:
-                resp = state.api_conn().post(
-                    f"btql",
-                    json={
-                        "query": {
-                            **self._internal_btql,
-                            "select": [{"op": "star"}],
-                            "from": {
-                                "op": "function",
-                                "name": {
-                                    "op": "ident",
-                                    "name": [self.object_type],
-                                },
-                                "args": [
-                                    {
-                                        "op": "literal",
-                                        "value": self.id,
-                                    },
-                                ],
+        btql = btql or self._internal_btql
+        if btql:
+            resp = state.api_conn().post(
+                f"btql",
+                json={
+                    "query": {
+                        **btql,
+                        "select": btql.get("select") or [{"op": "star"}],
+                        "from": {
+                            "op": "function",
+                            "name": {
+                                "op": "ident",
+                                "name": [self.object_type],
                             },
+                            "args": [
+                                {
+                                    "op": "literal",
+                                    "value": self.id,
+                                },
+                            ],
                         },
+                        **({"limit": limit} if limit is not None else {}),
+                        **({"cursor": cursor} if cursor is not None else {}),
                     },
-                    headers={
-                        "Accept-Encoding": "gzip",
-                    },
-                )
-                response_raise_for_status(resp)
-                data = cast(List[TMapping], resp.json()["data"])
-            else:
-                resp = state.api_conn().get(
-                    f"v1/{self.object_type}/{self.id}/fetch",
-                    params={
-                        "version": self._pinned_version,
-                    },
-                    headers={
-                        "Accept-Encoding": "gzip",
-                    },
-                )
-                response_raise_for_status(resp)
-                data = cast(List[TMapping], resp.json()["events"])
+                },
+                headers={
+                    "Accept-Encoding": "gzip",
+                },
+                stream=True,
+            )
+            key = "data"
+        else:
+            resp = state.api_conn().get(
+                f"v1/{self.object_type}/{self.id}/fetch",
+                params={
+                    "version": self._pinned_version,
+                    "limit": limit,
+                    "cursor": cursor,
+                },
+                headers={
+                    "Accept-Encoding": "gzip",
+                },
+                stream=True,
+            )
+            key = "events"
+
+        with resp:
+            response_raise_for_status(resp)
+            for record in iter_json_object_array(resp.iter_content(_FETCH_RESPONSE_CHUNK_SIZE), key, fields):
+                yield cast(TMapping, record)
+            if key in fields:
+                # The records were not an array, so they were stored as a field.
+                raise ValueError(f"Expected a list in the response, got {type(fields[key])}")
+
+    def _fetch_records(self) -> List[TMapping]:
+        """Fetches every raw record in a single request."""
+        data, _ = self._fetch_page()
+        return data
+
+    def _fetch_paginated(self, batch_size: int, btql: Optional[Dict[str, Any]] = None) -> Iterator[TMapping]:
+        # Keep at most two pages in memory: the one being consumed, and the
+        # next one, which is fetched in the background.
+        next_page = HTTP_REQUEST_THREAD_POOL.submit(self._fetch_page, None, batch_size, btql)
+        try:
+            while next_page is not None:
+                data, cursor = next_page.result()
+                if cursor and data:
+                    next_page = HTTP_REQUEST_THREAD_POOL.submit(self._fetch_page, cursor, batch_size, btql)
+                else:
+                    next_page = None
 
-            if not isinstance(data, list):
-                raise ValueError(f"Expected a list in the response, got {type(data)}")
+                for record in data:
+                    yield self._mutate_record(record) if self._mutate_record is not None else record
+                del data
+        finally:
+            if next_page is not None:
+                next_page.cancel()
+
+    def _fetch_query(
+        self, batch_size: Optional[int], columns: Optional[Sequence[str]], filter: Optional[Dict[str, Any]]
+    ) -> Iterator[TMapping]:
+        if self._pinned_version is not None:
+            # BTQL queries always read the latest version, so pinned versions are
+            # read in full, which is cheap once they are cached locally, and
+            # projected on the client.
+            if filter is not None:
+                raise ValueError("filter cannot be used when fetching a pinned version")
+            keep = set(_FETCH_REQUIRED_COLUMNS).union(columns or [])
+            return (
+                cast(TMapping, {k: v for k, v in record.items() if k in keep}) for record in self.fetch(batch_size)
+            )
+
+        btql = dict(self._internal_btql or {})
+        if columns is not None:
+            btql["select"] = [
+                {"alias": column, "expr": {"op": "ident", "name": [column]}}
+                for column in dict.fromkeys([*_FETCH_REQUIRED_COLUMNS, *columns])
+            ]
+        if filter is not None:
+            internal_filter = btql.get("filter")
+            btql["filter"] = (
+                filter if internal_filter is None else {"op": "and", "left": internal_filter, "right": filter}
+            )
+
+        if batch_size is not None:
+            return self._fetch_paginated(batch_size, btql=btql)
+        data, _ = self._fetch_page(btql=btql)
+        return iter([self._mutate_record(r) for r in data] if self._mutate_record is not None else data)
+
+    def _refetch(self) -> List[TMapping]:
+        if self._fetched_data is None:
+            data = self._fetch_records()
             if self._mutate_record is not None:
                 self._fetched_data = [self._mutate_record(r) for r in data]
             else:
@@ -2029,6 +2460,7 @@ class Attachment:
         data: Union[str, bytes, bytearray],
         filename: str,
         content_type: str,
+        deduplicate: Optional[bool] = None,
     ):
         """
         Construct an attachment.
@@ -2038,6 +2470,8 @@ class Attachment:
         :param filename: The desired name of the file in Braintrust after uploading. This parameter is for visualization purposes only and has no effect on attachment storage.
 
         :param content_type: The MIME type of the file.
+
+        :param deduplicate: If true, the attachment is identified by a hash of its contents, and attachments with identical contents, filename, and content type share a single upload. Defaults to the `BRAINTRUST_ATTACHMENT_DEDUPLICATE` environment variable.
         """
         self._reference: AttachmentReference = {
             "type": "braintrust_attachment",
@@ -2047,12 +2481,25 @@ class Attachment:
         }
         self._data_debug_string = data if isinstance(data, str) else "<in-memory data>"
 
+        self._data_source = data
         self._data = self._init_data(data)
+        self._deduplicate = _state.deduplicate_attachments if deduplicate is None else deduplicate
+        self._registry_key = self._init_registry_key()
         self._uploader = self._init_uploader()
 
     @property
     def reference(self) -> AttachmentReference:
-        """The object that replaces this `Attachment` at upload time."""
+        """The object that replaces this `Attachment` at upload time. If the attachment is deduplicated, its key is only final once `resolve_reference` has been called, which happens automatically when the attachment is logged."""
+        return self._reference
+
+    def resolve_reference(self) -> AttachmentReference:
+        """
+        Returns the final reference for this attachment. If the attachment is deduplicated, this hashes the attachment contents and logs in to look up the key of an existing attachment with identical contents, on first call.
+
+        :returns: The attachment reference.
+        """
+        if self._deduplicate:
+            self._registry_key.get()
         return self._reference
 
     @property
@@ -2076,6 +2523,23 @@ class Attachment:
         """
         return {"input_data": self._data_debug_string, "reference": self._reference}
 
+    def _init_registry_key(self) -> LazyValue[str]:
+        def compute_registry_key() -> str:
+            with self._open_data_stream() as data_stream:
+                content_digest = compute_content_digest(data_stream)
+
+            # Keys are scoped to an organization, so we must know which one we
+            # are uploading to before we can look up an existing key.
+            login()
+            registry_key = create_registry_key(
+                _state.org_id or "", content_digest, self._reference["filename"], self._reference["content_type"]
+            )
+            registry = _state._attachment_registry.get()
+            self._reference["key"] = registry.resolve_key(registry_key, self._reference["key"])
+            return registry_key
+
+        return LazyValue(compute_registry_key, use_mutex=True)
+
     def _init_uploader(self) -> LazyValue[AttachmentStatus]:
         def do_upload(api_conn: HTTPConnection, org_id: str) -> Mapping[str, Any]:
             request_params = {
@@ -2093,24 +2557,27 @@ class Attachment:
                 raise RuntimeError(f"Failed to request signed URL from API server: {e}") from e
 
             try:
-                data = self._data.get()
+                data_stream = self._open_data_stream()
             except Exception as e:
                 raise IOError(f"Failed to read file: {e}") from e
 
-            signed_url = metadata.get("signedUrl")
-            headers = metadata.get("headers")
-            if not isinstance(signed_url, str) or not isinstance(headers, dict):
-                raise RuntimeError(f"Invalid response from API server: {metadata}")
+            with data_stream:
+                signed_url = metadata.get("signedUrl")
+                headers = metadata.get("headers")
+                if not isinstance(signed_url, str) or not isinstance(headers, dict):
+                    raise RuntimeError(f"Invalid response from API server: {metadata}")
 
-            add_azure_blob_headers(headers, signed_url)
+                add_azure_blob_headers(headers, signed_url)
 
-            # TODO multipart upload.
-            try:
-                obj_conn = HTTPConnection(base_url="", adapter=_http_adapter)
-                obj_response = obj_conn.put(signed_url, headers=headers, data=data)
-                obj_response.raise_for_status()
-            except Exception as e:
-                raise RuntimeError(f"Failed to upload attachment to object store: {e}") from e
+                # The body is streamed from the file handle, so uploading a
+                # large file does not require holding it in memory. The signed
+                # URL only supports a single PUT, so there is no multipart
+                # upload.
+                try:
+                    obj_response = _state.object_store_conn().put(signed_url, headers=headers, data=data_stream)
+                    obj_response.raise_for_status()
+                except Exception as e:
+                    raise RuntimeError(f"Failed to upload attachment to object store: {e}") from e
 
             return {
                 "signed_url": signed_url,
@@ -2123,6 +2590,12 @@ class Attachment:
             status = AttachmentStatus(upload_status="uploading")
 
             login()
+            registry_key = self._registry_key.get() if self._deduplicate else None
+            if registry_key is not None and _state._attachment_registry.get().is_uploaded(registry_key):
+                # Identical contents were already uploaded under this key.
+                status["upload_status"] = "done"
+                return status
+
             api_conn = _state.api_conn()
             org_id = _state.org_id or ""
 
@@ -2144,6 +2617,12 @@ class Attachment:
             except Exception as e:
                 raise RuntimeError(f"Couldn't log attachment status: {e}") from e
 
+            if registry_key is not None and status["upload_status"] == "done":
+                try:
+                    _state._attachment_registry.get().mark_uploaded(registry_key, self._reference["key"])
+                except Exception as e:
+                    eprint(f"Failed to record uploaded attachment: {e}")
+
             return status
 
         return LazyValue(error_wrapper, use_mutex=True)
@@ -2159,6 +2638,20 @@ class Attachment:
         else:
             return LazyValue(lambda: bytes(data), use_mutex=False)
 
+    def _open_data_stream(self) -> io.BufferedIOBase:
+        """Opens a binary stream over the attachment contents, without reading a file on disk into memory."""
+        if self._data.has_succeeded:
+            return io.BytesIO(self._data.get())
+        elif isinstance(self._data_source, str):
+            return open(self._data_source, "rb")
+        else:
+            return io.BytesIO(self._data_source)
+
+
+# Attachments are downloaded in chunks of this size, so that large attachments
+# are never held in memory all at once.
+_ATTACHMENT_DOWNLOAD_CHUNK_SIZE = 1 << 20
+
 
 class AttachmentMetadata(TypedDict):
     downloadUrl: str
@@ -2177,9 +2670,62 @@ class ReadonlyAttachment:
 
     @property
     def data(self) -> bytes:
-        """The attachment contents. This is a lazy value that will read the attachment contents from the object store on first access."""
+        """The attachment contents. This is a lazy value that will read the attachment contents from the local attachment cache, or from the object store, on first access."""
         return self._data.get()
 
+    def download_to(self, fileobj: BinaryIO, chunk_size: int = _ATTACHMENT_DOWNLOAD_CHUNK_SIZE) -> None:
+        """
+        Stream the attachment contents into a file-like object, without holding them in memory. If the local attachment cache is enabled (by setting `BRAINTRUST_ATTACHMENT_CACHE_MAX_SIZE`), the contents are read from it if possible, and saved to it otherwise.
+
+        :param fileobj: A binary file-like object to write the contents to.
+        :param chunk_size: The number of bytes to copy at a time.
+        """
+        cached_file = self._open_cached_file()
+        if cached_file is not None:
+            with cached_file:
+                shutil.copyfileobj(cached_file, fileobj, chunk_size)
+            return
+
+        with self._request_object() as response:
+            for chunk in self._iter_response(response, chunk_size):
+                fileobj.write(chunk)
+
+    def read_range(self, offset: int, length: Optional[int] = None) -> bytes:
+        """
+        Read part of the attachment contents, without downloading the rest. Uses the local attachment cache if the attachment has already been downloaded, and an HTTP range request otherwise.
+
+        :param offset: The byte offset to start reading at.
+        :param length: The maximum number of bytes to read. If not specified, reads until the end of the attachment.
+        :returns: The requested bytes. Fewer than `length` bytes are returned if the range extends past the end of the attachment.
+        """
+        if offset < 0 or (length is not None and length < 0):
+            raise ValueError("offset and length must be non-negative")
+        if length == 0:
+            return b""
+
+        cache = _state._attachment_blob_cache.get()
+        cached_path = cache.get_path(self.reference["key"]) if cache else None
+        if cached_path is not None:
+            try:
+                with open(cached_path, "rb") as f:
+                    f.seek(offset)
+                    return f.read(-1 if length is None else length)
+            except FileNotFoundError:
+                # Evicted concurrently, so fall back to the object store.
+                pass
+
+        end = "" if length is None else str(offset + length - 1)
+        with self._request_object(headers={"Range": f"bytes={offset}-{end}"}) as response:
+            content = b"".join(self._iter_response(response, _ATTACHMENT_DOWNLOAD_CHUNK_SIZE))
+            if response.status_code == 206:
+                return content
+            elif response.status_code == 416:
+                # The range starts past the end of the attachment.
+                return b""
+            else:
+                # The object store ignored the range and sent the whole object.
+                return content[offset:] if length is None else content[offset : offset + length]
+
     def metadata(self) -> AttachmentMetadata:
         """Fetch the attachment metadata, which includes a downloadUrl and a status. This will re-fetch the status each time in case it changes over time."""
         login()
@@ -2207,22 +2753,61 @@ class ReadonlyAttachment:
         """Fetch the attachment upload status. This will re-fetch the status each time in case it changes over time."""
         return self.metadata()["status"]
 
-    def _init_downloader(self) -> LazyValue[bytes]:
-        def download() -> bytes:
-            metadata = self.metadata()
-            download_url = metadata["downloadUrl"]
-            status = metadata["status"]
-            try:
-                if status["upload_status"] != "done":
-                    raise RuntimeError(f"""Expected attachment status "done", got \"{status["upload_status"]}\"""")
+    def _request_object(self, headers: Optional[Mapping[str, str]] = None) -> requests.Response:
+        """Starts a streaming download of the attachment from the object store."""
+        metadata = self.metadata()
+        download_url = metadata["downloadUrl"]
+        status = metadata["status"]
+        try:
+            if status["upload_status"] != "done":
+                raise RuntimeError(f"""Expected attachment status "done", got \"{status["upload_status"]}\"""")
 
-                obj_conn = HTTPConnection(base_url="", adapter=_http_adapter)
-                obj_response = obj_conn.get(download_url)
+            obj_response = _state.object_store_conn().get(download_url, headers=headers, stream=True)
+            if obj_response.status_code != 416:
                 obj_response.raise_for_status()
-            except Exception as e:
-                raise RuntimeError(f"Couldn't download attachment: {e}") from e
+        except Exception as e:
+            raise RuntimeError(f"Couldn't download attachment: {e}") from e
+        return obj_response
+
+    @staticmethod
+    def _iter_response(response: requests.Response, chunk_size: int) -> Iterator[bytes]:
+        # Network errors are subclasses of OSError, so we surface them as
+        # RuntimeErrors to tell them apart from errors writing to disk.
+        try:
+            yield from response.iter_content(chunk_size=chunk_size)
+        except requests.RequestException as e:
+            raise RuntimeError(f"Couldn't download attachment: {e}") from e
+
+    def _open_cached_file(self) -> Optional[BinaryIO]:
+        """Opens the attachment in the local attachment cache, downloading it into the cache first if needed. Returns None if the cache is disabled or unusable."""
+        cache = _state._attachment_blob_cache.get()
+        if cache is None:
+            return None
+
+        key = self.reference["key"]
+        cached_path = cache.get_path(key)
+        if cached_path is None:
+            try:
+                with self._request_object() as response, cache.writer(key) as cache_file:
+                    for chunk in self._iter_response(response, _ATTACHMENT_DOWNLOAD_CHUNK_SIZE):
+                        cache_file.write(chunk)
+            except OSError as e:
+                eprint(f"Failed to write attachment to the local cache: {e}")
+                return None
+            cached_path = cache.get_path(key)
+            if cached_path is None:
+                return None
 
-            return obj_response.content
+        try:
+            return open(cached_path, "rb")
+        except OSError:
+            return None
+
+    def _init_downloader(self) -> LazyValue[bytes]:
+        def download() -> bytes:
+            buf = io.BytesIO()
+            self.download_to(buf)
+            return buf.getvalue()
 
         return LazyValue(download, use_mutex=True)
 
@@ -2631,6 +3216,42 @@ class Experiment(ObjectFetcher[ExperimentEvent], Exportable):
         self.last_start_time = span.end()
         return span.id
 
+    def log_many(
+        self,
+        events: Iterable[Mapping[str, Any]],
+        batch_size: Optional[int] = None,
+        allow_concurrent_with_spans: bool = False,
+    ) -> List[str]:
+        """
+        Log many events to the experiment. This is equivalent to calling `log` once per event, but much faster for large
+        numbers of events: the events are validated, serialized, and handed to the background logger a chunk at a time rather
+        than one by one. `events` may be a generator, in which case it is consumed lazily, and the call blocks whenever the
+        background logger falls behind.
+
+        :param events: An iterable of events, each a mapping with the same fields as the arguments to `log`.
+        :param batch_size: (Optional) the number of events to process at a time. Defaults to the background logger's batch size.
+        :param allow_concurrent_with_spans: (Optional) in rare cases where you need to log at the top level separately from using spans on the experiment elsewhere, set this to True.
+        :returns: The `id`s of the logged events, in order.
+        """
+        if self._called_start_span and not allow_concurrent_with_spans:
+            raise Exception(
+                "Cannot run toplevel `log_many` method while using spans. To log to the span, call `experiment.start_span` and then log with `span.log`"
+            )
+
+        has_dataset = self.dataset is not None
+        row_ids, self.last_start_time = _log_root_spans_many(
+            events,
+            parent_object_type=self._parent_object_type(),
+            parent_object_id=self._lazy_id,
+            default_root_type=SpanTypeAttribute.EVAL,
+            start_time=self.last_start_time,
+            batch_size=batch_size,
+            sanitize=lambda event: _validate_and_sanitize_experiment_log_full_args(
+                _validate_log_many_event(event, _EXPERIMENT_LOG_FIELDS), has_dataset
+            ),
+        )
+        return row_ids
+
     def log_feedback(
         self,
         id: str,
@@ -2875,6 +3496,37 @@ class ReadonlyExperiment(ObjectFetcher[ExperimentEvent]):
 _EXEC_COUNTER_LOCK = threading.Lock()
 _EXEC_COUNTER = 0
 
+# Span metrics which are summed across the spans of a test case.
+_ACCUMULATED_SPAN_METRICS = ("prompt_tokens", "completion_tokens", "tokens")
+
+
+class _SpanMetricsAccumulator:
+    """
+    Sums the token counts logged by every span in a context, e.g. all the spans of an eval's test case. Counts are
+    also added to the parent accumulator, if there is one, so that nested contexts can be counted separately.
+    """
+
+    def __init__(self, parent: Optional["_SpanMetricsAccumulator"] = None):
+        self._lock = threading.Lock()
+        self.metrics: Dict[str, float] = {}
+        self.parent = parent
+
+    def add(self, metrics: Mapping[str, Any]) -> None:
+        with self._lock:
+            for name in _ACCUMULATED_SPAN_METRICS:
+                value = metrics.get(name)
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    self.metrics[name] = self.metrics.get(name, 0) + value
+        if self.parent is not None:
+            self.parent.add(metrics)
+
+
+# If set, the metrics logged by every span in the current context are added to
+# this accumulator.
+_span_metrics_accumulator: "contextvars.ContextVar[Optional[_SpanMetricsAccumulator]]" = contextvars.ContextVar(
+    "braintrust_span_metrics_accumulator", default=None
+)
+
 
 class SpanImpl(Span):
     """Primary implementation of the `Span` interface. See the `Span` interface for full details on each method.
@@ -3019,6 +3671,9 @@ class SpanImpl(Span):
         serializable_partial_record = _deep_copy_event(partial_record)
         if serializable_partial_record.get("metrics", {}).get("end") is not None:
             self._logged_end_time = serializable_partial_record["metrics"]["end"]
+        metrics_accumulator = _span_metrics_accumulator.get()
+        if metrics_accumulator is not None and serializable_partial_record.get("metrics"):
+            metrics_accumulator.add(serializable_partial_record["metrics"])
 
         if len(serializable_partial_record.get("tags", [])) > 0 and self.span_parents:
             raise Exception("Tags can only be logged to the root span")
@@ -3130,6 +3785,100 @@ class SpanImpl(Span):
             self.end()
 
 
+def _log_root_spans_many(
+    events: Iterable[Mapping[str, Any]],
+    parent_object_type: SpanObjectTypeV3,
+    parent_object_id: LazyValue[str],
+    default_root_type: SpanTypeAttribute,
+    start_time: float,
+    batch_size: Optional[int],
+    sanitize: Callable[[Mapping[str, Any]], Mapping[str, Any]],
+) -> Tuple[List[str], float]:
+    """
+    Logs each event as a complete root span, the way the toplevel `log` methods do, but a chunk at a time.
+
+    Rather than starting and ending a `SpanImpl` per event, which logs two rows per event, each span is
+    written as a single row holding both its start and end time.
+
+    :returns: The ids of the logged spans, and the end time of the last one.
+    """
+    global _EXEC_COUNTER
+
+    if batch_size is None:
+        batch_size = _state.global_bg_logger().default_batch_size
+    caller_location = get_caller_location()
+
+    row_ids = []
+    for chunk in _chunked(events, batch_size):
+        with _EXEC_COUNTER_LOCK:
+            first_exec_counter = _EXEC_COUNTER + 1
+            _EXEC_COUNTER += len(chunk)
+        created = datetime.datetime.now(datetime.timezone.utc).isoformat()
+
+        rows = []
+        lazy_rows = []
+        for i, event in enumerate(chunk):
+            event = dict(sanitize(event))
+            row_id = event.pop("id", None)
+            if row_id is None or not isinstance(row_id, str):
+                row_id = str(uuid.uuid4())
+            span_id = str(uuid.uuid4())
+
+            internal_data: Dict[str, Any] = dict(
+                metrics=dict(start=start_time),
+                span_attributes=dict(type=default_root_type, name="root", exec_counter=first_exec_counter + i),
+                created=created,
+            )
+            if caller_location:
+                internal_data["context"] = caller_location
+
+            serializable_partial_record, lazy_partial_record = split_logging_data(event, internal_data)
+            row: Dict[str, Any] = dict(
+                id=row_id,
+                span_id=span_id,
+                root_span_id=span_id,
+                span_parents=None,
+                **serializable_partial_record,
+                **{IS_MERGE_FIELD: False},
+            )
+            if row["metrics"].get("end") is None:
+                row["metrics"]["end"] = time.time()
+            # Each span starts when the previous one ended.
+            start_time = row["metrics"]["end"]
+
+            rows.append(row)
+            lazy_rows.append(lazy_partial_record)
+
+        _check_json_serializable_rows(rows)
+        rows = [_deep_copy_event(row) for row in rows]
+        _log_span_rows(rows, lazy_rows, parent_object_type, parent_object_id)
+        row_ids.extend(row["id"] for row in rows)
+
+    return row_ids, start_time
+
+
+def _log_span_rows(
+    rows: List[Dict[str, Any]],
+    lazy_rows: List[Dict[str, LazyValue[Any]]],
+    parent_object_type: SpanObjectTypeV3,
+    parent_object_id: LazyValue[str],
+) -> None:
+    object_id_fields = LazyValue(
+        lambda: SpanComponentsV3(object_type=parent_object_type, object_id=parent_object_id.get()).object_id_fields(),
+        use_mutex=False,
+    )
+
+    def make_row(row: Dict[str, Any], lazy_row: Dict[str, LazyValue[Any]]) -> LazyValue[Dict[str, Any]]:
+        return LazyValue(
+            lambda: dict(**row, **{k: v.get() for k, v in lazy_row.items()}, **object_id_fields.get()),
+            use_mutex=False,
+        )
+
+    # Each row is queued separately, so that the queue size bounds the number
+    # of buffered rows.
+    _state.global_bg_logger().log(*[make_row(row, lazy_row) for row, lazy_row in zip(rows, lazy_rows)])
+
+
 def stringify_exception(exc_type: Type[BaseException], exc_value: BaseException, tb: Optional[TracebackType]) -> str:
     return "".join(
         traceback.format_exception_only(exc_type, exc_value)
@@ -3170,6 +3919,13 @@ def split_logging_data(
     return serializable_partial_record, lazy_partial_record
 
 
+# The number of changed rows to fetch per request when syncing a dataset.
+_DATASET_DELTA_PAGE_SIZE = 1000
+
+# The number of record ids to fetch per request when syncing a dataset.
+_DATASET_IDS_PAGE_SIZE = 10000
+
+
 class Dataset(ObjectFetcher[DatasetEvent]):
     """
     A dataset is a collection of records, such as model inputs and outputs, which represent
@@ -3196,8 +3952,17 @@ class Dataset(ObjectFetcher[DatasetEvent]):
             return ensure_dataset_record(r, legacy)
 
         self._lazy_metadata = lazy_metadata
+        self._legacy = legacy
         self.new_records = 0
 
+        # Writes are applied to the fetched records in place, so reads after
+        # writes do not need to go back to the server. The records are copied
+        # before the first write after they have been handed out, so that
+        # in-progress iterators are not affected.
+        self._fetched_index: Dict[str, int] = {}
+        self._fetched_data_shared = False
+        self._has_unflushed_writes = False
+
         ObjectFetcher.__init__(
             self,
             object_type="dataset",
@@ -3231,6 +3996,181 @@ class Dataset(ObjectFetcher[DatasetEvent]):
         self._lazy_metadata.get()
         return _state
 
+    def _refetch(self) -> List[DatasetEvent]:
+        if self._fetched_data is None:
+            # Make sure the server has seen our writes before we read from it.
+            if self._has_unflushed_writes:
+                self.flush()
+                self._has_unflushed_writes = False
+            data = super()._refetch()
+            self._fetched_index = {record[ID_FIELD]: i for i, record in enumerate(data)}
+        self._fetched_data_shared = True
+        return cast(List[DatasetEvent], self._fetched_data)
+
+    def _clear_cache(self) -> None:
+        super()._clear_cache()
+        self._fetched_index = {}
+
+    def refresh(self) -> None:
+        """
+        Discard the locally-fetched records, so that the next read fetches the latest version of the dataset from the
+        server. Any pending writes are flushed first.
+        """
+        self.flush()
+        self._has_unflushed_writes = False
+        self._clear_cache()
+
+    def _apply_local_write(self, row: Dict[str, Any]) -> None:
+        """Applies an inserted, updated, or deleted row to the locally-fetched records."""
+        # A pinned version never reflects new writes.
+        if self._pinned_version is not None:
+            return
+        if self._fetched_data is None:
+            self._has_unflushed_writes = True
+            return
+
+        if self._fetched_data_shared:
+            self._fetched_data = list(self._fetched_data)
+            self._fetched_data_shared = False
+        data = self._fetched_data
+
+        # The background logger replaces attachments in the logged row while
+        # flushing, so we keep our own copy.
+        row = _deep_copy_event(row)
+        row_id = row[ID_FIELD]
+        idx = self._fetched_index.get(row_id)
+        if row.get(OBJECT_DELETE_FIELD):
+            if idx is not None:
+                del data[idx]
+                del self._fetched_index[row_id]
+                for i in range(idx, len(data)):
+                    self._fetched_index[data[i][ID_FIELD]] = i
+        elif row.get(IS_MERGE_FIELD):
+            if idx is not None:
+                update = {k: v for k, v in row.items() if k != IS_MERGE_FIELD}
+                if self._legacy and "expected" in update:
+                    update["output"] = update.pop("expected")
+                data[idx] = cast(DatasetEvent, _merge_dicts_copy(cast(Dict[str, Any], data[idx]), update))
+        else:
+            record = ensure_dataset_record(cast(DatasetEvent, row), self._legacy)
+            if idx is not None:
+                data[idx] = record
+            else:
+                self._fetched_index[row_id] = len(data)
+                data.append(record)
+
+    def _get_dataset_cache(self) -> Optional[DatasetCache]:
+        # Custom queries do not return a dataset snapshot, so they are never
+        # cached.
+        if self._internal_btql:
+            return None
+        return _state._dataset_cache.get()
+
+    def _fetch_records(self) -> List[DatasetEvent]:
+        cache = self._get_dataset_cache()
+        if cache is None:
+            return super()._fetch_records()
+
+        # A pinned version never changes, so it only needs to be fetched once.
+        if self._pinned_version is not None:
+            cached = cache.get(self.id, self._pinned_version)
+            if cached is not None:
+                return cast(List[DatasetEvent], list(cached))
+            data = super()._fetch_records()
+            try:
+                cache.set(self.id, self._pinned_version, cast(List[Mapping[str, Any]], data))
+            except OSError as e:
+                eprint(f"Failed to write dataset to the local cache: {e}")
+            return data
+
+        # Otherwise, we bring the latest cached snapshot up to date by only
+        # fetching the rows which changed since its version.
+        try:
+            latest = cache.get_latest(self.id)
+        except (OSError, ValueError) as e:
+            eprint(f"Failed to read dataset from the local cache: {e}")
+            latest = None
+
+        if latest is None:
+            data = super()._fetch_records()
+            if data:
+                version = max(str(record.get(TRANSACTION_ID_FIELD, "0")) for record in data)
+                try:
+                    cache.set_latest(self.id, version, cast(List[Mapping[str, Any]], data))
+                except OSError as e:
+                    eprint(f"Failed to write dataset to the local cache: {e}")
+            return data
+
+        base_version, cached_records = latest
+        delta = cast(List[Dict[str, Any]], self._fetch_delta(base_version))
+        records_by_id = {record[ID_FIELD]: record for record in cached_records}
+        apply_delta(records_by_id, delta)
+
+        # The delta only contains the rows which are live now, so rows deleted
+        # on the server never show up in it. We drop them by comparing against
+        # the ids of the live rows, and record the deletes in the cache.
+        live_ids = self._fetch_live_ids()
+        deletes = [{ID_FIELD: row_id, OBJECT_DELETE_FIELD: True} for row_id in records_by_id if row_id not in live_ids]
+        if not delta and not deletes:
+            return cast(List[DatasetEvent], cached_records)
+        apply_delta(records_by_id, deletes)
+        delta.extend(deletes)
+
+        records = list(records_by_id.values())
+        version = max([base_version] + [str(row.get(TRANSACTION_ID_FIELD, "0")) for row in delta])
+        try:
+            cache.append_latest(self.id, base_version, version, cast(List[Mapping[str, Any]], delta), records)
+        except OSError as e:
+            eprint(f"Failed to write dataset to the local cache: {e}")
+        return cast(List[DatasetEvent], records)
+
+    def _fetch_delta(self, base_version: str) -> List[DatasetEvent]:
+        """Fetches every row written after `base_version`, including deletes, in the order they were written."""
+        btql = {
+            "filter": {
+                "op": "gt",
+                "left": {"op": "ident", "name": [TRANSACTION_ID_FIELD]},
+                "right": {"op": "literal", "value": base_version},
+            },
+        }
+        delta: List[DatasetEvent] = []
+        cursor = None
+        while True:
+            data, cursor = self._fetch_page(cursor, _DATASET_DELTA_PAGE_SIZE, btql=btql)
+            delta.extend(data)
+            if not cursor or not data:
+                break
+        delta.sort(key=lambda row: str(row.get(TRANSACTION_ID_FIELD, "0")))
+        return delta
+
+    def _fetch_live_ids(self) -> Set[str]:
+        """Fetches the ids of every row in the dataset, without the rest of their contents."""
+        btql = {"select": [{"alias": ID_FIELD, "expr": {"op": "ident", "name": [ID_FIELD]}}]}
+        ids: Set[str] = set()
+        cursor = None
+        while True:
+            data, cursor = self._fetch_page(cursor, _DATASET_IDS_PAGE_SIZE, btql=btql)
+            ids.update(row[ID_FIELD] for row in data)
+            if not cursor or not data:
+                break
+        return ids
+
+    def _fetch_paginated(self, batch_size: int, btql: Optional[Dict[str, Any]] = None) -> Iterator[DatasetEvent]:
+        if btql is not None:
+            return super()._fetch_paginated(batch_size, btql=btql)
+        cache = self._get_dataset_cache()
+        cached = (
+            cache.get(self.id, self._pinned_version)
+            if cache is not None and self._pinned_version is not None
+            else None
+        )
+        if cached is None:
+            return super()._fetch_paginated(batch_size)
+        elif self._mutate_record is not None:
+            return (self._mutate_record(cast(DatasetEvent, record)) for record in cached)
+        else:
+            return cast(Iterator[DatasetEvent], cached)
+
     def _validate_event(
         self,
         metadata: Optional[Dict[str, Any]] = None,
@@ -3253,7 +4193,16 @@ class Dataset(ObjectFetcher[DatasetEvent]):
 
     def _create_args(
         self, id, input=None, expected=None, metadata=None, tags=None, output=None, is_merge=False
-    ) -> LazyValue[Dict[str, Any]]:
+    ) -> Dict[str, Any]:
+        args = self._build_args(
+            id=id, input=input, expected=expected, metadata=metadata, tags=tags, output=output, is_merge=is_merge
+        )
+        _check_json_serializable(args)
+        return _deep_copy_event(args)
+
+    def _build_args(
+        self, id, input=None, expected=None, metadata=None, tags=None, output=None, is_merge=False
+    ) -> Dict[str, Any]:
         expected_value = expected if expected is not None else output
 
         args = _populate_args(
@@ -3271,16 +4220,29 @@ class Dataset(ObjectFetcher[DatasetEvent]):
             args[IS_MERGE_FIELD] = True
             args = _filter_none_args(args)  # If merging, then remove None values to prevent null value writes
 
-        _check_json_serializable(args)
-        args = _deep_copy_event(args)
+        return args
+
+    def _log_row(self, row: Dict[str, Any]) -> None:
+        self._apply_local_write(row)
 
         def compute_args() -> Dict[str, Any]:
             return dict(
-                **args,
+                **row,
                 dataset_id=self.id,
             )
 
-        return LazyValue(compute_args, use_mutex=False)
+        _state.global_bg_logger().log(LazyValue(compute_args, use_mutex=False))
+
+    def _log_rows(self, rows: List[Dict[str, Any]]) -> None:
+        for row in rows:
+            self._apply_local_write(row)
+
+        def make_args(row: Dict[str, Any]) -> LazyValue[Dict[str, Any]]:
+            return LazyValue(lambda: dict(**row, dataset_id=self.id), use_mutex=False)
+
+        # Each row is queued separately, so that the queue size bounds the
+        # number of buffered rows.
+        _state.global_bg_logger().log(*[make_args(row) for row in rows])
 
     def insert(
         self,
@@ -3320,11 +4282,46 @@ class Dataset(ObjectFetcher[DatasetEvent]):
             is_merge=False,
         )
 
-        self._clear_cache()  # We may be able to optimize this
         self.new_records += 1
-        _state.global_bg_logger().log(args)
+        self._log_row(args)
         return row_id
 
+    def insert_many(self, records: Iterable[Mapping[str, Any]], batch_size: Optional[int] = None) -> List[str]:
+        """
+        Insert many records to the dataset. This is equivalent to calling `insert` once per record, but much faster for large
+        imports: the records are validated, serialized, and handed to the background logger a chunk at a time rather than one
+        by one. `records` may be a generator, in which case it is consumed lazily, and the call blocks whenever the background
+        logger falls behind, so that arbitrarily large imports run in bounded memory.
+
+        :param records: An iterable of records, each a mapping with the same fields as the arguments to `insert`.
+        :param batch_size: (Optional) the number of records to process at a time. Defaults to the background logger's batch size.
+        :returns: The `id`s of the logged records, in order.
+        """
+        if batch_size is None:
+            batch_size = _state.global_bg_logger().default_batch_size
+
+        row_ids = []
+        for chunk in _chunked(records, batch_size):
+            rows = []
+            for record in chunk:
+                record = dict(record)
+                self._validate_event(
+                    metadata=record.get("metadata"),
+                    expected=record.get("expected"),
+                    output=record.get("output"),
+                    tags=record.get("tags"),
+                )
+                row_id = record.pop("id", None) or str(uuid.uuid4())
+                rows.append(self._build_args(id=row_id, **record))
+
+            _check_json_serializable_rows(rows)
+            rows = [_deep_copy_event(row) for row in rows]
+
+            self.new_records += len(rows)
+            self._log_rows(rows)
+            row_ids.extend(row["id"] for row in rows)
+        return row_ids
+
     def update(
         self,
         id: str,
@@ -3356,8 +4353,7 @@ class Dataset(ObjectFetcher[DatasetEvent]):
             is_merge=True,
         )
 
-        self._clear_cache()  # We may be able to optimize this
-        _state.global_bg_logger().log(args)
+        self._log_row(args)
         return id
 
     def delete(self, id: str) -> str:
@@ -3378,13 +4374,7 @@ class Dataset(ObjectFetcher[DatasetEvent]):
         _check_json_serializable(partial_args)
         partial_args = _deep_copy_event(partial_args)
 
-        def compute_args():
-            return dict(
-                **partial_args,
-                dataset_id=self.id,
-            )
-
-        _state.global_bg_logger().log(LazyValue(compute_args, use_mutex=False))
+        self._log_row(partial_args)
         return id
 
     def summarize(self, summarize_data: bool = True) -> "DatasetSummary":
@@ -3804,6 +4794,43 @@ class Logger(Exportable):
 
         return span.id
 
+    def log_many(
+        self,
+        events: Iterable[Mapping[str, Any]],
+        batch_size: Optional[int] = None,
+        allow_concurrent_with_spans: bool = False,
+    ) -> List[str]:
+        """
+        Log many events. This is equivalent to calling `log` once per event, but much faster for large numbers of events: the
+        events are validated, serialized, and handed to the background logger a chunk at a time rather than one by one.
+        `events` may be a generator, in which case it is consumed lazily, and the call blocks whenever the background logger
+        falls behind.
+
+        :param events: An iterable of events, each a mapping with the same fields as the arguments to `log`.
+        :param batch_size: (Optional) the number of events to process at a time. Defaults to the background logger's batch size.
+        :param allow_concurrent_with_spans: (Optional) in rare cases where you need to log at the top level separately from using spans on the logger elsewhere, set this to True.
+        :returns: The `id`s of the logged events, in order.
+        """
+        if self._called_start_span and not allow_concurrent_with_spans:
+            raise Exception(
+                "Cannot run toplevel `log_many` method while using spans. To log to the span, call `logger.start_span` and then log with `span.log`"
+            )
+
+        row_ids, self.last_start_time = _log_root_spans_many(
+            events,
+            parent_object_type=self._parent_object_type(),
+            parent_object_id=self._lazy_id,
+            default_root_type=SpanTypeAttribute.TASK,
+            start_time=self.last_start_time,
+            batch_size=batch_size,
+            sanitize=lambda event: _validate_log_many_event(event, _LOGGER_LOG_FIELDS),
+        )
+
+        if not self.async_flush:
+            self.flush()
+
+        return row_ids
+
     def log_feedback(
         self,
         id: str,
@@ -3967,6 +4994,18 @@ class ScoreSummary(SerializableDataClass):
     """Number of regressions in the score."""
     diff: Optional[float] = None
     """Difference in score between the current and reference experiment."""
+    stddev: Optional[float] = None
+    """Sample standard deviation of the score. Only computed by evals run with the SDK."""
+    p50: Optional[float] = None
+    """Median score. Only computed by evals run with the SDK."""
+    p90: Optional[float] = None
+    """90th percentile of the score. Only computed by evals run with the SDK."""
+    p99: Optional[float] = None
+    """99th percentile of the score. Only computed by evals run with the SDK."""
+    ci_lower: Optional[float] = None
+    """Lower bound of the 95% confidence interval of the average score. Only computed by evals run with the SDK."""
+    ci_upper: Optional[float] = None
+    """Upper bound of the 95% confidence interval of the average score. Only computed by evals run with the SDK."""
 
     def __str__(self):
         # format with 2 decimal points and pad so that it's exactly 2 characters then 2 decimals
@@ -4006,6 +5045,18 @@ class MetricSummary(SerializableDataClass):
     """Number of regressions in the metric."""
     diff: Optional[float] = None
     """Difference in metric between the current and reference experiment."""
+    stddev: Optional[float] = None
+    """Sample standard deviation of the metric. Only computed by evals run with the SDK."""
+    p50: Optional[float] = None
+    """Median of the metric. Only computed by evals run with the SDK."""
+    p90: Optional[float] = None
+    """90th percentile of the metric. Only computed by evals run with the SDK."""
+    p99: Optional[float] = None
+    """99th percentile of the metric. Only computed by evals run with the SDK."""
+    ci_lower: Optional[float] = None
+    """Lower bound of the 95% confidence interval of the average metric. Only computed by evals run with the SDK."""
+    ci_upper: Optional[float] = None
+    """Upper bound of the 95% confidence interval of the average metric. Only computed by evals run with the SDK."""
 
     def __str__(self):
         number_fmt = "{:d}" if isinstance(self.metric, int) else "{:.2f}"
@@ -4024,6 +5075,36 @@ class MetricSummary(SerializableDataClass):
         )
 
 
+@dataclasses.dataclass
+class ScorerCacheSummary(SerializableDataClass):
+    """Summary of a scorer's lookups in the scorer cache."""
+
+    hits: int
+    """Number of test cases whose scores were read from the cache."""
+    misses: int
+    """Number of test cases which ran the scorer."""
+
+
+@dataclasses.dataclass
+class TrialsSummary(SerializableDataClass):
+    """Summary of the trials run with adaptive trials, which stop early once a test case's scores are stable."""
+
+    test_cases: int
+    """Number of test cases."""
+    trials: int
+    """Total number of trials run across all test cases."""
+    max_trials: int
+    """Maximum number of trials per test case."""
+
+    def __str__(self):
+        average = self.trials / self.test_cases if self.test_cases else 0
+        saved = 1 - self.trials / (self.test_cases * self.max_trials) if self.test_cases else 0
+        return (
+            f"Adaptive trials: {self.trials} trials for {self.test_cases} test cases "
+            f"({average:.2f} per test case, at most {self.max_trials}; {saved:.0%} saved)"
+        )
+
+
 @dataclasses.dataclass
 class ExperimentSummary(SerializableDataClass):
     """Summary of an experiment's scores and metadata."""
@@ -4046,6 +5127,10 @@ class ExperimentSummary(SerializableDataClass):
     """Summary of the experiment's scores."""
     metrics: Dict[str, MetricSummary]
     """Summary of the experiment's metrics."""
+    scorer_cache: Optional[Dict[str, ScorerCacheSummary]] = None
+    """Hits and misses of each scorer in the scorer cache, if the eval used it."""
+    trials: Optional[TrialsSummary] = None
+    """The number of trials run, if the eval used adaptive trials."""
 
     def __str__(self):
         comparison_line = ""
@@ -4057,6 +5142,14 @@ class ExperimentSummary(SerializableDataClass):
             + ("\n\n" if self.scores else "")
             + "\n".join([str(metric) for metric in self.metrics.values()])
             + ("\n\n" if self.metrics else "")
+            + "\n".join(
+                [
+                    f"{name} cache: {cache.hits} hits, {cache.misses} misses"
+                    for name, cache in (self.scorer_cache or {}).items()
+                ]
+            )
+            + ("\n\n" if self.scorer_cache else "")
+            + (f"{self.trials}\n\n" if self.trials else "")
             + (
                 textwrap.dedent(
                     f"""\
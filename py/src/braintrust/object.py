@@ -14,7 +14,8 @@ def ensure_dataset_record(r: DatasetEvent, legacy: bool) -> DatasetEvent:
 
 
 def ensure_legacy_dataset_record(r: DatasetEvent) -> DatasetEvent:
-    if "output" in r:
+    # Records fetched with a projection may include neither field.
+    if "output" in r or "expected" not in r:
         return r
     row = r.copy()
     row["output"] = row.pop("expected")
@@ -22,7 +23,7 @@ def ensure_legacy_dataset_record(r: DatasetEvent) -> DatasetEvent:
 
 
 def ensure_new_dataset_record(r: DatasetEvent) -> DatasetEvent:
-    if "expected" in r:
+    if "expected" in r or "output" not in r:
         return r
     row = r.copy()
     row["expected"] = row.pop("output")
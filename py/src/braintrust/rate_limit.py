@@ -0,0 +1,355 @@
+"""
+This module implements concurrency and rate limits for eval tasks and scorers.
+
+`Evaluator.max_concurrency` bounds the number of test cases which run at once, but the functions within a test case
+often call different services with different limits: e.g. an LLM judge is limited by its provider's requests and
+tokens per minute, while a local scorer is only limited by the CPU. A `RateLimit` decorates the tasks and scorers which
+share a limit, and each call to them waits until the limit allows it:
+
+- `max_concurrency` bounds the number of calls which run at once.
+- `requests_per_second` is enforced with a token bucket which holds up to one second of requests.
+- `tokens_per_minute` is enforced with a token bucket which holds up to one minute of tokens. The tokens used by a call
+  are only known once it finishes, so they are counted from the `tokens` metric logged by its spans (e.g. by a wrapped
+  OpenAI client) and deducted afterwards. Calls wait while the bucket is empty, so a burst of calls can overshoot the
+  limit by the tokens of the calls which are in flight.
+
+Limits with the same name share their budget, so that the evaluators in different files of a `braintrust eval` run
+can share a provider's limits.
+
+`AdaptiveConcurrencyLimit` implements `Evaluator.max_concurrency="auto"`, which adapts the number of test cases in
+flight to the observed latency and rate limit errors instead of requiring a fixed limit to be picked by hand.
+"""
+
+import asyncio
+import math
+import threading
+import time
+import weakref
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from .logger import _span_metrics_accumulator, _SpanMetricsAccumulator
+
+_RATE_LIMITS_ATTR = "_braintrust_rate_limits"
+
+
+class _TokenBucket:
+    """A token bucket which refills at a constant rate, up to its capacity. Its level can go negative."""
+
+    def __init__(self, capacity: float, rate: float):
+        self.capacity = capacity
+        self.rate = rate
+        self._level = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._level = min(self.capacity, self._level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def wait(self, amount: float) -> None:
+        """
+        Waits until the bucket holds at least `amount` tokens, and more than zero, then takes `amount` of them.
+        """
+        while True:
+            with self._lock:
+                self._refill()
+                if self._level >= amount and self._level > 0:
+                    self._level -= amount
+                    return
+                delay = (amount - self._level) / self.rate
+            await asyncio.sleep(max(delay, 0.001))
+
+    def take(self, amount: float) -> None:
+        """Takes tokens from the bucket without waiting, e.g. to deduct tokens which were used after the fact."""
+        with self._lock:
+            self._refill()
+            self._level -= amount
+
+
+class RateLimit:
+    """
+    A concurrency and rate limit, shared by every task and scorer it decorates.
+
+    ```python
+    judge_limit = RateLimit("openai", max_concurrency=8, requests_per_second=5, tokens_per_minute=90_000)
+
+    @judge_limit
+    def factuality(input, output, expected):
+        ...
+
+    Eval(..., scores=[judge_limit(Factuality()), exact_match])
+    ```
+
+    Functions and `Scorer` objects can be decorated with several limits, and wait for all of them.
+    """
+
+    def __init__(
+        self,
+        name: Optional[str] = None,
+        max_concurrency: Optional[int] = None,
+        requests_per_second: Optional[float] = None,
+        tokens_per_minute: Optional[float] = None,
+    ):
+        """
+        Args:
+            name: If specified, limits with the same name share their budget across all evaluators in the process. They
+                must have the same settings.
+            max_concurrency: The maximum number of calls which run at once.
+            requests_per_second: The maximum rate of calls.
+            tokens_per_minute: The maximum rate of tokens used by the calls.
+        """
+        for arg, value in [
+            ("max_concurrency", max_concurrency),
+            ("requests_per_second", requests_per_second),
+            ("tokens_per_minute", tokens_per_minute),
+        ]:
+            if value is not None and value <= 0:
+                raise ValueError(f"{arg} must be positive, got {value}")
+
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.requests_per_second = requests_per_second
+        self.tokens_per_minute = tokens_per_minute
+        self._state = _shared_state(self) if name is not None else _RateLimitState(self)
+
+    def __call__(self, f: Any) -> Any:
+        """Decorates a task or scorer (a function, `Scorer` object, or `Scorer` class) with this limit."""
+        setattr(f, _RATE_LIMITS_ATTR, [*getattr(f, _RATE_LIMITS_ATTR, []), self])
+        return f
+
+    def _settings(self) -> Tuple[Optional[float], ...]:
+        return (self.max_concurrency, self.requests_per_second, self.tokens_per_minute)
+
+    def __repr__(self):
+        settings = ", ".join(
+            f"{k}={v}"
+            for k, v in zip(["max_concurrency", "requests_per_second", "tokens_per_minute"], self._settings())
+            if v is not None
+        )
+        return f"RateLimit({self.name!r}, {settings})"
+
+
+class _RateLimitState:
+    """The budget of a rate limit, which is shared by every `RateLimit` with the same name."""
+
+    def __init__(self, limit: RateLimit):
+        self.limit = limit
+        # Semaphores are bound to an event loop, so each event loop (e.g. of each call to `Eval`) gets its own.
+        self._semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = (
+            weakref.WeakKeyDictionary()
+        )
+        self._requests = (
+            _TokenBucket(max(limit.requests_per_second, 1), limit.requests_per_second)
+            if limit.requests_per_second is not None
+            else None
+        )
+        self._tokens = (
+            _TokenBucket(limit.tokens_per_minute, limit.tokens_per_minute / 60)
+            if limit.tokens_per_minute is not None
+            else None
+        )
+
+    def _semaphore(self) -> Optional[asyncio.Semaphore]:
+        if self.limit.max_concurrency is None:
+            return None
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = self._semaphores[loop] = asyncio.Semaphore(self.limit.max_concurrency)
+        return semaphore
+
+    async def acquire(self) -> None:
+        semaphore = self._semaphore()
+        if semaphore is not None:
+            await semaphore.acquire()
+        try:
+            if self._requests is not None:
+                await self._requests.wait(1)
+            if self._tokens is not None:
+                await self._tokens.wait(0)
+        except BaseException:
+            if semaphore is not None:
+                semaphore.release()
+            raise
+
+    def release(self, tokens: float) -> None:
+        if self._tokens is not None and tokens:
+            self._tokens.take(tokens)
+        semaphore = self._semaphore()
+        if semaphore is not None:
+            semaphore.release()
+
+
+_shared_states: Dict[str, _RateLimitState] = {}
+_shared_states_lock = threading.Lock()
+
+
+def _shared_state(limit: RateLimit) -> _RateLimitState:
+    with _shared_states_lock:
+        state = _shared_states.get(limit.name)
+        if state is None:
+            state = _shared_states[limit.name] = _RateLimitState(limit)
+        elif state.limit._settings() != limit._settings():
+            raise ValueError(f"{limit} has different settings than {state.limit}, which has the same name")
+        return state
+
+
+def rate_limits(f: Any) -> List[RateLimit]:
+    """Returns the rate limits a task or scorer was decorated with."""
+    return getattr(f, _RATE_LIMITS_ATTR, [])
+
+
+def _tokens_used(metrics: Dict[str, float]) -> float:
+    if "tokens" in metrics:
+        return metrics["tokens"]
+    return metrics.get("prompt_tokens", 0) + metrics.get("completion_tokens", 0)
+
+
+@asynccontextmanager
+async def rate_limited(limits: List[RateLimit]) -> AsyncIterator[None]:
+    """
+    Waits until every limit allows a call, and holds them for the duration of the context. The tokens logged by spans
+    in the context are deducted from the limits' token budgets when it exits.
+
+    Args:
+        limits: The limits to wait for, e.g. as returned by `rate_limits`.
+    """
+    if not limits:
+        yield
+        return
+
+    # States are always acquired in the same order, so that calls which wait for the same limits cannot deadlock.
+    states = sorted({id(limit._state): limit._state for limit in limits}.values(), key=id)
+    acquired: List[_RateLimitState] = []
+    accumulator = _SpanMetricsAccumulator(parent=_span_metrics_accumulator.get())
+    token = None
+    try:
+        for state in states:
+            await state.acquire()
+            acquired.append(state)
+        token = _span_metrics_accumulator.set(accumulator)
+        yield
+    finally:
+        if token is not None:
+            _span_metrics_accumulator.reset(token)
+        tokens = _tokens_used(accumulator.metrics)
+        for state in acquired:
+            state.release(tokens)
+
+
+def is_rate_limit_error(e: BaseException) -> bool:
+    """
+    Returns whether an exception, or one of its causes, indicates that a rate limit was hit, e.g. an HTTP 429 response
+    from an LLM provider's client.
+    """
+    seen = set()
+    while e is not None and id(e) not in seen:
+        seen.add(id(e))
+        if any(getattr(e, attr, None) == 429 for attr in ("status_code", "status", "http_status")):
+            return True
+        if getattr(getattr(e, "response", None), "status_code", None) == 429:
+            return True
+        if "ratelimit" in type(e).__name__.lower().replace("_", ""):
+            return True
+        e = e.__cause__ or e.__context__
+    return False
+
+
+class AdaptiveConcurrencyLimit:
+    """
+    A concurrency limit which adapts to the observed latency and rate limit errors, with additive increase and
+    multiplicative decrease (AIMD), as in TCP congestion control.
+
+    The limit grows by one for every `limit` calls which complete, i.e. by about one per round of calls, as long as
+    their latency stays within `latency_tolerance` times its long-run average. It is cut by `backoff` when a call hits
+    a rate limit, and by `latency_backoff` when the latency rises above the tolerance. Cuts happen at most once per
+    average latency, so that a burst of errors from the same round of calls only counts once.
+    """
+
+    def __init__(
+        self,
+        initial: int = 4,
+        min_limit: int = 1,
+        max_limit: int = 500,
+        latency_tolerance: float = 2.0,
+        backoff: float = 0.5,
+        latency_backoff: float = 0.9,
+    ):
+        """
+        Args:
+            initial: The initial limit.
+            min_limit: The minimum limit.
+            max_limit: The maximum limit.
+            latency_tolerance: How many times its long-run average the recent latency can be before the limit is cut.
+            backoff: The factor the limit is cut by when a call hits a rate limit.
+            latency_backoff: The factor the limit is cut by when the latency rises.
+        """
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_tolerance = latency_tolerance
+        self.backoff = backoff
+        self.latency_backoff = latency_backoff
+
+        self._in_flight = 0
+        self._condition: Optional[asyncio.Condition] = None
+        self._condition_loop: Optional[asyncio.AbstractEventLoop] = None
+        # Exponentially weighted moving averages of the latency, over the last few calls and over the long run.
+        self._recent_latency: Optional[float] = None
+        self._average_latency: Optional[float] = None
+        self._last_cut = -math.inf
+
+    @property
+    def current(self) -> int:
+        """The number of calls which are currently allowed to run at once."""
+        return max(self.min_limit, int(self.limit))
+
+    def _get_condition(self) -> asyncio.Condition:
+        # Conditions are bound to an event loop, so a new one is created if the limit is used from another loop.
+        loop = asyncio.get_running_loop()
+        if self._condition is None or self._condition_loop is not loop:
+            self._condition = asyncio.Condition()
+            self._condition_loop = loop
+        return self._condition
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """Waits until the limit allows another call, and holds a slot for the duration of the context."""
+        condition = self._get_condition()
+        async with condition:
+            await condition.wait_for(lambda: self._in_flight < self.current)
+            self._in_flight += 1
+        start = time.monotonic()
+        try:
+            yield
+            self._on_complete(time.monotonic() - start)
+        finally:
+            async with condition:
+                self._in_flight -= 1
+                # The limit may have grown, so every waiter checks whether it can run.
+                condition.notify_all()
+
+    def on_rate_limit(self) -> None:
+        """Cuts the limit after a call hits a rate limit."""
+        self._cut(self.backoff)
+
+    def _on_complete(self, latency: float) -> None:
+        if self._average_latency is None:
+            self._recent_latency = self._average_latency = latency
+        else:
+            self._recent_latency = 0.8 * self._recent_latency + 0.2 * latency
+            self._average_latency = 0.98 * self._average_latency + 0.02 * latency
+
+        if self._recent_latency > self.latency_tolerance * self._average_latency:
+            self._cut(self.latency_backoff)
+        else:
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+
+    def _cut(self, factor: float) -> None:
+        now = time.monotonic()
+        if now - self._last_cut < (self._recent_latency or 0):
+            return
+        self._last_cut = now
+        self.limit = max(self.min_limit, self.limit * factor)
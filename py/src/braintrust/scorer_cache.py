@@ -0,0 +1,176 @@
+"""
+This module implements a persistent cache of scorer results.
+
+Scorers are often expensive (e.g. LLM-based), and re-running an eval re-runs every scorer on the same arguments, even
+when only one scorer changed. The `ScorerCache` stores the scores returned by each scorer in a `DiskCache`, keyed by
+the scorer's name and version and a stable hash of its arguments, so that repeated runs only pay for the scorers and
+test cases which changed.
+
+A scorer's version defaults to a hash of its source code and, for `Scorer` objects, their attributes (e.g. the model
+or prompt of an LLM-based scorer), so that editing a scorer invalidates its cached results. Only attributes which are
+JSON serializable are part of the version: others, like API clients, have no stable representation across runs. Scorers
+can declare an explicit version with a `scorer_version` attribute instead, e.g. when their behavior depends on code
+outside of their own source or on attributes which are not JSON serializable.
+
+Calls whose arguments are not JSON serializable are not cached, since they have no stable key.
+"""
+
+import hashlib
+import inspect
+import json
+from typing import Any, Dict, List, Mapping, Optional
+
+from braintrust_core.score import Score
+
+from .logger import ScorerCacheSummary
+from .prompt_cache import disk_cache
+
+
+def stable_dumps(value: Any) -> str:
+    """
+    Serializes a value as canonical JSON, with sorted keys, so that equal values always serialize the same way.
+
+    Raises:
+        TypeError: If the value is not JSON serializable.
+        ValueError: If the value contains a circular reference.
+    """
+    return json.dumps(value, sort_keys=True, separators=(",", ":"))
+
+
+def _stable_attributes(obj: Any) -> Dict[str, Any]:
+    # Attributes which are not JSON serializable (e.g. clients) would be serialized by their `repr`, which usually
+    # includes their address and so changes on every run.
+    ret = {}
+    for name, value in getattr(obj, "__dict__", {}).items():
+        try:
+            stable_dumps(value)
+        except (TypeError, ValueError):
+            continue
+        ret[name] = value
+    return ret
+
+
+def code_version(obj: Any, version_attr: str) -> str:
+    """
+    Returns the version of a function or object, which changes whenever its code does.
+
+    Args:
+        obj: A function or object.
+        version_attr: The name of an attribute which declares an explicit version.
+
+    Returns:
+        The object's `version_attr` attribute if it has one, or else a hash of its source code (and its JSON
+        serializable attributes, for objects which are not functions).
+    """
+    explicit = getattr(obj, version_attr, None)
+    if explicit is not None:
+        return str(explicit)
+
+    is_function = inspect.isfunction(obj) or inspect.ismethod(obj)
+    target = obj if is_function else type(obj)
+    h = hashlib.sha256()
+    h.update(f"{getattr(target, '__module__', '')}.{getattr(target, '__qualname__', '')}".encode("utf-8"))
+    try:
+        h.update(inspect.getsource(target).encode("utf-8"))
+    except (OSError, TypeError):
+        # The source is not available (e.g. for functions defined in a REPL), so fall back to the bytecode.
+        code = getattr(target, "__code__", None)
+        if code is not None:
+            h.update(code.co_code)
+    if not is_function:
+        h.update(stable_dumps(_stable_attributes(obj)).encode("utf-8"))
+    return h.hexdigest()
+
+
+def scorer_version(scorer: Any) -> str:
+    """
+    Returns the version of a scorer, which is part of the cache key of its results.
+
+    Args:
+        scorer: A scorer function or `Scorer` object.
+
+    Returns:
+        The scorer's `scorer_version` attribute if it has one, or else a hash of its source code (and its JSON
+        serializable attributes, for objects).
+    """
+    return code_version(scorer, "scorer_version")
+
+
+def create_cache_key(scorer_name: str, version: str, args: Mapping[str, Any]) -> Optional[str]:
+    """
+    Creates the cache key of a scorer's results on the given arguments.
+
+    The arguments are serialized as canonical JSON (with sorted keys), so equal arguments always produce the same key.
+    The result is hex-encoded so it can be used as a filename by the disk cache.
+
+    Returns:
+        The cache key, or None if the arguments are not JSON serializable, in which case the call should not be cached.
+    """
+    try:
+        serialized_args = stable_dumps(args)
+    except (TypeError, ValueError):
+        return None
+    h = hashlib.sha256()
+    for part in (scorer_name, version, serialized_args):
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+class ScorerCache:
+    """
+    A persistent cache of scorer results, which counts its hits and misses per scorer.
+
+    Errors reading or writing the disk cache are treated as misses, since they only cost a redundant scorer call.
+    """
+
+    def __init__(self, disk_cache: disk_cache.DiskCache[List[Dict[str, Any]]]):
+        """
+        Initialize the cache.
+
+        Args:
+            disk_cache: The disk cache to store results in. Values are lists of `Score` fields (name, score, and
+                metadata).
+        """
+        self.disk_cache = disk_cache
+        self.hits: Dict[str, int] = {}
+        self.misses: Dict[str, int] = {}
+
+    def get(self, scorer_name: str, key: str) -> Optional[List[Score]]:
+        """
+        Retrieves the cached results of a scorer, and counts the lookup as a hit or miss.
+
+        Args:
+            scorer_name: The name of the scorer, for counting hits and misses.
+            key: The cache key, as returned by `create_cache_key`.
+
+        Returns:
+            The cached scores, or None if they are not cached.
+        """
+        try:
+            entries = self.disk_cache.get(key)
+        except (KeyError, RuntimeError):
+            self.misses[scorer_name] = self.misses.get(scorer_name, 0) + 1
+            return None
+        self.hits[scorer_name] = self.hits.get(scorer_name, 0) + 1
+        return [Score(name=e["name"], score=e["score"], metadata=e["metadata"]) for e in entries]
+
+    def set(self, key: str, scores: List[Score]) -> None:
+        """
+        Stores the results of a scorer.
+
+        Args:
+            key: The cache key, as returned by `create_cache_key`.
+            scores: The scores returned by the scorer.
+        """
+        try:
+            self.disk_cache.set(key, [dict(name=s.name, score=s.score, metadata=s.metadata) for s in scores])
+        except RuntimeError:
+            pass
+
+    def summary(self) -> Dict[str, ScorerCacheSummary]:
+        """Returns the number of hits and misses of each scorer which was looked up."""
+        return {
+            name: ScorerCacheSummary(hits=self.hits.get(name, 0), misses=self.misses.get(name, 0))
+            for name in {**self.hits, **self.misses}
+        }
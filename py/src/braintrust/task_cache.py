@@ -0,0 +1,142 @@
+"""
+This module implements record/replay stores for the outputs of eval tasks.
+
+Tasks are often the most expensive part of an eval (e.g. LLM calls), but when only the scorers change, their outputs
+do not. A task output store maps each test case, identified by its input and trial index, to the task's output and the
+metadata it logged, so that the eval can score the stored output instead of running the task again. Test cases are
+identified by the same canonical hash of their contents (see `input_key`) as elsewhere in the eval framework.
+
+Outputs can be replayed from two places:
+
+- `LocalTaskOutputStore` records outputs in a `DiskCache`, keyed by a fingerprint of the task's code and the test
+  case's input, expected output and metadata, so that changing the task or the test case invalidates its recorded
+  outputs.
+- `ExperimentTaskOutputStore` replays the outputs logged by a prior experiment, matching test cases by input only,
+  since the logged metadata includes whatever the task added to it. It never records outputs.
+
+Test cases without a stored output run the task as usual.
+"""
+
+import hashlib
+from typing import Any, Dict, Iterable, List, Mapping, Optional
+
+from .local_summary import input_key
+from .prompt_cache import disk_cache
+from .scorer_cache import code_version
+
+
+def task_fingerprint(task: Any) -> str:
+    """
+    Returns the fingerprint of a task, which is part of the key of its recorded outputs.
+
+    Args:
+        task: The task function.
+
+    Returns:
+        The task's `task_version` attribute if it has one, or else a hash of its source code.
+    """
+    return code_version(task, "task_version")
+
+
+class LocalTaskOutputStore:
+    """
+    Records task outputs on disk, and replays them on later runs of the same task.
+
+    Errors reading or writing the disk cache are treated as misses, since they only cost a redundant task call.
+    """
+
+    def __init__(self, disk_cache: disk_cache.DiskCache[Dict[str, Any]], fingerprint: str):
+        """
+        Initialize the store.
+
+        Args:
+            disk_cache: The disk cache to store outputs in. Values are dicts with the task's `output` and `metadata`.
+            fingerprint: The fingerprint of the task, as returned by `task_fingerprint`.
+        """
+        self.disk_cache = disk_cache
+        self.fingerprint = fingerprint
+
+    def _key(self, datum: Any, trial_index: int) -> str:
+        case_key = input_key([datum.input, datum.expected, datum.metadata]).hex()
+        h = hashlib.sha256()
+        for part in (self.fingerprint, case_key, str(trial_index)):
+            h.update(part.encode("utf-8"))
+            h.update(b"\0")
+        return h.hexdigest()
+
+    def get(self, datum: Any, trial_index: int) -> Optional[Dict[str, Any]]:
+        """
+        Retrieves the stored output of a test case.
+
+        Args:
+            datum: The test case (an `EvalCase`). Its input, expected output and metadata are part of the key.
+            trial_index: The index of the trial, so that each trial replays its own output.
+
+        Returns:
+            A dict with the task's `output` and `metadata`, or None if there is no stored output.
+        """
+        try:
+            return self.disk_cache.get(self._key(datum, trial_index))
+        except (KeyError, RuntimeError):
+            return None
+
+    def set(self, datum: Any, trial_index: int, output: Any, metadata: Mapping[str, Any]) -> None:
+        """
+        Records the output of a test case. Outputs which are not JSON serializable are not recorded.
+
+        Args:
+            datum: The test case (an `EvalCase`).
+            trial_index: The index of the trial.
+            output: The task's output.
+            metadata: The test case's metadata after running the task.
+        """
+        try:
+            self.disk_cache.set(self._key(datum, trial_index), dict(output=output, metadata=dict(metadata)))
+        except RuntimeError:
+            pass
+
+
+class ExperimentTaskOutputStore:
+    """Replays the task outputs logged by a prior experiment, matching test cases by input."""
+
+    def __init__(self):
+        self._entries: Dict[bytes, List[Dict[str, Any]]] = {}
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Mapping[str, Any]]) -> "ExperimentTaskOutputStore":
+        """
+        Builds the store from fetched experiment rows. Only root spans, which hold the test cases, are used, and test
+        cases which failed are skipped so that they run again.
+
+        Args:
+            rows: The experiment's rows, with at least the `input`, `output`, `metadata`, `error` and `span_parents`
+                fields.
+        """
+        ret = cls()
+        for row in rows:
+            if row.get("span_parents") or row.get("error"):
+                continue
+            # Scorer errors are added to the metadata after the task runs, so they are not part of its output.
+            metadata = {k: v for k, v in (row.get("metadata") or {}).items() if k != "scorer_errors"}
+            ret._entries.setdefault(input_key(row.get("input")), []).append(
+                dict(output=row.get("output"), metadata=metadata)
+            )
+        return ret
+
+    def get(self, datum: Any, trial_index: int) -> Optional[Dict[str, Any]]:
+        """
+        Retrieves the logged output of a test case. If the experiment ran the test case several times, each trial
+        replays a different run, as long as there are enough of them.
+
+        Args:
+            datum: The test case (an `EvalCase`), which is matched by its input.
+            trial_index: The index of the trial.
+
+        Returns:
+            A dict with the task's `output` and `metadata`, or None if the experiment has no output for this trial.
+        """
+        entries = self._entries.get(input_key(datum.input), [])
+        return entries[trial_index] if trial_index < len(entries) else None
+
+    def set(self, datum: Any, trial_index: int, output: Any, metadata: Mapping[str, Any]) -> None:
+        """Does nothing, since a prior experiment's outputs are never updated."""
@@ -0,0 +1,68 @@
+import hashlib
+import io
+import shutil
+import tempfile
+import unittest
+
+from braintrust import attachment_cache
+from braintrust.prompt_cache import disk_cache, lru_cache
+
+
+class TestAttachmentUploadRegistry(unittest.TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.registry = self._make_registry()
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+    def _make_registry(self):
+        return attachment_cache.AttachmentUploadRegistry(
+            memory_cache=lru_cache.LRUCache(max_size=10),
+            disk_cache=disk_cache.DiskCache(cache_dir=self.cache_dir, max_size=10),
+        )
+
+    def test_content_digest_is_streamed(self):
+        data = b"0123456789" * 1000
+        digest = attachment_cache.compute_content_digest(io.BytesIO(data), chunk_size=7)
+        self.assertEqual(digest, hashlib.sha256(data).hexdigest())
+
+    def test_registry_key_depends_on_metadata(self):
+        digest = hashlib.sha256(b"data").hexdigest()
+        key = attachment_cache.create_registry_key("org", digest, "a.png", "image/png")
+        self.assertEqual(key, attachment_cache.create_registry_key("org", digest, "a.png", "image/png"))
+        self.assertNotEqual(key, attachment_cache.create_registry_key("other-org", digest, "a.png", "image/png"))
+        self.assertNotEqual(key, attachment_cache.create_registry_key("org", digest, "b.png", "image/png"))
+        self.assertNotEqual(key, attachment_cache.create_registry_key("org", digest, "a.png", "image/jpeg"))
+
+    def test_identical_contents_share_a_key(self):
+        self.assertEqual(self.registry.resolve_key("digest", "key-1"), "key-1")
+        self.assertEqual(self.registry.resolve_key("digest", "key-2"), "key-1")
+        self.assertEqual(self.registry.resolve_key("other-digest", "key-3"), "key-3")
+
+    def test_mark_uploaded(self):
+        self.registry.resolve_key("digest", "key-1")
+        self.assertFalse(self.registry.is_uploaded("digest"))
+        self.registry.mark_uploaded("digest", "key-1")
+        self.assertTrue(self.registry.is_uploaded("digest"))
+
+    def test_only_uploaded_keys_are_shared_across_processes(self):
+        self.registry.resolve_key("pending", "key-1")
+        self.registry.resolve_key("digest", "key-2")
+        self.registry.mark_uploaded("digest", "key-2")
+
+        registry = self._make_registry()
+        self.assertTrue(registry.is_uploaded("digest"))
+        self.assertEqual(registry.resolve_key("digest", "key-3"), "key-2")
+        self.assertFalse(registry.is_uploaded("pending"))
+        self.assertEqual(registry.resolve_key("pending", "key-4"), "key-4")
+
+    def test_works_without_disk_cache(self):
+        registry = attachment_cache.AttachmentUploadRegistry(memory_cache=lru_cache.LRUCache())
+        self.assertEqual(registry.resolve_key("digest", "key-1"), "key-1")
+        registry.mark_uploaded("digest", "key-1")
+        self.assertTrue(registry.is_uploaded("digest"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,49 @@
+import json
+import unittest
+
+from .bt_json import iter_json_object_array
+
+
+def _chunks(data: bytes, size: int):
+    return [data[i : i + size] for i in range(0, len(data), size)]
+
+
+class TestIterJsonObjectArray(unittest.TestCase):
+    def test_streams_array_elements(self):
+        doc = {
+            "before": {"nested": [1, 2]},
+            "events": [{"id": i, "text": "é" * i} for i in range(20)] + [12345, -1.5e3, None, "z", []],
+            "cursor": "abc",
+        }
+        data = json.dumps(doc, ensure_ascii=False).encode("utf-8")
+        # Chunk boundaries fall inside multi-byte characters, strings, and numbers.
+        for size in [1, 2, 3, 7, len(data)]:
+            fields = {}
+            self.assertEqual(list(iter_json_object_array(_chunks(data, size), "events", fields)), doc["events"])
+            self.assertEqual(fields, {"before": {"nested": [1, 2]}, "cursor": "abc"})
+
+    def test_yields_before_the_stream_ends(self):
+        def chunks():
+            yield b'{"data": [{"id": 1}, '
+            raise AssertionError("read past the first record")
+
+        self.assertEqual(next(iter_json_object_array(chunks(), "data", {})), {"id": 1})
+
+    def test_empty_and_missing_arrays(self):
+        fields = {}
+        self.assertEqual(list(iter_json_object_array([b' { "data" : [ ] , "cursor": null } '], "data", fields)), [])
+        self.assertEqual(fields, {"cursor": None})
+        self.assertEqual(list(iter_json_object_array([b"{}"], "data", {})), [])
+
+        fields = {}
+        self.assertEqual(list(iter_json_object_array([b'{"data": null}'], "data", fields)), [])
+        self.assertEqual(fields, {"data": None})
+
+    def test_invalid_json(self):
+        for data in [b'{"data": [1, 2', b'{"data": [1 2]}', b"[1, 2]", b'{"data": [tru]}']:
+            with self.assertRaises(ValueError):
+                list(iter_json_object_array([data], "data", {}))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,174 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from braintrust import LazyValue, dataset_cache, logger
+from braintrust.dataset_cache import DatasetCache, apply_delta
+from braintrust.file_cache import FileCache
+from braintrust.logger import Dataset, ObjectFetcher, ObjectMetadata, ProjectDatasetMetadata
+
+
+class TestDatasetCache(unittest.TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.cache = DatasetCache(FileCache(cache_dir=self.cache_dir))
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+    def test_store_and_retrieve(self):
+        records = [{"id": "a", "input": "hello"}, {"id": "b", "input": {"nested": [1, 2]}}]
+        self.assertIsNone(self.cache.get("dataset", "1"))
+        self.cache.set("dataset", "1", records)
+        self.assertEqual(list(self.cache.get("dataset", "1")), records)
+        self.assertIsNone(self.cache.get("dataset", "2"))
+        self.assertIsNone(self.cache.get("other-dataset", "1"))
+
+    def test_empty_snapshot(self):
+        self.cache.set("dataset", "1", [])
+        self.assertEqual(list(self.cache.get("dataset", "1")), [])
+
+    def test_apply_delta(self):
+        records = {"a": {"id": "a", "input": {"x": 1}}, "b": {"id": "b", "input": 2}}
+        apply_delta(
+            records,
+            [
+                {"id": "a", "input": {"y": 2}, "_is_merge": True},
+                {"id": "b", "_object_delete": True},
+                {"id": "c", "input": 3},
+            ],
+        )
+        self.assertEqual(records, {"a": {"id": "a", "input": {"x": 1, "y": 2}}, "c": {"id": "c", "input": 3}})
+
+    def test_latest_snapshot_segments(self):
+        self.assertIsNone(self.cache.get_latest("dataset"))
+        self.cache.set_latest("dataset", "1", [{"id": "a", "v": 1}, {"id": "b", "v": 1}])
+        self.cache.append_latest("dataset", "1", "2", [{"id": "a", "v": 2}])
+        self.cache.append_latest("dataset", "2", "3", [{"id": "b", "_object_delete": True}, {"id": "c", "v": 3}])
+        self.assertEqual(self.cache.get_latest("dataset"), ("3", [{"id": "a", "v": 2}, {"id": "c", "v": 3}]))
+        # The latest snapshot can also be read by its version.
+        self.assertEqual(list(self.cache.get("dataset", "3")), [{"id": "a", "v": 2}, {"id": "c", "v": 3}])
+        self.assertIsNone(self.cache.get("dataset", "2"))
+
+    def test_stale_delta_is_dropped(self):
+        self.cache.set_latest("dataset", "2", [{"id": "a", "v": 2}])
+        self.cache.append_latest("dataset", "1", "3", [{"id": "a", "v": 3}])
+        self.assertEqual(self.cache.get_latest("dataset"), ("2", [{"id": "a", "v": 2}]))
+
+    def test_segments_are_compacted(self):
+        self.cache.set_latest("dataset", "0", [{"id": "a", "v": 0}])
+        for i in range(1, dataset_cache.MAX_DELTA_SEGMENTS + 3):
+            records = [{"id": "a", "v": i}]
+            self.cache.append_latest("dataset", str(i - 1), str(i), records, records)
+            manifest = self.cache._read_manifest("dataset")
+            self.assertLessEqual(len(manifest["segments"]), dataset_cache.MAX_DELTA_SEGMENTS + 1)
+        self.assertEqual(self.cache.get_latest("dataset"), (str(i), [{"id": "a", "v": i}]))
+
+    def test_evicted_segment_invalidates_snapshot(self):
+        self.cache.set_latest("dataset", "1", [{"id": "a", "v": 1}])
+        self.cache.append_latest("dataset", "1", "2", [{"id": "a", "v": 2}])
+        segment = self.cache._read_manifest("dataset")["segments"][0]
+        os.unlink(self.cache.cache.get_path(segment))
+        self.assertIsNone(self.cache.get_latest("dataset"))
+
+
+class TestDatasetCaching(unittest.TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.orig_cache = logger._state._dataset_cache
+        self.cache = DatasetCache(FileCache(cache_dir=self.cache_dir))
+        logger._state._dataset_cache = LazyValue(lambda: self.cache, use_mutex=False)
+
+    def tearDown(self):
+        logger._state._dataset_cache = self.orig_cache
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+    def _make_dataset(self, version=None):
+        metadata = ProjectDatasetMetadata(
+            project=ObjectMetadata(id="project-id", name="project", full_info={}),
+            dataset=ObjectMetadata(id="dataset-id", name="dataset", full_info={}),
+        )
+        return Dataset(lazy_metadata=LazyValue(lambda: metadata, use_mutex=False), version=version, legacy=False)
+
+    def test_pinned_version_is_only_fetched_once(self):
+        rows = [{"id": "a", "input": 1, "expected": 2, "_xact_id": "5"}]
+        with mock.patch.object(ObjectFetcher, "_fetch_page", return_value=(rows, None)) as fetch_page:
+            first = list(self._make_dataset(version=5))
+            second = list(self._make_dataset(version=5))
+            paginated = list(self._make_dataset(version=5).fetch(batch_size=10))
+        self.assertEqual(fetch_page.call_count, 1)
+        self.assertEqual([r["id"] for r in first], ["a"])
+        self.assertEqual(second, first)
+        self.assertEqual(paginated, first)
+
+    def test_latest_version_is_cached_under_its_version(self):
+        rows = [
+            {"id": "a", "input": 1, "expected": 1, "_xact_id": "3"},
+            {"id": "b", "input": 2, "expected": 2, "_xact_id": "7"},
+        ]
+        with mock.patch.object(ObjectFetcher, "_fetch_page", return_value=(rows, None)) as fetch_page:
+            self.assertEqual(len(list(self._make_dataset())), 2)
+            self.assertEqual(len(list(self._make_dataset(version=7))), 2)
+        self.assertEqual(fetch_page.call_count, 1)
+
+    def test_unpinned_dataset_syncs_incrementally(self):
+        server_rows = [
+            {"id": "a", "input": 1, "expected": 1, "_xact_id": "01"},
+            {"id": "b", "input": 2, "expected": 2, "_xact_id": "02"},
+        ]
+        requests = []
+
+        def fetch_page(self, cursor=None, limit=None, btql=None):
+            if btql and "filter" not in btql:
+                live_rows = {}
+                apply_delta(live_rows, [dict(r) for r in server_rows])
+                return [{"id": row_id} for row_id in live_rows], None
+            base_version = btql["filter"]["right"]["value"] if btql else ""
+            rows = [r for r in server_rows if r["_xact_id"] > base_version]
+            requests.append((base_version, len(rows)))
+            return [dict(r) for r in rows], None
+
+        with mock.patch.object(ObjectFetcher, "_fetch_page", fetch_page):
+            self.assertEqual(sorted(r["id"] for r in self._make_dataset()), ["a", "b"])
+
+            server_rows.append({"id": "a", "input": 10, "expected": 10, "_xact_id": "03"})
+            server_rows.append({"id": "b", "_object_delete": True, "_xact_id": "04"})
+            server_rows.append({"id": "c", "input": 3, "expected": 3, "_xact_id": "05"})
+            records = {r["id"]: r for r in self._make_dataset()}
+            self.assertEqual(sorted(records), ["a", "c"])
+            self.assertEqual(records["a"]["input"], 10)
+
+            # Nothing changed since the last sync.
+            self.assertEqual(sorted(r["id"] for r in self._make_dataset()), ["a", "c"])
+
+        self.assertEqual(requests, [("", 2), ("02", 3), ("05", 0)])
+
+    def test_rows_deleted_on_the_server_are_dropped(self):
+        # Like the real server, deleted rows are simply no longer returned.
+        server_rows = {
+            "a": {"id": "a", "input": 1, "expected": 1, "_xact_id": "01"},
+            "b": {"id": "b", "input": 2, "expected": 2, "_xact_id": "02"},
+        }
+
+        def fetch_page(self, cursor=None, limit=None, btql=None):
+            if btql and "filter" not in btql:
+                return [{"id": row_id} for row_id in server_rows], None
+            base_version = btql["filter"]["right"]["value"] if btql else ""
+            return [dict(r) for r in server_rows.values() if r["_xact_id"] > base_version], None
+
+        with mock.patch.object(ObjectFetcher, "_fetch_page", fetch_page):
+            self.assertEqual(sorted(r["id"] for r in self._make_dataset()), ["a", "b"])
+
+            del server_rows["b"]
+            self.assertEqual(sorted(r["id"] for r in self._make_dataset()), ["a"])
+
+            # The delete is recorded in the cache, and later syncs see new rows.
+            self.assertEqual([r["id"] for r in self.cache.get_latest("dataset-id")[1]], ["a"])
+            server_rows["c"] = {"id": "c", "input": 3, "expected": 3, "_xact_id": "03"}
+            self.assertEqual(sorted(r["id"] for r in self._make_dataset()), ["a", "c"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from braintrust import file_cache
+
+
+class TestFileCache(unittest.TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.cache = file_cache.FileCache(cache_dir=self.cache_dir, max_size=10)
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+    def _put(self, key, data):
+        with self.cache.writer(key) as f:
+            f.write(data)
+
+    def _read(self, key):
+        path = self.cache.get_path(key)
+        if path is None:
+            return None
+        with open(path, "rb") as f:
+            return f.read()
+
+    def test_store_and_retrieve(self):
+        self.assertIsNone(self.cache.get_path("key"))
+        self._put("key", b"data")
+        self.assertEqual(self._read("key"), b"data")
+
+    def test_failed_write_is_not_visible(self):
+        with self.assertRaises(ValueError):
+            with self.cache.writer("key") as f:
+                f.write(b"partial")
+                raise ValueError("download failed")
+        self.assertIsNone(self.cache.get_path("key"))
+        self.assertEqual(os.listdir(self.cache_dir), [])
+
+    def test_evicts_oldest_entries_by_size(self):
+        self._put("a", b"1234")
+        self._put("b", b"1234")
+        os.utime(self.cache._get_entry_path("a"), (0, 0))
+        self._put("c", b"1234")
+        self.assertIsNone(self.cache.get_path("a"))
+        self.assertEqual(self._read("b"), b"1234")
+        self.assertEqual(self._read("c"), b"1234")
+
+    def test_keeps_new_entry_larger_than_max_size(self):
+        self._put("a", b"1234")
+        self._put("big", b"0123456789abcdef")
+        self.assertIsNone(self.cache.get_path("a"))
+        self.assertEqual(self._read("big"), b"0123456789abcdef")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,651 @@
+import asyncio
+import gc
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import textwrap
+import time
+import unittest
+from unittest import mock
+
+from braintrust_core.score import Score, Scorer
+
+from .framework import (
+    AdaptiveTrials,
+    BatchScorer,
+    EvalCase,
+    EvalCheckpoint,
+    EvalResult,
+    EvalResults,
+    EvalThreadPoolSingleton,
+    Evaluator,
+    _run_in_process,
+    batch_scorer,
+    process_executor,
+    run_evaluator,
+)
+from .local_summary import merge_shard_summaries
+from .logger import ParentSpanIds, SpanImpl, _internal_with_custom_background_logger, current_span
+from .prompt_cache.disk_cache import DiskCache
+from .resource_manager import ResourceManager
+from .scorer_cache import ScorerCache, create_cache_key, scorer_version
+from .span_identifier_v3 import SpanObjectTypeV3
+from .task_cache import ExperimentTaskOutputStore
+from .util import LazyValue
+
+
+def _make_evaluator(data, task, **kwargs):
+    return Evaluator(
+        project_name="test-project",
+        eval_name="test",
+        data=data,
+        task=task,
+        scores=[lambda input, output, expected: float(output == expected)],
+        experiment_name=None,
+        metadata=None,
+        **kwargs,
+    )
+
+
+def _in_worker():
+    return float(multiprocessing.parent_process() is not None)
+
+
+def _double_in_worker(input):
+    return input * 2, _in_worker()
+
+
+@process_executor
+def _in_worker_scorer(input, output, expected):
+    return Score(name="scorer_in_worker", score=_in_worker())
+
+
+class _InWorkerScorer(Scorer):
+    def _run_eval_sync(self, output, expected=None, **kwargs):
+        return Score(name="class_scorer_in_worker", score=_in_worker())
+
+
+class TestRunEvaluator(unittest.TestCase):
+    def test_reads_data_as_tasks_finish(self):
+        max_concurrency = 2
+        read = 0
+        in_flight = 0
+        max_in_flight = 0
+
+        def data():
+            nonlocal read
+            for i in range(20):
+                read += 1
+                yield {"input": i, "expected": i * 2}
+
+        async def task(input):
+            nonlocal in_flight, max_in_flight
+            in_flight += 1
+            max_in_flight = max(max_in_flight, in_flight)
+            # Later inputs finish first, to check that results are still returned in order.
+            await asyncio.sleep(0.001 * (20 - input))
+            in_flight -= 1
+            return input * 2
+
+        def check_window():
+            # The data is read at most one window (twice the max concurrency) ahead of the finished tasks.
+            self.assertLessEqual(read, len(finished) + 2 * max_concurrency + 1)
+
+        finished = []
+
+        async def tracked_task(input):
+            check_window()
+            ret = await task(input)
+            finished.append(input)
+            return ret
+
+        evaluator = _make_evaluator(data, tracked_task, max_concurrency=max_concurrency, trial_count=1)
+        result = asyncio.run(run_evaluator(None, evaluator, None, []))
+
+        self.assertEqual([r.input for r in result.results], list(range(20)))
+        self.assertLessEqual(max_in_flight, max_concurrency)
+        self.assertEqual(result.summary.scores["scorer_0"].score, 1)
+
+    def test_slow_test_case_does_not_block_others(self):
+        head_finished = False
+        started_before_head_finished = 0
+
+        async def task(input):
+            nonlocal head_finished, started_before_head_finished
+            if input == 0:
+                await asyncio.sleep(0.5)
+                head_finished = True
+            else:
+                started_before_head_finished += not head_finished
+                await asyncio.sleep(0.001)
+            return input * 2
+
+        evaluator = _make_evaluator(
+            [{"input": i, "expected": i * 2} for i in range(20)], task, max_concurrency=2, trial_count=1
+        )
+        result = asyncio.run(run_evaluator(None, evaluator, None, []))
+
+        # The other test cases run in the free slot while the first one is still running, and results stay in order.
+        self.assertEqual(started_before_head_finished, 19)
+        self.assertEqual([r.input for r in result.results], list(range(20)))
+
+    def test_trials(self):
+        evaluator = _make_evaluator(
+            [{"input": i, "expected": i} for i in range(3)], lambda input: input, max_concurrency=1, trial_count=3
+        )
+        result = asyncio.run(run_evaluator(None, evaluator, None, []))
+        self.assertEqual([r.input for r in result.results], [0, 0, 0, 1, 1, 1, 2, 2, 2])
+
+    def test_process_executor(self):
+        def run(executor):
+            evaluator = Evaluator(
+                project_name="test-project",
+                eval_name="test",
+                data=[{"input": i} for i in range(3)],
+                task=_double_in_worker,
+                scores=[_in_worker_scorer, _InWorkerScorer()],
+                experiment_name=None,
+                metadata=None,
+                executor=executor,
+            )
+            result = asyncio.run(run_evaluator(None, evaluator, None, []))
+            self.assertTrue(all(r.error is None for r in result.results))
+            self.assertEqual([r.output[0] for r in result.results], [0, 2, 4])
+            return [
+                (r.output[1], r.scores["scorer_in_worker"], r.scores["class_scorer_in_worker"]) for r in result.results
+            ]
+
+        self.assertEqual(run("process"), [(1.0, 1.0, 1.0)] * 3)
+        # Only the scorer which is marked with `process_executor` runs in a worker.
+        self.assertEqual(run("thread"), [(0.0, 1.0, 0.0)] * 3)
+
+    def test_process_worker_runs_under_the_parent_span(self):
+        with _internal_with_custom_background_logger() as bg_logger, mock.patch.object(bg_logger, "_start"):
+            parent = SpanImpl(
+                parent_object_type=SpanObjectTypeV3.EXPERIMENT,
+                parent_object_id=LazyValue(lambda: "experiment-id", use_mutex=False),
+                parent_compute_object_metadata_args=None,
+                parent_span_ids=ParentSpanIds(span_id="root-span", root_span_id="root-span"),
+                name="scorer",
+            )
+            bg_logger.queue.queue.clear()
+
+            def f():
+                current_span().log(metadata={"in_worker": True})
+                with current_span().start_span(name="child"):
+                    pass
+                return current_span().span_id
+
+            with mock.patch("braintrust.framework.flush") as flush:
+                self.assertEqual(
+                    _run_in_process(f, (), {}, parent.export(), parent.span_parents, None), parent.span_id
+                )
+            # Rows are not flushed after every call.
+            flush.assert_not_called()
+            rows = [item.get() for item in bg_logger.queue.queue]
+            bg_logger.queue.queue.clear()
+
+        # No span is added for the call: the worker logs to the parent span, and starts spans under it.
+        self.assertEqual([row["span_id"] for row in rows if not row["_is_merge"]], [rows[1]["span_id"]])
+        self.assertEqual(rows[0]["span_id"], parent.span_id)
+        self.assertEqual(rows[0]["span_parents"], ["root-span"])
+        self.assertEqual(rows[0]["metadata"], {"in_worker": True})
+        self.assertEqual(rows[1]["span_parents"], [parent.span_id])
+
+    def test_process_executor_rejects_hooks(self):
+        evaluator = _make_evaluator([{"input": 1, "expected": 1}], lambda input, hooks: input, executor="process")
+        result = asyncio.run(run_evaluator(None, evaluator, None, []))
+        self.assertIsInstance(result.results[0].error, ValueError)
+
+    def test_scorer_cache(self):
+        calls = []
+
+        def exact(input, output, expected):
+            calls.append(("exact", input))
+            return Score(name="exact", score=float(output == expected), metadata={"input": input})
+
+        def length(output):
+            calls.append(("length", output))
+            return len(output) / 10
+
+        def run(data, scorers):
+            evaluator = _make_evaluator(data, lambda input: input.upper(), cache_scorers=True)
+            evaluator.scores = scorers
+            return asyncio.run(run_evaluator(None, evaluator, None, []))
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            with mock.patch.dict(os.environ, {"BRAINTRUST_SCORER_CACHE_DIR": tmpdir}):
+                data = [{"input": "a", "expected": "A"}, {"input": "b", "expected": "C"}]
+                first = run(data, [exact, length])
+                self.assertEqual(len(calls), 4)
+                exact_cache = first.summary.scorer_cache["exact"]
+                self.assertEqual((exact_cache.hits, exact_cache.misses), (0, 2))
+
+                # Only the changed test case runs the scorers again.
+                calls.clear()
+                data[1]["expected"] = "B"
+                second = run(data, [exact, length])
+                self.assertEqual(sorted(calls), [("exact", "b"), ("length", "B")])
+                self.assertEqual([r.scores for r in second.results], [{"exact": 1.0, "length": 0.1}] * 2)
+                self.assertEqual(second.summary.scorer_cache["exact"].hits, 1)
+                self.assertIn("exact cache: 1 hits, 1 misses", str(second.summary))
+
+    def test_scorer_cache_versions(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            cache = ScorerCache(DiskCache(cache_dir=tmpdir))
+
+            def scorer(output):
+                return 1
+
+            version = scorer_version(scorer)
+            key = create_cache_key("scorer", version, {"output": {"b": 1, "a": 2}})
+            self.assertEqual(key, create_cache_key("scorer", version, {"output": {"a": 2, "b": 1}}))
+            self.assertIsNone(cache.get("scorer", key))
+            cache.set(key, [Score(name="scorer", score=1, metadata={"m": 1})])
+            self.assertEqual(cache.get("scorer", key), [Score(name="scorer", score=1, metadata={"m": 1})])
+
+            scorer.scorer_version = "v2"
+            self.assertEqual(scorer_version(scorer), "v2")
+            self.assertNotEqual(scorer_version(_InWorkerScorer()), scorer_version(_in_worker_scorer))
+
+    def test_scorer_cache_unstable_values(self):
+        class Client:
+            pass
+
+        class LLMScorer(Scorer):
+            def __init__(self, model):
+                self.model = model
+                self.client = Client()
+
+            def _run_eval_sync(self, output, expected=None, **kwargs):
+                return 1
+
+        # The client has no stable representation, so only the model is part of the version.
+        self.assertEqual(scorer_version(LLMScorer("gpt-4o")), scorer_version(LLMScorer("gpt-4o")))
+        self.assertNotEqual(scorer_version(LLMScorer("gpt-4o")), scorer_version(LLMScorer("gpt-4o-mini")))
+        self.assertIsNone(create_cache_key("scorer", "v1", {"output": Client()}))
+
+    def test_reuse_task_outputs(self):
+        calls = []
+
+        def task(input, hooks):
+            calls.append(input)
+            hooks.metadata["calls"] = len(calls)
+            return input * 2
+
+        def run(data, task):
+            evaluator = _make_evaluator(data, task, reuse_task_outputs=True, trial_count=2)
+            return asyncio.run(run_evaluator(None, evaluator, None, []))
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            with mock.patch.dict(os.environ, {"BRAINTRUST_TASK_OUTPUT_CACHE_DIR": tmpdir}):
+                data = [{"input": 1, "expected": 2}, {"input": 2, "expected": 4}]
+                first = run(data, task)
+                self.assertEqual(len(calls), 4)
+
+                # Recorded outputs and metadata are replayed, for each trial.
+                data.append({"input": 3, "expected": 6})
+                second = run(data, task)
+                self.assertEqual(calls[4:], [3, 3])
+                self.assertEqual([r.output for r in second.results], [2, 2, 4, 4, 6, 6])
+                self.assertEqual([r.metadata for r in second.results[:4]], [r.metadata for r in first.results])
+
+                # Changing a test case's expected output or metadata invalidates its recorded outputs.
+                data[0]["expected"] = 3
+                data[1]["metadata"] = {"difficulty": "hard"}
+                run(data, task)
+                self.assertEqual(calls[6:], [1, 1, 2, 2])
+
+                # Changing the task invalidates its recorded outputs.
+                task.task_version = "v2"
+                run(data, task)
+                self.assertEqual(len(calls), 16)
+
+    def test_experiment_task_output_store(self):
+        store = ExperimentTaskOutputStore.from_rows(
+            [
+                {"input": {"q": 1}, "output": "a", "metadata": {"m": 1, "scorer_errors": {}}},
+                {"input": {"q": 1}, "output": "b", "metadata": None},
+                {"input": {"q": 2}, "output": None, "error": "boom"},
+                {"input": {"q": 1}, "output": "child", "span_parents": ["root"]},
+            ]
+        )
+        # Test cases are matched by input only, since the logged metadata includes what the task added to it.
+        datum = EvalCase(input={"q": 1}, metadata={"m": 0})
+        self.assertEqual(store.get(datum, 0), {"output": "a", "metadata": {"m": 1}})
+        self.assertEqual(store.get(datum, 1), {"output": "b", "metadata": {}})
+        self.assertIsNone(store.get(datum, 2))
+        self.assertIsNone(store.get(EvalCase(input={"q": 2}), 0))
+
+    def test_checkpoint_and_resume(self):
+        calls = []
+        fail = {2}
+
+        def task(input):
+            calls.append(input)
+            if input in fail:
+                raise ValueError("boom")
+            return input
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "checkpoint.jsonl")
+            data = [{"input": i, "expected": i} for i in range(4)]
+            first = asyncio.run(run_evaluator(None, _make_evaluator(data, task, checkpoint=path), None, []))
+            self.assertEqual([r.error is None for r in first.results], [True, True, False, True])
+
+            # Simulate a crash in the middle of writing a line.
+            with open(path, "a") as f:
+                f.write('{"key": "trunc')
+
+            calls.clear()
+            fail.clear()
+            second = asyncio.run(
+                run_evaluator(None, _make_evaluator(data, task, checkpoint=path, resume=True), None, [])
+            )
+            # Only the failed test case runs again, and the results and summary include the completed ones.
+            self.assertEqual(calls, [2])
+            self.assertEqual([r.output for r in second.results], [0, 1, 2, 3])
+            self.assertTrue(all(r.error is None for r in second.results))
+            self.assertEqual(second.summary.scores["scorer_0"].score, 1)
+
+            checkpoint = EvalCheckpoint.load(path)
+            self.assertEqual(len(checkpoint), 4)
+            self.assertEqual(checkpoint.header["eval_name"], "test")
+
+    def test_shards(self):
+        data = [{"input": i, "expected": i % 3} for i in range(30)]
+
+        def task(input):
+            return input % 2
+
+        whole = asyncio.run(run_evaluator(None, _make_evaluator(data, task, trial_count=2), None, []))
+        with tempfile.TemporaryDirectory() as tmpdir:
+            inputs = []
+            shards = []
+            for shard_index in range(3):
+                path = os.path.join(tmpdir, f"shard-{shard_index}.json")
+                evaluator = _make_evaluator(
+                    data, task, trial_count=2, shard_index=shard_index, shard_count=3, shard_summary_path=path
+                )
+                result = asyncio.run(run_evaluator(None, evaluator, None, []))
+                inputs.append([r.input for r in result.results])
+                with open(path) as f:
+                    shards.append(json.load(f))
+
+        # The shards run disjoint parts of the data, with every trial of a test case in the same shard.
+        self.assertEqual(sorted(i for shard_inputs in inputs for i in shard_inputs), sorted(list(range(30)) * 2))
+        self.assertTrue(all(shard_inputs for shard_inputs in inputs))
+        for shard_inputs in inputs:
+            self.assertEqual(len(shard_inputs), 2 * len(set(shard_inputs)))
+
+        merged = merge_shard_summaries(shards)
+        self.assertEqual(merged.experiment_name, whole.summary.experiment_name)
+        self.assertAlmostEqual(merged.scores["scorer_0"].score, whole.summary.scores["scorer_0"].score)
+        self.assertAlmostEqual(merged.scores["scorer_0"].stddev, whole.summary.scores["scorer_0"].stddev)
+
+        with self.assertRaises(ValueError):
+            asyncio.run(run_evaluator(None, _make_evaluator(data, task, shard_index=3, shard_count=3), None, []))
+
+    def test_batch_scorers(self):
+        batch_sizes = []
+        batch_inputs = []
+
+        class ExactMatch(BatchScorer):
+            max_batch_size = 4
+
+            def _run_eval_batch_sync(self, outputs, expecteds=None, **kwargs):
+                batch_sizes.append(len(outputs))
+                batch_inputs.extend(kwargs["inputs"])
+                return [Score(name="exact_match", score=float(o == e)) for o, e in zip(outputs, expecteds)]
+
+        # Batch scorers can also score a single test case.
+        self.assertEqual(ExactMatch().eval(1, 1, input=1).score, 1)
+        batch_sizes.clear()
+        batch_inputs.clear()
+
+        @batch_scorer(max_batch_wait=0.01)
+        async def parity(outputs):
+            return [o % 2 for o in outputs]
+
+        @batch_scorer
+        def wrong_length(outputs):
+            return []
+
+        evaluator = _make_evaluator([{"input": i, "expected": i % 3} for i in range(10)], lambda input: input)
+        evaluator.scores = [ExactMatch(), parity, wrong_length]
+        result = asyncio.run(run_evaluator(None, evaluator, None, []))
+
+        self.assertEqual(sorted(batch_sizes), [2, 4, 4])
+        self.assertEqual(sorted(batch_inputs), list(range(10)))
+        self.assertEqual([r.scores["exact_match"] for r in result.results], [float(i < 3) for i in range(10)])
+        self.assertEqual([r.scores["parity"] for r in result.results], [i % 2 for i in range(10)])
+        self.assertTrue(all("wrong_length" in r.metadata["scorer_errors"] for r in result.results))
+
+    def test_async_batch_scorer(self):
+        class AsyncExactMatch(BatchScorer):
+            async def _run_eval_batch_async(self, outputs, expecteds=None, **kwargs):
+                return [Score(name="exact_match", score=float(o == e)) for o, e in zip(outputs, expecteds)]
+
+        # A scorer which only implements the async version can be created and called asynchronously.
+        scorer = AsyncExactMatch()
+        self.assertEqual(asyncio.run(scorer.eval_async(1, 1)).score, 1)
+        with self.assertRaises(NotImplementedError):
+            scorer.eval(1, 1)
+
+        # A scorer which implements neither version cannot be created.
+        class Unimplemented(BatchScorer):
+            pass
+
+        with self.assertRaises(TypeError):
+            Unimplemented()
+
+        evaluator = _make_evaluator([{"input": i, "expected": i % 3} for i in range(5)], lambda input: input)
+        evaluator.scores = [scorer]
+        result = asyncio.run(run_evaluator(None, evaluator, None, []))
+        self.assertEqual([r.scores["exact_match"] for r in result.results], [float(i < 3) for i in range(5)])
+
+    def test_timeouts(self):
+        cancelled = []
+
+        async def task(input):
+            if input == 1:
+                try:
+                    await asyncio.sleep(10)
+                except asyncio.CancelledError:
+                    cancelled.append(input)
+                    raise
+            return input
+
+        def sync_task(input):
+            if input == 1:
+                time.sleep(0.5)
+            return input
+
+        async def slow_scorer(input, output, expected):
+            if input == 2:
+                await asyncio.sleep(10)
+            return 1
+
+        data = [{"input": i, "expected": i} for i in range(4)]
+        for t in [task, sync_task]:
+            evaluator = _make_evaluator(data, t, max_concurrency=1, task_timeout=0.1, scorer_timeout=0.1)
+            evaluator.scores = [slow_scorer]
+            start = time.monotonic()
+            result = asyncio.run(run_evaluator(None, evaluator, None, []))
+            # The hung test case frees its slot, so the other test cases run without waiting for it.
+            self.assertLess(time.monotonic() - start, 0.45)
+
+            self.assertIsInstance(result.results[1].error, TimeoutError)
+            self.assertEqual([r.output for r in result.results], [0, None, 2, 3])
+            self.assertIn("slow_scorer", result.results[2].metadata["scorer_errors"])
+            self.assertIn("TimeoutError", result.results[2].metadata["scorer_errors"]["slow_scorer"])
+            self.assertEqual(result.results[3].scores, {"slow_scorer": 1})
+        self.assertEqual(cancelled, [1])
+
+    def test_timeouts_raised_by_the_task(self):
+        async def task(input):
+            raise asyncio.TimeoutError("upstream request timed out")
+
+        evaluator = _make_evaluator([{"input": 0, "expected": 0}], task, task_timeout=10)
+        result = asyncio.run(run_evaluator(None, evaluator, None, []))
+        # The task's own timeout is reported as is, rather than as the task timing out.
+        self.assertIsInstance(result.results[0].error, asyncio.TimeoutError)
+        self.assertEqual(str(result.results[0].error), "upstream request timed out")
+
+    def test_timeouts_start_once_the_task_runs(self):
+        def task(input):
+            time.sleep(1 if input == 0 else 0.2)
+            return input
+
+        # With a single worker thread, test case 1 is queued behind the hung test case 0. The wait does not count
+        # towards its timeout, and it runs on another thread once test case 0 times out.
+        thread_pool = EvalThreadPoolSingleton()
+        thread_pool.set_max_workers(1)
+        data = [{"input": i, "expected": i} for i in range(2)]
+        evaluator = _make_evaluator(data, task, task_timeout=0.3)
+        with mock.patch("braintrust.framework._THREAD_POOL_SINGLETON", ResourceManager(thread_pool)):
+            start = time.monotonic()
+            result = asyncio.run(run_evaluator(None, evaluator, None, []))
+        self.assertLess(time.monotonic() - start, 0.9)
+
+        self.assertIsInstance(result.results[0].error, TimeoutError)
+        self.assertIsNone(result.results[1].error)
+        self.assertEqual(result.results[1].output, 1)
+
+    def test_timed_out_sync_tasks_do_not_block_exit(self):
+        script = textwrap.dedent(
+            """
+            import asyncio, time
+            from braintrust.framework import Evaluator, run_evaluator
+
+            evaluator = Evaluator(
+                project_name="test-project",
+                eval_name="test",
+                data=[{"input": 0}],
+                task=lambda input: time.sleep(60),
+                scores=[],
+                experiment_name=None,
+                metadata=None,
+                task_timeout=0.1,
+            )
+            asyncio.run(run_evaluator(None, evaluator, None, []))
+            """
+        )
+        # The hung task keeps running on its thread, but the interpreter exits without waiting for it.
+        subprocess.run([sys.executable, "-c", script], check=True, timeout=30, capture_output=True)
+
+    def test_adaptive_trials(self):
+        calls = {}
+
+        def task(input):
+            calls[input] = calls.get(input, 0) + 1
+            # Input 0 is deterministic, and input 1 is wrong on every third trial, so its first two trials agree.
+            return input if input == 0 or calls[input] % 3 else -1
+
+        data = [{"input": i, "expected": i} for i in range(2)]
+        adaptive_trials = AdaptiveTrials(max_trials=10, min_trials=2, max_ci_half_width=0.2)
+        evaluator = _make_evaluator(data, task, adaptive_trials=adaptive_trials)
+        result = asyncio.run(run_evaluator(None, evaluator, None, []))
+
+        self.assertEqual(calls, {0: 6, 1: 10})
+        self.assertEqual([r.input for r in result.results], [0] * 6 + [1] * 10)
+        self.assertEqual([r.output for r in result.results if r.input == 1].count(-1), 3)
+        trials = result.summary.trials
+        self.assertEqual((trials.test_cases, trials.trials, trials.max_trials), (2, 16, 10))
+        self.assertIn("16 trials for 2 test cases", str(result.summary))
+
+    def test_adaptive_trials_stability(self):
+        def results(*scores):
+            return [EvalResult(input=None, output=None, scores={"s": s}) for s in scores]
+
+        trials = AdaptiveTrials(max_trials=20, min_trials=3, max_ci_half_width=0.1)
+        self.assertFalse(trials.is_stable(results(1, 1)))
+        # A few identical scores may come from a flaky test case, so they are not stable yet.
+        self.assertFalse(trials.is_stable(results(1, 1, 1)))
+        self.assertFalse(trials.is_stable(results(*[0] * 15)))
+        self.assertTrue(trials.is_stable(results(*[0] * 16)))
+        self.assertFalse(trials.is_stable(results(1, 0.9, 1)))
+        self.assertTrue(trials.is_stable(results(*[1, 0.9] * 20)))
+        self.assertFalse(AdaptiveTrials(min_trials=3, max_stddev=0.3).is_stable(results(1, 0.9, 1)))
+        self.assertTrue(AdaptiveTrials(min_trials=3, max_stddev=0.3).is_stable(results(*[1, 0.9, 1] * 3)))
+        # Failed trials have no scores, so a test case whose trials all fail stops after the minimum.
+        self.assertTrue(trials.is_stable([EvalResult(input=None, output=None, scores={}, error=ValueError())] * 3))
+        with self.assertRaises(ValueError):
+            AdaptiveTrials(max_trials=1, min_trials=2)
+
+
+class TestEvalResults(unittest.TestCase):
+    def _result(self, i, error=None):
+        return EvalResult(input=i, output=[i], scores={"score": i / 10}, error=error)
+
+    def test_in_memory(self):
+        results = EvalResults()
+        for i in range(3):
+            results.append(self._result(i))
+        self.assertIsNone(results.path)
+        self.assertEqual([r.input for r in results], [0, 1, 2])
+        self.assertEqual(results[-1].output, [2])
+
+    def test_spills_to_temporary_file(self):
+        results = EvalResults(max_in_memory=2)
+        for i in range(5):
+            results.append(self._result(i, error=ValueError("boom") if i == 4 else None))
+        results.close()
+
+        path = results.path
+        self.assertEqual(len(results), 5)
+        with open(path) as f:
+            self.assertEqual([json.loads(line)["input"] for line in f], [2, 3, 4])
+        self.assertEqual([r.input for r in results], [0, 1, 2, 3, 4])
+        self.assertEqual([r.output for r in results[1:3]], [[1], [2]])
+        self.assertEqual(results[3].scores, {"score": 0.3})
+        self.assertEqual(str(results[4].error), "ValueError: boom")
+        with self.assertRaises(IndexError):
+            results[5]
+
+        del results
+        gc.collect()
+        self.assertFalse(os.path.exists(path))
+
+    def test_results_file_is_closed(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            results = EvalResults(path=os.path.join(tmpdir, "results.jsonl"), max_in_memory=1)
+            for i in range(3):
+                results.append(self._result(i))
+            f = results._file
+            results.close()
+            self.assertTrue(f.closed)
+            # Results are still readable after closing the file.
+            self.assertEqual([r.input for r in results], [0, 1, 2])
+            self.assertEqual(results[2].input, 2)
+
+            # An unclosed file is closed once the results are garbage collected.
+            results = EvalResults(path=os.path.join(tmpdir, "unclosed.jsonl"))
+            f = results._file
+            del results
+            gc.collect()
+            self.assertTrue(f.closed)
+
+    def test_writes_every_result_to_path(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "results.jsonl")
+            evaluator = _make_evaluator(
+                [{"input": i, "expected": i} for i in range(5)],
+                lambda input: input,
+                results_path=path,
+                max_results_in_memory=2,
+            )
+            result = asyncio.run(run_evaluator(None, evaluator, None, []))
+
+            with open(path) as f:
+                self.assertEqual([json.loads(line)["input"] for line in f], list(range(5)))
+            self.assertEqual([r.input for r in result.results], list(range(5)))
+            self.assertEqual([r.scores for r in result.results], [{"scorer_0": 1.0}] * 5)
+            self.assertEqual(result.summary.scores["scorer_0"].score, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
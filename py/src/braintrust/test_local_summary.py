@@ -0,0 +1,226 @@
+import math
+import random
+import statistics
+import unittest
+from unittest import mock
+
+from . import local_summary
+from .local_summary import (
+    ExperimentColumns,
+    StreamingStats,
+    merge_shard_summaries,
+    shard_summary,
+    summarize_metrics,
+    summarize_scores,
+)
+from .logger import ExperimentSummary, ScorerCacheSummary, TrialsSummary
+
+
+class TestLocalSummary(unittest.TestCase):
+    def test_means_without_base(self):
+        current = ExperimentColumns()
+        current.add("a", {"accuracy": 1, "fluency": None})
+        current.add("b", {"accuracy": 0, "fluency": 0.5})
+        current.add("c", {})
+
+        scores = summarize_scores(current)
+        self.assertEqual(set(scores), {"accuracy", "fluency"})
+        self.assertAlmostEqual(scores["accuracy"].score, 0.5)
+        self.assertAlmostEqual(scores["fluency"].score, 0.5)
+        self.assertIsNone(scores["accuracy"].diff)
+        self.assertEqual((scores["accuracy"].improvements, scores["accuracy"].regressions), (0, 0))
+        self.assertEqual(summarize_metrics(current), {})
+
+    def test_compares_matching_inputs(self):
+        base = ExperimentColumns.from_rows(
+            [
+                {"input": {"q": 1}, "scores": {"accuracy": 0.5}, "metrics": {"start": 0, "end": 2}},
+                {"input": {"q": 2}, "scores": {"accuracy": 1}, "metrics": {"start": 0, "end": 2}},
+                {"input": {"q": 3}, "scores": {"accuracy": 0}, "metrics": {"start": 0, "end": 2}},
+                # Only root spans are test cases.
+                {"input": {"q": 1}, "scores": {"accuracy": 0}, "span_parents": ["root"]},
+            ]
+        )
+        current = ExperimentColumns()
+        # Trials of the same input are averaged before comparing.
+        current.add({"q": 1}, {"accuracy": 1}, {"start": 0, "end": 1})
+        current.add({"q": 1}, {"accuracy": 0.5}, {"start": 0, "end": 1})
+        current.add({"q": 2}, {"accuracy": 0}, {"start": 0, "end": 3})
+        current.add({"q": 3}, {"accuracy": 0}, {"start": 0, "end": 1})
+        # Inputs which are not in the base experiment are not compared.
+        current.add({"q": 4}, {"accuracy": 1}, {"start": 0, "end": 1})
+
+        scores = summarize_scores(current, base)
+        self.assertAlmostEqual(scores["accuracy"].score, 0.5)
+        self.assertAlmostEqual(scores["accuracy"].diff, 0.0)
+        self.assertEqual((scores["accuracy"].improvements, scores["accuracy"].regressions), (1, 1))
+
+        metrics = summarize_metrics(current, base)
+        self.assertEqual(metrics["duration"].unit, "s")
+        self.assertAlmostEqual(metrics["duration"].metric, 1.4)
+        self.assertAlmostEqual(metrics["duration"].diff, -0.3)
+        # Lower durations are improvements.
+        self.assertEqual((metrics["duration"].improvements, metrics["duration"].regressions), (2, 1))
+
+    def test_scores_missing_from_base(self):
+        base = ExperimentColumns()
+        base.add("a", {"other": 1})
+        current = ExperimentColumns()
+        current.add("a", {"accuracy": 1})
+
+        scores = summarize_scores(current, base)
+        self.assertIsNone(scores["accuracy"].diff)
+        self.assertEqual((scores["accuracy"].improvements, scores["accuracy"].regressions), (0, 0))
+
+    def test_summaries_include_distributions(self):
+        current = ExperimentColumns()
+        for i in range(10):
+            current.add(i, {"accuracy": i / 10}, {"start": 0, "end": 1, "tokens": 100})
+
+        accuracy = summarize_scores(current)["accuracy"]
+        self.assertAlmostEqual(accuracy.stddev, statistics.stdev([i / 10 for i in range(10)]))
+        self.assertLessEqual(accuracy.p50, accuracy.p90)
+        self.assertLessEqual(accuracy.p90, accuracy.p99)
+        self.assertLessEqual(accuracy.ci_lower, accuracy.score)
+        self.assertLessEqual(accuracy.score, accuracy.ci_upper)
+
+        metrics = summarize_metrics(current)
+        self.assertAlmostEqual(metrics["total_tokens"].metric, 100)
+        self.assertAlmostEqual(metrics["total_tokens"].stddev, 0)
+
+    def test_columns_without_rows(self):
+        rows = ExperimentColumns()
+        stats_only = ExperimentColumns(keep_rows=False)
+        for i in range(10):
+            scores = {"accuracy": i / 10} if i % 3 else {"accuracy": None, "fluency": 1}
+            for columns in (rows, stats_only):
+                columns.add(i, scores, {"start": 0, "end": i})
+
+        # Only the running statistics are kept, and they summarize the same way.
+        self.assertEqual(len(stats_only), 10)
+        self.assertEqual((stats_only.keys, stats_only.scores, stats_only.metrics), ([], {}, {}))
+        self.assertEqual(summarize_scores(stats_only), summarize_scores(rows))
+        self.assertEqual(summarize_metrics(stats_only), summarize_metrics(rows))
+        with self.assertRaises(ValueError):
+            summarize_scores(stats_only, rows)
+
+    @unittest.skipIf(local_summary.np is None, "numpy is not installed")
+    def test_numpy_and_python_agree(self):
+        rng = random.Random(0)
+        base = ExperimentColumns()
+        current = ExperimentColumns()
+        for i in range(200):
+            base.add(i % 50, {"accuracy": rng.choice([0, 0.5, 1, None])}, {"start": 0, "end": rng.random()})
+            current.add(i % 70, {"accuracy": rng.choice([0, 0.5, 1, None])}, {"start": 0, "end": rng.random()})
+
+        summaries = (summarize_scores(current, base), summarize_metrics(current, base))
+        with mock.patch.object(local_summary, "np", None):
+            python_summaries = (summarize_scores(current, base), summarize_metrics(current, base))
+        for vectorized, python in zip(summaries, python_summaries):
+            for name, summary in vectorized.items():
+                self.assertAlmostEqual(summary.diff, python[name].diff)
+                self.assertEqual(
+                    (summary.improvements, summary.regressions), (python[name].improvements, python[name].regressions)
+                )
+
+    def test_merge_shard_summaries(self):
+        base = ExperimentColumns()
+        whole = ExperimentColumns()
+        shards = [ExperimentColumns(), ExperimentColumns()]
+        for i in range(20):
+            base.add(i, {"accuracy": 0.5})
+            scores = {"accuracy": i % 3 / 2} if i % 5 else {"fluency": 1}
+            metrics = {"start": 0, "end": i}
+            whole.add(i, scores, metrics)
+            shards[i % 2].add(i, scores, metrics)
+
+        def summary(scorer_cache):
+            return ExperimentSummary(
+                project_name="p",
+                project_id=None,
+                experiment_id=None,
+                experiment_name="e",
+                project_url=None,
+                experiment_url=None,
+                comparison_experiment_name="b",
+                scores={},
+                metrics={},
+                scorer_cache=scorer_cache,
+                trials=TrialsSummary(test_cases=10, trials=15, max_trials=3),
+            )
+
+        merged = merge_shard_summaries(
+            [
+                shard_summary(summary({"s": ScorerCacheSummary(hits=1, misses=2)}), shards[0], base, 0, 2),
+                shard_summary(summary({"s": ScorerCacheSummary(hits=3, misses=0)}), shards[1], base, 1, 2),
+            ]
+        )
+        self.assertEqual(merged.comparison_experiment_name, "b")
+        self.assertEqual(merged.scorer_cache, {"s": ScorerCacheSummary(hits=4, misses=2)})
+        self.assertEqual(merged.trials, TrialsSummary(test_cases=20, trials=30, max_trials=3))
+        expected_scores = summarize_scores(whole, base)
+        self.assertEqual(set(merged.scores), set(expected_scores))
+        for name, expected in expected_scores.items():
+            actual = merged.scores[name]
+            self.assertAlmostEqual(actual.score, expected.score)
+            self.assertAlmostEqual(actual.stddev or 0, expected.stddev or 0)
+            self.assertAlmostEqual(actual.diff, expected.diff)
+            self.assertEqual((actual.improvements, actual.regressions), (expected.improvements, expected.regressions))
+        self.assertAlmostEqual(merged.metrics["duration"].metric, summarize_metrics(whole, base)["duration"].metric)
+
+
+class TestStreamingStats(unittest.TestCase):
+    def test_empty_and_single_value(self):
+        stats = StreamingStats()
+        self.assertIsNone(stats.quantile(0.5))
+        stats.add(float("nan"))
+        self.assertEqual(stats.count, 0)
+
+        stats.add(3)
+        self.assertEqual(stats.summary_fields(), dict(stddev=None, p50=3, p90=3, p99=3, ci_lower=None, ci_upper=None))
+
+    def test_matches_exact_statistics(self):
+        rng = random.Random(1)
+        values = [rng.lognormvariate(0, 1) * rng.choice([-1, 1]) for _ in range(5000)] + [0.0] * 100
+        stats = StreamingStats()
+        for value in values:
+            stats.add(value)
+
+        self.assertEqual(stats.count, len(values))
+        self.assertAlmostEqual(stats.mean, statistics.fmean(values))
+        self.assertAlmostEqual(stats.stddev, statistics.stdev(values))
+
+        values.sort()
+        for q in [0.01, 0.5, 0.9, 0.99]:
+            exact = values[round(q * (len(values) - 1))]
+            self.assertLessEqual(abs(stats.quantile(q) - exact), 0.02 * abs(exact) + 1e-9, q)
+
+        lower, upper = stats.confidence_interval()
+        standard_error = statistics.stdev(values) / math.sqrt(len(values))
+        self.assertLess(lower, stats.mean)
+        self.assertGreater(upper, stats.mean)
+        self.assertAlmostEqual((upper - lower) / (2 * 1.96 * standard_error), 1, places=3)
+
+    def test_percentiles_are_observed_values(self):
+        stats = StreamingStats()
+        for value in [0, 0, 0, 1, 1]:
+            stats.add(value)
+        self.assertEqual([stats.quantile(q) for q in [0, 0.5, 0.9, 0.99, 1]], [0, 0, 1, 1, 1])
+
+        stats = StreamingStats()
+        stats.add(1.0)
+        stats.add(1.0)
+        self.assertEqual(stats.summary_fields()["p50"], 1.0)
+        self.assertEqual(stats.summary_fields()["p99"], 1.0)
+
+        # Once there are too many distinct values, percentiles are estimated, but stay within the observed range.
+        stats = StreamingStats()
+        for i in range(local_summary.MAX_EXACT_VALUES + 1):
+            stats.add(i / local_summary.MAX_EXACT_VALUES)
+        self.assertIsNone(stats._exact)
+        self.assertEqual(stats.quantile(1), 1.0)
+        self.assertAlmostEqual(stats.quantile(0.5), 0.5, delta=0.01)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,7 +1,36 @@
-from unittest import TestCase
+import base64
+import io
+import json
+import os
+import queue
+import shutil
+import tempfile
+import threading
+import time
+from unittest import TestCase, mock
 
-from braintrust import LazyValue, Prompt
+from braintrust import (
+    Attachment,
+    LazyValue,
+    Prompt,
+    ReadonlyAttachment,
+    _internal_with_custom_background_logger,
+    logger,
+)
+from braintrust.attachment_cache import AttachmentUploadRegistry
+from braintrust.file_cache import FileCache
+from braintrust.logger import (
+    BraintrustState,
+    Dataset,
+    ObjectFetcher,
+    ObjectIterator,
+    ObjectMetadata,
+    ProjectDatasetMetadata,
+    _BackgroundLogger,
+    _deep_copy_event,
+)
 from braintrust.prompt import PromptChatBlock, PromptData, PromptMessage, PromptSchema
+from braintrust.prompt_cache.lru_cache import LRUCache
 
 
 class TestLogger(TestCase):
@@ -83,3 +112,421 @@ class TestLogger(TestCase):
                 },
             },
         )
+
+    def test_deep_copy_event_offloads_oversized_fields(self):
+        png = b"\x89PNG" + b"\x00" * 64
+        with _internal_with_custom_background_logger() as bg_logger:
+            bg_logger.attachment_offload_threshold = 32
+            event = _deep_copy_event(
+                {
+                    "input": {"prompt": "x" * 33, "short": "y"},
+                    "output": "data:image/png;base64," + base64.b64encode(png).decode(),
+                    "metadata": {"docs": ["z" * 40]},
+                    "tags": ["t" * 40],
+                }
+            )
+
+        prompt = event["input"]["prompt"]
+        self.assertIsInstance(prompt, Attachment)
+        self.assertEqual(prompt.data, b"x" * 33)
+        self.assertEqual(prompt.reference["filename"], "input.prompt.txt")
+        self.assertEqual(event["input"]["short"], "y")
+
+        image = event["output"]
+        self.assertIsInstance(image, Attachment)
+        self.assertEqual(image.data, png)
+        self.assertEqual(image.reference["content_type"], "image/png")
+        self.assertEqual(image.reference["filename"], "output.png")
+
+        self.assertEqual(event["metadata"]["docs"][0].reference["filename"], "metadata.docs.0.txt")
+        # Fields outside of input/output/expected/metadata are never offloaded.
+        self.assertEqual(event["tags"], ["t" * 40])
+
+    def test_deep_copy_event_does_not_offload_by_default(self):
+        with _internal_with_custom_background_logger():
+            event = _deep_copy_event({"input": "x" * 100000})
+        self.assertEqual(event["input"], "x" * 100000)
+
+    def test_attachment_uploads_run_concurrently(self):
+        class FakeAttachment:
+            def __init__(self, key):
+                self.reference = dict(key=key)
+
+            def upload(self):
+                nonlocal in_flight, max_in_flight
+                with lock:
+                    in_flight += 1
+                    max_in_flight = max(max_in_flight, in_flight)
+                time.sleep(0.05)
+                with lock:
+                    in_flight -= 1
+                return {"upload_status": "done"}
+
+        lock = threading.Lock()
+        in_flight = 0
+        max_in_flight = 0
+
+        bg_logger = _BackgroundLogger(LazyValue(lambda: None, use_mutex=False))
+        futures = [bg_logger._submit_attachment_upload(FakeAttachment(str(i))) for i in range(4)]
+        # An attachment with the same key as an in-flight upload shares that upload.
+        self.assertIs(bg_logger._submit_attachment_upload(FakeAttachment("0")), futures[0])
+        bg_logger._wait_for_attachment_uploads(futures)
+
+        self.assertGreater(max_in_flight, 1)
+        self.assertLessEqual(max_in_flight, bg_logger.attachment_upload_concurrency)
+        self.assertEqual(bg_logger._pending_attachment_uploads, {})
+
+    def test_concurrent_uploads_of_an_attachment_share_one_upload(self):
+        uploads = []
+
+        class FakeAttachment:
+            reference = dict(key="same")
+
+            def upload(self):
+                uploads.append(1)
+                time.sleep(0.05)
+                return {"upload_status": "done"}
+
+        bg_logger = _BackgroundLogger(LazyValue(lambda: None, use_mutex=False))
+        barrier = threading.Barrier(8)
+        futures = []
+
+        def submit():
+            barrier.wait()
+            futures.append(bg_logger._submit_attachment_upload(FakeAttachment()))
+
+        threads = [threading.Thread(target=submit) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        bg_logger._wait_for_attachment_uploads(futures)
+
+        self.assertEqual(len(uploads), 1)
+        self.assertEqual(len({id(f) for f in futures}), 1)
+
+    def test_attachment_streams_file_contents(self):
+        with tempfile.NamedTemporaryFile(delete=False) as f:
+            f.write(b"hello world")
+        try:
+            attachment = Attachment(data=f.name, filename="hello.txt", content_type="text/plain")
+            with attachment._open_data_stream() as stream:
+                self.assertEqual(stream.read(), b"hello world")
+            # Streaming does not load the file into memory.
+            self.assertFalse(attachment._data.has_succeeded)
+        finally:
+            os.unlink(f.name)
+
+    def test_deduplicated_attachments_share_a_reference(self):
+        state = logger._state
+        orig = (state.logged_in, state.org_id, state._attachment_registry)
+        state.logged_in, state.org_id = True, "org-id"
+        registry = AttachmentUploadRegistry(memory_cache=LRUCache())
+        state._attachment_registry = LazyValue(lambda: registry, use_mutex=False)
+        try:
+            a = Attachment(data=b"image", filename="a.png", content_type="image/png", deduplicate=True)
+            b = Attachment(data=b"image", filename="a.png", content_type="image/png", deduplicate=True)
+            c = Attachment(data=b"other", filename="a.png", content_type="image/png", deduplicate=True)
+            d = Attachment(data=b"image", filename="a.png", content_type="image/png", deduplicate=False)
+            # Nothing is hashed until the reference is resolved.
+            self.assertFalse(a._registry_key.has_succeeded)
+            self.assertEqual(a.resolve_reference()["key"], b.resolve_reference()["key"])
+            self.assertNotEqual(a.reference["key"], c.resolve_reference()["key"])
+            self.assertNotEqual(a.reference["key"], d.resolve_reference()["key"])
+
+            # Once the contents have been uploaded, later attachments skip the upload.
+            registry.mark_uploaded(a._registry_key.get(), a.reference["key"])
+            self.assertEqual(b.upload(), {"upload_status": "done"})
+        finally:
+            state.logged_in, state.org_id, state._attachment_registry = orig
+
+    def test_local_caches_are_opt_in(self):
+        env = {k: v for k, v in os.environ.items() if not k.endswith("_CACHE_MAX_SIZE")}
+        with mock.patch.dict(os.environ, env, clear=True):
+            state = BraintrustState()
+            # Nothing is built until it is used, and downloads are not cached unless a maximum size is set.
+            self.assertFalse(state._attachment_registry.has_succeeded)
+            self.assertIsNone(state._attachment_blob_cache.get())
+            self.assertIsNone(state._dataset_cache.get())
+
+        cache_dir = tempfile.mkdtemp()
+        try:
+            env = {
+                "BRAINTRUST_ATTACHMENT_CACHE_MAX_SIZE": "1024",
+                "BRAINTRUST_ATTACHMENT_CACHE_DIR": cache_dir,
+                "BRAINTRUST_DATASET_CACHE_MAX_SIZE": "1024",
+                "BRAINTRUST_DATASET_CACHE_DIR": cache_dir,
+            }
+            with mock.patch.dict(os.environ, env):
+                state = BraintrustState()
+                self.assertIsNotNone(state._attachment_blob_cache.get())
+                self.assertIsNotNone(state._dataset_cache.get())
+        finally:
+            shutil.rmtree(cache_dir, ignore_errors=True)
+
+    def test_readonly_attachment_reads_from_cache(self):
+        state = logger._state
+        orig = state._attachment_blob_cache
+        cache_dir = tempfile.mkdtemp()
+        cache = FileCache(cache_dir=cache_dir)
+        state._attachment_blob_cache = LazyValue(lambda: cache, use_mutex=False)
+        try:
+            reference = dict(type="braintrust_attachment", filename="a.txt", content_type="text/plain", key="k")
+            with cache.writer("k") as f:
+                f.write(b"hello world")
+
+            # Cache hits never talk to the API server.
+            attachment = ReadonlyAttachment(reference)
+            with mock.patch.object(ReadonlyAttachment, "metadata", side_effect=AssertionError("unexpected request")):
+                self.assertEqual(attachment.data, b"hello world")
+                self.assertEqual(attachment.read_range(6), b"world")
+                self.assertEqual(attachment.read_range(0, 5), b"hello")
+                out = io.BytesIO()
+                attachment.download_to(out)
+                self.assertEqual(out.getvalue(), b"hello world")
+        finally:
+            state._attachment_blob_cache = orig
+            shutil.rmtree(cache_dir, ignore_errors=True)
+
+    def test_readonly_attachment_downloads_into_cache(self):
+        class FakeResponse:
+            status_code = 200
+
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *args):
+                pass
+
+            def iter_content(self, chunk_size):
+                yield b"hello "
+                yield b"world"
+
+        state = logger._state
+        orig = state._attachment_blob_cache
+        cache_dir = tempfile.mkdtemp()
+        cache = FileCache(cache_dir=cache_dir)
+        state._attachment_blob_cache = LazyValue(lambda: cache, use_mutex=False)
+        try:
+            reference = dict(type="braintrust_attachment", filename="a.txt", content_type="text/plain", key="k")
+            with mock.patch.object(ReadonlyAttachment, "_request_object", return_value=FakeResponse()) as request:
+                self.assertEqual(ReadonlyAttachment(reference).data, b"hello world")
+                self.assertEqual(ReadonlyAttachment(reference).data, b"hello world")
+            self.assertEqual(request.call_count, 1)
+        finally:
+            state._attachment_blob_cache = orig
+            shutil.rmtree(cache_dir, ignore_errors=True)
+
+    def test_object_fetcher_paginates(self):
+        pages = {None: ([{"id": 1}, {"id": 2}], "c1"), "c1": ([{"id": 3}, {"id": 4}], "c2"), "c2": ([{"id": 5}], None)}
+        requests = []
+
+        class FakeResponse:
+            def __init__(self, body):
+                self.body = json.dumps(body).encode()
+
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *args):
+                pass
+
+            def raise_for_status(self):
+                pass
+
+            def iter_content(self, chunk_size):
+                for i in range(0, len(self.body), 3):
+                    yield self.body[i : i + 3]
+
+        class FakeConn:
+            def get(self, path, params, headers, stream):
+                requests.append(params)
+                events, cursor = pages[params["cursor"]]
+                return FakeResponse({"events": events, "cursor": cursor})
+
+        class FakeState:
+            def api_conn(self):
+                return FakeConn()
+
+        class Fetcher(ObjectFetcher):
+            def __init__(self):
+                super().__init__("dataset", mutate_record=lambda r: {**r, "mutated": True})
+
+            @property
+            def id(self):
+                return "id"
+
+            def _get_state(self):
+                return FakeState()
+
+        records = list(Fetcher().fetch(batch_size=2))
+        self.assertEqual([r["id"] for r in records], [1, 2, 3, 4, 5])
+        self.assertTrue(all(r["mutated"] for r in records))
+        self.assertEqual([(r["cursor"], r["limit"]) for r in requests], [(None, 2), ("c1", 2), ("c2", 2)])
+
+    def test_object_iterator_fetches_once(self):
+        calls = []
+
+        def refetch():
+            calls.append(None)
+            return [1, 2, 3]
+
+        self.assertEqual(list(ObjectIterator(refetch)), [1, 2, 3])
+        self.assertEqual(len(calls), 1)
+
+    def test_dataset_reads_after_writes_do_not_refetch(self):
+        metadata = ProjectDatasetMetadata(
+            project=ObjectMetadata(id="project-id", name="project", full_info={}),
+            dataset=ObjectMetadata(id="dataset-id", name="dataset", full_info={}),
+        )
+        rows = [
+            {"id": "a", "input": 1, "expected": 1, "metadata": {"x": 1, "y": 1}},
+            {"id": "b", "input": 2, "expected": 2},
+        ]
+        state = logger._state
+        orig_cache = state._dataset_cache
+        state._dataset_cache = LazyValue(lambda: None, use_mutex=False)
+        try:
+            with _internal_with_custom_background_logger() as bg_logger, mock.patch.object(
+                ObjectFetcher, "_fetch_page", return_value=(rows, None)
+            ) as fetch_page:
+                dataset = Dataset(lazy_metadata=LazyValue(lambda: metadata, use_mutex=False), legacy=False)
+                self.assertEqual([r["id"] for r in dataset], ["a", "b"])
+
+                iterator = dataset.fetch()
+                self.assertEqual(next(iterator)["id"], "a")
+
+                dataset.insert(input=3, expected=3, id="c")
+                dataset.update(id="a", metadata={"y": 2})
+                dataset.delete(id="b")
+
+                records = {r["id"]: r for r in dataset}
+                self.assertEqual(list(records), ["a", "c"])
+                self.assertEqual(records["a"]["metadata"], {"x": 1, "y": 2})
+                self.assertEqual(records["c"]["expected"], 3)
+                # In-progress iterators keep seeing the records as they were.
+                self.assertEqual([r["id"] for r in iterator], ["b"])
+                self.assertEqual(rows[0]["metadata"], {"x": 1, "y": 1})
+                self.assertEqual(fetch_page.call_count, 1)
+                self.assertEqual(bg_logger.queue.qsize(), 3)
+
+                with mock.patch.object(Dataset, "flush") as flush:
+                    dataset.refresh()
+                    list(dataset)
+                flush.assert_called()
+                self.assertEqual(fetch_page.call_count, 2)
+        finally:
+            state._dataset_cache = orig_cache
+
+    def test_dataset_insert_many(self):
+        metadata = ProjectDatasetMetadata(
+            project=ObjectMetadata(id="project-id", name="project", full_info={}),
+            dataset=ObjectMetadata(id="dataset-id", name="dataset", full_info={}),
+        )
+        records = ({"input": i, "expected": 2 * i, "metadata": {"i": i}} for i in range(5))
+        with _internal_with_custom_background_logger() as bg_logger:
+            dataset = Dataset(lazy_metadata=LazyValue(lambda: metadata, use_mutex=False), legacy=False)
+            row_ids = dataset.insert_many(records, batch_size=2)
+
+            # Each record is a separate queue item, so the queue size bounds the number of buffered rows.
+            self.assertEqual(bg_logger.queue.qsize(), 5)
+            self.assertEqual(dataset.new_records, 5)
+            batches, _ = bg_logger._unwrap_lazy_values(list(bg_logger.queue.queue))
+
+        rows = [row for batch in batches for row in batch]
+        self.assertEqual(sorted(row["id"] for row in rows), sorted(row_ids))
+        self.assertTrue(all(row["dataset_id"] == "dataset-id" for row in rows))
+        self.assertEqual(sorted(row["expected"] for row in rows), [0, 2, 4, 6, 8])
+
+    def test_dataset_insert_many_validates_records(self):
+        with _internal_with_custom_background_logger() as bg_logger:
+            dataset = Dataset(lazy_metadata=LazyValue(lambda: None, use_mutex=False), legacy=False)
+            with self.assertRaises(ValueError):
+                dataset.insert_many([{"input": 1}, {"input": 2, "metadata": "not a dict"}])
+            with self.assertRaises(TypeError):
+                dataset.insert_many([{"input": 1}, {"inputs": 2}])
+            # Invalid records reject their whole chunk before it is enqueued.
+            self.assertEqual(bg_logger.queue.qsize(), 0)
+            self.assertEqual(dataset.new_records, 0)
+
+    def test_logger_log_many(self):
+        project_logger = logger.Logger(lazy_metadata=LazyValue(lambda: None, use_mutex=False))
+        project_logger._lazy_id = LazyValue(lambda: "project-id", use_mutex=False)
+        events = [dict(input=i, output=i, scores={"score": 1}, id=f"row-{i}") for i in range(3)]
+        with _internal_with_custom_background_logger() as bg_logger:
+            # Events are validated like the arguments to `log`.
+            with self.assertRaises(TypeError):
+                project_logger.log_many([dict(input=1, output=1, score=1)])
+            self.assertEqual(bg_logger.queue.qsize(), 0)
+
+            row_ids = project_logger.log_many(iter(events), batch_size=10)
+            self.assertEqual(bg_logger.queue.qsize(), 3)
+            batches, _ = bg_logger._unwrap_lazy_values(list(bg_logger.queue.queue))
+
+        self.assertEqual(row_ids, ["row-0", "row-1", "row-2"])
+        rows = sorted((row for batch in batches for row in batch), key=lambda row: row["id"])
+        self.assertEqual([row["input"] for row in rows], [0, 1, 2])
+        for prev, row in zip(rows, rows[1:]):
+            self.assertEqual(row["metrics"]["start"], prev["metrics"]["end"])
+        for row in rows:
+            # Each event is logged as a single complete root span.
+            self.assertEqual(row["span_id"], row["root_span_id"])
+            self.assertEqual(row["span_attributes"]["name"], "root")
+            self.assertFalse(row["_is_merge"])
+            self.assertLessEqual(row["metrics"]["start"], row["metrics"]["end"])
+            self.assertEqual(row["project_id"], "project-id")
+        self.assertEqual(project_logger.last_start_time, rows[-1]["metrics"]["end"])
+
+    def test_log_many_drops_rows_when_full(self):
+        project_logger = logger.Logger(lazy_metadata=LazyValue(lambda: None, use_mutex=False))
+        project_logger._lazy_id = LazyValue(lambda: "project-id", use_mutex=False)
+        with _internal_with_custom_background_logger() as bg_logger:
+            bg_logger.queue = queue.Queue(maxsize=5)
+            bg_logger.queue_drop_when_full = True
+            with mock.patch.object(bg_logger, "_start"), mock.patch.object(
+                bg_logger, "_register_dropped_item_count"
+            ) as register_dropped:
+                project_logger.log_many([dict(input=i, output=i) for i in range(8)], batch_size=100)
+            self.assertEqual(bg_logger.queue.qsize(), 5)
+            register_dropped.assert_called_once_with(3)
+            # Don't publish the rows at exit.
+            bg_logger.queue.queue.clear()
+
+    def test_fetch_compiles_columns_and_filter_into_btql(self):
+        metadata = ProjectDatasetMetadata(
+            project=ObjectMetadata(id="project-id", name="project", full_info={}),
+            dataset=ObjectMetadata(id="dataset-id", name="dataset", full_info={}),
+        )
+        internal_filter = {"op": "eq", "left": {"op": "ident", "name": ["a"]}, "right": {"op": "literal", "value": 1}}
+        user_filter = {"op": "eq", "left": {"op": "ident", "name": ["b"]}, "right": {"op": "literal", "value": 2}}
+        dataset = Dataset(
+            lazy_metadata=LazyValue(lambda: metadata, use_mutex=False),
+            legacy=False,
+            _internal_btql={"filter": internal_filter},
+        )
+        rows = [{"id": "a", "input": 1}]
+        with mock.patch.object(ObjectFetcher, "_fetch_page", return_value=(rows, None)) as fetch_page:
+            records = list(dataset.fetch(columns=["input", "id"], filter=user_filter))
+
+        self.assertEqual(records, [{"id": "a", "input": 1}])
+        btql = fetch_page.call_args.kwargs["btql"]
+        self.assertEqual([column["alias"] for column in btql["select"]], ["id", "_xact_id", "created", "input"])
+        self.assertEqual(btql["filter"], {"op": "and", "left": internal_filter, "right": user_filter})
+
+    def test_fetch_projects_pinned_versions_locally(self):
+        metadata = ProjectDatasetMetadata(
+            project=ObjectMetadata(id="project-id", name="project", full_info={}),
+            dataset=ObjectMetadata(id="dataset-id", name="dataset", full_info={}),
+        )
+        rows = [{"id": "a", "_xact_id": "1", "input": 1, "expected": 2, "metadata": {"big": "x" * 100}}]
+        state = logger._state
+        orig_cache = state._dataset_cache
+        state._dataset_cache = LazyValue(lambda: None, use_mutex=False)
+        try:
+            dataset = Dataset(lazy_metadata=LazyValue(lambda: metadata, use_mutex=False), version=1, legacy=False)
+            with mock.patch.object(ObjectFetcher, "_fetch_page", return_value=(rows, None)):
+                self.assertEqual(list(dataset.fetch(columns=["input"])), [{"id": "a", "_xact_id": "1", "input": 1}])
+                with self.assertRaises(ValueError):
+                    dataset.fetch(filter={"op": "literal", "value": True})
+        finally:
+            state._dataset_cache = orig_cache
@@ -0,0 +1,172 @@
+import asyncio
+import time
+import unittest
+
+from .framework import Evaluator, run_evaluator
+from .logger import _span_metrics_accumulator, _SpanMetricsAccumulator
+from .rate_limit import (
+    AdaptiveConcurrencyLimit,
+    RateLimit,
+    _TokenBucket,
+    is_rate_limit_error,
+    rate_limited,
+    rate_limits,
+)
+
+
+class RateLimitError(Exception):
+    pass
+
+
+class _HTTPError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+class TestRateLimit(unittest.TestCase):
+    def test_limits_scorers_separately(self):
+        in_flight = {"task": 0, "judge": 0}
+        max_in_flight = {"task": 0, "judge": 0}
+
+        async def track(name):
+            in_flight[name] += 1
+            max_in_flight[name] = max(max_in_flight[name], in_flight[name])
+            await asyncio.sleep(0.01)
+            in_flight[name] -= 1
+
+        async def task(input):
+            await track("task")
+            return input
+
+        @RateLimit(max_concurrency=2)
+        async def judge(input, output, expected):
+            await track("judge")
+            return 1
+
+        evaluator = Evaluator(
+            project_name="test-project",
+            eval_name="test",
+            data=[{"input": i} for i in range(20)],
+            task=task,
+            scores=[judge],
+            experiment_name=None,
+            metadata=None,
+        )
+        result = asyncio.run(run_evaluator(None, evaluator, None, []))
+        self.assertEqual(result.summary.scores["judge"].score, 1)
+        self.assertEqual(max_in_flight["judge"], 2)
+        self.assertGreater(max_in_flight["task"], 2)
+
+    def test_requests_per_second(self):
+        async def run():
+            bucket = _TokenBucket(capacity=1, rate=50)
+            start = time.monotonic()
+            for _ in range(6):
+                await bucket.wait(1)
+            return time.monotonic() - start
+
+        # The first request is allowed immediately, and the rest wait for the bucket to refill.
+        self.assertGreaterEqual(asyncio.run(run()), 5 / 50 * 0.9)
+
+    def test_tokens_per_minute(self):
+        limit = RateLimit(tokens_per_minute=600)
+        parent = _SpanMetricsAccumulator()
+
+        async def run():
+            _span_metrics_accumulator.set(parent)
+            async with rate_limited([limit]):
+                _span_metrics_accumulator.get().add({"prompt_tokens": 400, "completion_tokens": 205, "tokens": 605})
+            # The bucket is now in debt, so the next call waits until it refills.
+            start = time.monotonic()
+            async with rate_limited([limit]):
+                pass
+            return time.monotonic() - start
+
+        self.assertGreater(asyncio.run(run()), 0.4)
+        self.assertEqual(parent.metrics["tokens"], 605)
+
+    def test_shared_by_name(self):
+        a = RateLimit("test-shared", max_concurrency=1)
+        b = RateLimit("test-shared", max_concurrency=1)
+        self.assertIs(a._state, b._state)
+        with self.assertRaises(ValueError):
+            RateLimit("test-shared", max_concurrency=2)
+
+        def f():
+            pass
+
+        a(b(f))
+        self.assertEqual(rate_limits(f), [b, a])
+
+
+class TestAdaptiveConcurrencyLimit(unittest.TestCase):
+    def test_is_rate_limit_error(self):
+        self.assertTrue(is_rate_limit_error(RateLimitError()))
+        self.assertTrue(is_rate_limit_error(_HTTPError(429)))
+        self.assertFalse(is_rate_limit_error(_HTTPError(500)))
+        self.assertFalse(is_rate_limit_error(ValueError()))
+        try:
+            try:
+                raise _HTTPError(429)
+            except Exception as e:
+                raise ValueError("scorer failed") from e
+        except ValueError as e:
+            self.assertTrue(is_rate_limit_error(e))
+
+    def test_aimd(self):
+        limit = AdaptiveConcurrencyLimit(initial=4)
+
+        async def run(n, latency=0.0):
+            async def call():
+                async with limit.slot():
+                    await asyncio.sleep(latency)
+
+            await asyncio.gather(*[call() for _ in range(n)])
+
+        # The limit grows by about one per round of calls at a steady latency.
+        asyncio.run(run(40))
+        self.assertGreaterEqual(limit.current, 8)
+        before = limit.limit
+
+        # A burst of rate limit errors from the same round of calls only cuts the limit once.
+        limit.on_rate_limit()
+        limit.on_rate_limit()
+        self.assertAlmostEqual(limit.limit, before / 2)
+
+        # Rising latency cuts the limit too.
+        asyncio.run(run(5, latency=0.05))
+        self.assertLess(limit.limit, before / 2)
+
+    def test_auto_max_concurrency(self):
+        in_flight = 0
+        max_in_flight = 0
+
+        async def task(input):
+            nonlocal in_flight, max_in_flight
+            in_flight += 1
+            max_in_flight = max(max_in_flight, in_flight)
+            await asyncio.sleep(0.001)
+            in_flight -= 1
+            if input % 10 == 0:
+                raise RateLimitError()
+            return input
+
+        evaluator = Evaluator(
+            project_name="test-project",
+            eval_name="test",
+            data=[{"input": i} for i in range(100)],
+            task=task,
+            scores=[],
+            experiment_name=None,
+            metadata=None,
+            max_concurrency="auto",
+        )
+        result = asyncio.run(run_evaluator(None, evaluator, None, []))
+        self.assertEqual([r.output for r in result.results if r.error is None], [i for i in range(100) if i % 10])
+        self.assertGreaterEqual(max_in_flight, 4)
+        self.assertLess(max_in_flight, 100)
+
+
+if __name__ == "__main__":
+    unittest.main()